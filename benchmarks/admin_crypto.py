@@ -0,0 +1,102 @@
+"""
+Benchmark creating service accounts through the admin API, for different numbers of payload encryption processes.
+
+The fake MinIO server runs in a separate process, so its own payload decryption does not compete with the benchmark
+for the GIL. For each number of workers, service accounts are created and then updated from a number of threads, like
+MinIO Manager does with MINIO_MANAGER_CONCURRENCY and MINIO_MANAGER_ADMIN_CRYPTO_WORKERS.
+
+Example:
+    python -m benchmarks.admin_crypto --accounts 200 --threads 8 --workers 0,2,4,8
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from minio import MinioAdmin
+from minio.credentials import StaticProvider
+
+from benchmarks.fake_minio import CONTROLLER_ACCESS_KEY, CONTROLLER_SECRET_KEY
+from benchmarks.run_benchmarks import REPO_ROOT, child_environment
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+        except OSError:
+            time.sleep(0.05)
+        else:
+            return
+    raise TimeoutError(f"Fake MinIO server did not start on port {port}")
+
+
+def run(admin: MinioAdmin, prefix: str, accounts: int, threads: int) -> float:
+    """Create and update service accounts, returning the number of admin calls per second."""
+    policy = {
+        "Version": "2012-10-17",
+        "Statement": [{"Effect": "Allow", "Action": ["s3:GetObject"], "Resource": ["*"]}],
+    }
+
+    def create_and_update(i: int):
+        access_key = f"{prefix}{i:08d}"
+        admin.add_service_account(access_key=access_key, secret_key="secret" + access_key, name=access_key[:32])
+        admin.update_service_account(access_key=access_key, policy=policy)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(create_and_update, range(accounts)))
+    return 2 * accounts / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark admin API throughput against payload encryption workers.")
+    parser.add_argument("--accounts", type=int, default=100, help="service accounts to create per run")
+    parser.add_argument("--threads", type=int, default=8, help="threads calling the admin API")
+    parser.add_argument("--workers", default="0,1,2,4,8", help="comma-separated numbers of encryption processes")
+    args = parser.parse_args()
+
+    port = _free_port()
+    server = subprocess.Popen(  # noqa: S603
+        [sys.executable, "-m", "benchmarks.fake_minio", "--port", str(port)],
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for_port(port)
+        # admin_crypto is part of minio_manager, which loads its settings on import.
+        os.environ.update(child_environment(f"127.0.0.1:{port}"))
+        sys.argv = sys.argv[:1]
+        from minio_manager.classes import admin_crypto
+
+        print(f"{os.cpu_count()} CPUs, {args.threads} threads, {args.accounts} accounts per run")
+        print(f"{'workers':>7} {'calls/s':>9}")
+        for workers in (int(w) for w in args.workers.split(",")):
+            executor = admin_crypto.start_process_pool(workers) if workers else None
+            admin_crypto.set_executor(executor)
+            credentials = StaticProvider(CONTROLLER_ACCESS_KEY, CONTROLLER_SECRET_KEY)
+            admin = MinioAdmin(endpoint=f"127.0.0.1:{port}", credentials=credentials, secure=False)
+            throughput = run(admin, f"w{workers}-", args.accounts, args.threads)
+            print(f"{workers:>7} {throughput:>9.1f}", flush=True)
+            if executor:
+                executor.shutdown()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
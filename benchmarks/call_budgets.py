@@ -0,0 +1,55 @@
+"""
+The API calls MinIO Manager may make per resource in the benchmark scenarios, see run_benchmarks.py --check-budgets.
+
+Budgets are the most reads and writes a single resource of a kind may take, by the groups of the call accounting
+summary, see minio_manager/classes/call_accounting.py. A group that is not listed may not occur at all: in the
+no-change scenario no resource may be changed. Calls shared by many resources, like listing the service accounts
+once, count towards a single resource, so the budgets do not depend on the scale.
+
+When a change to MinIO Manager lowers the number of calls, lower the budget with it.
+"""
+
+from __future__ import annotations
+
+# scenario -> group -> (reads, writes)
+BUDGETS: dict[str, dict[str, tuple[int, int]]] = {
+    "cold": {
+        # Checking the connection, and listing the buckets and IAM policies once for all resources.
+        "outside resources": (4, 0),
+        # Creating the bucket, its versioning and lifecycle configuration, and its service account.
+        "changed bucket": (2, 4),
+        "changed bucket policy": (0, 1),
+        "changed IAM policy": (1, 1),
+        "changed service account": (0, 1),
+    },
+    "no-change": {
+        "outside resources": (4, 0),
+        "unchanged bucket": (4, 0),
+        "unchanged bucket policy": (1, 0),
+        "unchanged IAM policy": (1, 0),
+        "unchanged service account": (1, 0),
+    },
+}
+
+
+def check_budgets(scenario: str, summary: dict[str, dict]) -> list[str]:
+    """
+    Check the call accounting summary of a run against the budgets of its scenario.
+
+    Returns: a message for every group exceeding its budget, empty if there is no budget for the scenario
+    """
+    budgets = BUDGETS.get(scenario)
+    if budgets is None:
+        return []
+    violations = []
+    for group, calls in summary.items():
+        if group not in budgets:
+            violations.append(f"{group}: {calls['resources']} resources, expected none")
+            continue
+        reads, writes = budgets[group]
+        if calls["max_reads"] > reads or calls["max_writes"] > writes:
+            violations.append(
+                f"{group}: at most {calls['max_reads']} reads and {calls['max_writes']} writes per resource, budget "
+                f"{reads} reads and {writes} writes"
+            )
+    return violations
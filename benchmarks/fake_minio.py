@@ -0,0 +1,675 @@
+"""
+A pure-Python, in-process fake of the MinIO S3 and admin APIs used by MinIO Manager.
+
+Only the endpoints MinIO Manager calls are implemented, and request signatures are not verified. Admin payloads are
+encrypted and decrypted with the same madmin scheme MinIO uses, so the real minio-py clients can talk to it unchanged.
+
+With `audit_webhook`, every successful write is posted to that URL as a MinIO audit log entry, like MinIO's
+audit_webhook target does. emit_audit() sends entries for changes made outside MinIO Manager.
+
+Example:
+    server = FakeMinioServer(latency=0.005)
+    server.start()
+    ...
+    print(server.state.call_counts)
+    server.stop()
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import os
+import queue
+import re
+import secrets
+import string
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.etree import ElementTree as ET
+
+from minio.crypto import (
+    _CHUNK_SIZE,
+    DecryptReader,
+    _generate_additional_data,
+    _generate_key,
+    _get_cipher,
+    _mark_as_last,
+    _update_nonce_id,
+)
+
+S3_NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+ADMIN_PREFIX = "/minio/admin/v3/"
+CREDENTIAL_RE = re.compile(r"Credential=(?P<access_key>[^/]+)/")
+ENCRYPTED_REQUESTS = ("add-service-account", "update-service-account")
+# The names MinIO uses in the audit log for operations the fake server names differently.
+AUDIT_API_NAMES = {"CreateBucket": "PutBucket", "PutBucketLifecycleConfiguration": "PutBucketLifecycle"}
+
+# The MinIO release the fake server claims to be.
+VERSION = "2024-01-01T00:00:00Z"
+CONTROLLER_USER = "local-test-controller"
+CONTROLLER_ACCESS_KEY = "static-for-testing"
+CONTROLLER_SECRET_KEY = "static-secret-key-for-testing"  # noqa: S105, matches the Makefile test environment
+CONTROLLER_POLICY = {
+    "Version": "2012-10-17",
+    "Statement": [
+        {"Effect": "Allow", "Action": ["s3:*"], "Resource": ["arn:aws:s3:::*", "arn:aws:s3:::*/*"]},
+        {"Effect": "Allow", "Action": ["admin:*"]},
+    ],
+}
+
+
+def is_read(operation: str) -> bool:
+    """Whether a counted operation, like "s3:GetBucketPolicy" or "admin:list-users", only reads."""
+    name = operation.split(":", 1)[1]
+    return name == "info" or name.startswith(("Get", "Head", "List", "info-", "list-"))
+
+
+class AuditWebhook:
+    """
+    AuditWebhook posts audit log entries to a URL on a background thread, in the order they were emitted.
+
+    Args:
+        url: the URL to post the entries to
+        token: sent in the Authorization header, like MinIO's auth_token
+    """
+
+    def __init__(self, url: str, token: str | None = None):
+        self.url = url
+        self.token = token
+        self.entries: queue.Queue[dict | None] = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="fake-minio-audit", daemon=True)
+        self.thread.start()
+
+    def emit(self, entry: dict):
+        self.entries.put(entry)
+
+    def _run(self):
+        while (entry := self.entries.get()) is not None:
+            request = urllib.request.Request(self.url, data=json.dumps(entry).encode(), method="POST")  # noqa: S310
+            request.add_header("Content-Type", "application/json")
+            if self.token:
+                request.add_header("Authorization", f"Bearer {self.token}")
+            # Like MinIO, drop entries the target does not accept.
+            with contextlib.suppress(OSError):
+                urllib.request.urlopen(request, timeout=5).close()  # noqa: S310, a URL of the test setup
+
+    def close(self):
+        self.entries.put(None)
+        self.thread.join(5)
+
+
+def audit_entry(
+    api_name: str, bucket: str = "", request_path: str = "", query: dict | None = None, access_key: str = ""
+) -> dict:
+    """A MinIO audit log entry, with the fields MinIO Manager uses."""
+    return {
+        "version": "1",
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "api": {"name": api_name, "bucket": bucket, "status": "OK", "statusCode": 200},
+        "requestPath": request_path,
+        "requestQuery": query or {},
+        "accessKey": access_key,
+    }
+
+
+class _BytesResponse:
+    """Minimal stand-in for a urllib3 response, so minio-py's DecryptReader can read a request body."""
+
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amount: int = -1) -> bytes:
+        return self._stream.read(amount)
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class FakeMinioState:
+    """
+    The observed state of the fake cluster, plus counters for every API call made against it.
+
+    All attributes may be read and modified directly (while holding `lock`) to seed or drift the cluster.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.buckets: dict[str, dict] = {}
+        # access key -> {"parentUser", "secretKey", "name", "description", "policy", "status"}
+        self.service_accounts: dict[str, dict] = {}
+        self.canned_policies: dict[str, str] = {}
+        self.user_policies: dict[str, set[str]] = {}
+        self.users: dict[str, dict] = {CONTROLLER_USER: {"policy": json.dumps(CONTROLLER_POLICY)}}
+        self.call_counts: Counter[str] = Counter()
+        self._derived_keys: dict[str, tuple[bytes, bytes]] = {}
+        self.add_service_account(
+            CONTROLLER_ACCESS_KEY,
+            CONTROLLER_SECRET_KEY,
+            parent=CONTROLLER_USER,
+            name="Local Test",
+            policy=json.dumps(CONTROLLER_POLICY),
+        )
+
+    def add_service_account(
+        self,
+        access_key: str,
+        secret_key: str,
+        parent: str = CONTROLLER_USER,
+        name: str = "",
+        description: str = "",
+        policy: str | None = None,
+    ):
+        with self.lock:
+            self.service_accounts[access_key] = {
+                "parentUser": parent,
+                "secretKey": secret_key,
+                "name": name,
+                "description": description,
+                "policy": policy,
+                "status": "on",
+            }
+
+    def reset_counts(self):
+        with self.lock:
+            self.call_counts.clear()
+
+    def secret_key_for(self, access_key: str) -> str:
+        with self.lock:
+            return self.service_accounts[access_key]["secretKey"]
+
+    def derived_key(self, secret_key: str) -> tuple[bytes, bytes]:
+        """Return a (salt, key) pair per secret key, so responses only pay for the Argon2 KDF once."""
+        with self.lock:
+            if secret_key not in self._derived_keys:
+                salt = os.urandom(32)
+                self._derived_keys[secret_key] = (salt, _generate_key(secret_key.encode(), salt))
+            return self._derived_keys[secret_key]
+
+
+def encrypt_payload(state: FakeMinioState, payload: bytes, secret_key: str) -> bytes:
+    """Encrypt a response payload like minio.crypto.encrypt does, reusing a cached Argon2 key."""
+    salt, key = state.derived_key(secret_key)
+    nonce = os.urandom(8)
+    aead_id = 0
+    additional_data = _generate_additional_data(aead_id, key, nonce + b"\x00\x00\x00\x00")
+    result = salt + bytes([aead_id]) + nonce
+    indices = range(0, max(len(payload), 1), _CHUNK_SIZE)
+    for nonce_id, i in enumerate(indices, start=1):
+        if i == indices[-1]:
+            additional_data = _mark_as_last(additional_data)
+        cipher = _get_cipher(aead_id, key, _update_nonce_id(nonce, nonce_id))
+        cipher.update(additional_data)
+        encrypted_data, tag = cipher.encrypt_and_digest(payload[i : i + _CHUNK_SIZE])
+        result += encrypted_data + tag
+    return result
+
+
+def decrypt_payload(payload: bytes, secret_key: str) -> bytes:
+    result = b""
+    with DecryptReader(_BytesResponse(payload), secret_key.encode()) as reader:
+        for data in reader.stream():
+            result += data
+    return result
+
+
+def _random_key(length: int) -> str:
+    alphabet = string.ascii_uppercase + string.digits
+    return "".join(secrets.choice(alphabet) for _ in range(length))
+
+
+class FakeMinioRequestHandler(BaseHTTPRequestHandler):
+    """Route S3 and admin requests to the shared FakeMinioState."""
+
+    protocol_version = "HTTP/1.1"
+    server: FakeMinioHTTPServer
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    @property
+    def state(self) -> FakeMinioState:
+        return self.server.state
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_HEAD(self):
+        self._dispatch("HEAD")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def send_response(self, code: int, message: str | None = None):
+        self.status = code
+        super().send_response(code, message)
+
+    def _dispatch(self, method: str):
+        self.operation = None
+        url = urlsplit(self.path)
+        self.query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+        match = CREDENTIAL_RE.search(self.headers.get("Authorization", ""))
+        self.access_key = match.group("access_key") if match else None
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if url.path == "/minio/health/live":
+            self._send(200)
+        elif url.path.startswith(ADMIN_PREFIX):
+            self._handle_admin(method, url.path[len(ADMIN_PREFIX) :])
+        else:
+            self._handle_s3(method, url.path.strip("/"))
+        if self.server.audit_webhook and self.operation and not is_read(self.operation) and self.status < 300:
+            self._audit(url.path)
+
+    def _audit(self, path: str):
+        kind, name = self.operation.split(":", 1)
+        if kind == "s3":
+            entry = audit_entry(AUDIT_API_NAMES.get(name, name), bucket=path.strip("/"), access_key=self.access_key)
+        else:
+            api_name = "".join(word.capitalize() for word in name.split("-"))
+            entry = audit_entry(api_name, request_path=path, query=self.query, access_key=self.access_key)
+        self.server.audit_webhook.emit(entry)
+
+    def _count(self, operation: str):
+        self.operation = operation
+        with self.state.lock:
+            self.state.call_counts[operation] += 1
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/xml"):
+        self.send_response(status)
+        self.send_header("Server", "MinIO")
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _s3_error(self, status: int, code: str, message: str = ""):
+        root = ET.Element("Error")
+        ET.SubElement(root, "Code").text = code
+        ET.SubElement(root, "Message").text = message or code
+        ET.SubElement(root, "Resource").text = self.path
+        ET.SubElement(root, "RequestId").text = "fake"
+        ET.SubElement(root, "HostId").text = "fake"
+        self._send(status, ET.tostring(root))
+
+    def _admin_error(self, status: int, code: str, message: str = ""):
+        body = json.dumps({"Code": code, "Message": message or code}).encode()
+        self._send(status, body, "application/json")
+
+    def _send_encrypted(self, payload: dict):
+        secret_key = self.state.secret_key_for(self.access_key)
+        body = encrypt_payload(self.state, json.dumps(payload).encode(), secret_key)
+        self._send(200, body, "application/octet-stream")
+
+    # S3 API
+
+    def _handle_s3(self, method: str, bucket: str):
+        if not bucket:
+            self._count("s3:ListBuckets")
+            self._list_buckets()
+            return
+
+        sub_resource = next((q for q in ("location", "versioning", "lifecycle", "policy") if q in self.query), "")
+        operation = {
+            ("HEAD", ""): "HeadBucket",
+            ("PUT", ""): "CreateBucket",
+            ("DELETE", ""): "DeleteBucket",
+            ("GET", "location"): "GetBucketLocation",
+            ("GET", "versioning"): "GetBucketVersioning",
+            ("PUT", "versioning"): "PutBucketVersioning",
+            ("GET", "lifecycle"): "GetBucketLifecycleConfiguration",
+            ("PUT", "lifecycle"): "PutBucketLifecycleConfiguration",
+            ("DELETE", "lifecycle"): "DeleteBucketLifecycle",
+            ("GET", "policy"): "GetBucketPolicy",
+            ("PUT", "policy"): "PutBucketPolicy",
+            ("DELETE", "policy"): "DeleteBucketPolicy",
+        }.get((method, sub_resource))
+        if operation is None:
+            self._s3_error(501, "NotImplemented")
+            return
+        self._count(f"s3:{operation}")
+
+        with self.state.lock:
+            if operation == "CreateBucket":
+                if bucket in self.state.buckets:
+                    self._s3_error(409, "BucketAlreadyOwnedByYou")
+                    return
+                self.state.buckets[bucket] = {"versioning": None, "lifecycle": None, "policy": None}
+                self._send(200)
+                return
+
+            bucket_state = self.state.buckets.get(bucket)
+            if bucket_state is None:
+                self._s3_error(404, "NoSuchBucket", "The specified bucket does not exist")
+                return
+
+            self._handle_bucket_operation(operation, bucket, bucket_state)
+
+    def _handle_bucket_operation(self, operation: str, bucket: str, bucket_state: dict):
+        if operation == "HeadBucket":
+            self._send(200)
+        elif operation == "DeleteBucket":
+            del self.state.buckets[bucket]
+            self._send(204)
+        elif operation == "GetBucketLocation":
+            self._send(200, ET.tostring(ET.Element("LocationConstraint", xmlns=S3_NS)))
+        elif operation == "GetBucketVersioning":
+            root = ET.Element("VersioningConfiguration", xmlns=S3_NS)
+            if bucket_state["versioning"]:
+                ET.SubElement(root, "Status").text = bucket_state["versioning"]
+            self._send(200, ET.tostring(root))
+        elif operation == "PutBucketVersioning":
+            status = ET.fromstring(self.body).find("{*}Status")  # noqa: S314
+            bucket_state["versioning"] = status.text if status is not None else None
+            self._send(200)
+        else:
+            self._handle_bucket_document(operation, bucket_state)
+
+    def _handle_bucket_document(self, operation: str, bucket_state: dict):
+        """Lifecycle configurations and bucket policies are stored and returned verbatim."""
+        key = "lifecycle" if "Lifecycle" in operation else "policy"
+        missing_code = "NoSuchLifecycleConfiguration" if key == "lifecycle" else "NoSuchBucketPolicy"
+        if operation.startswith("Get"):
+            if bucket_state[key] is None:
+                self._s3_error(404, missing_code)
+                return
+            content_type = "application/xml" if key == "lifecycle" else "application/json"
+            self._send(200, bucket_state[key], content_type)
+        elif operation.startswith("Put"):
+            if key == "policy":
+                try:
+                    json.loads(self.body)
+                except ValueError:
+                    self._s3_error(400, "MalformedPolicy")
+                    return
+            bucket_state[key] = self.body
+            self._send(200)
+        else:
+            bucket_state[key] = None
+            self._send(204)
+
+    def _list_buckets(self):
+        root = ET.Element("ListAllMyBucketsResult", xmlns=S3_NS)
+        owner = ET.SubElement(root, "Owner")
+        ET.SubElement(owner, "ID").text = "fake"
+        buckets = ET.SubElement(root, "Buckets")
+        with self.state.lock:
+            names = sorted(self.state.buckets)
+        for name in names:
+            bucket = ET.SubElement(buckets, "Bucket")
+            ET.SubElement(bucket, "Name").text = name
+            ET.SubElement(bucket, "CreationDate").text = "2024-01-01T00:00:00.000Z"
+        self._send(200, ET.tostring(root))
+
+    # Admin API
+
+    def _handle_admin(self, method: str, command: str):
+        self._count(f"admin:{command}")
+        handler = getattr(self, "_admin_" + command.replace("-", "_"), None)
+        if handler is None:
+            self._admin_error(501, "XMinioAdminNotImplemented", f"{command} is not implemented")
+            return
+        with self.state.lock:
+            known_key = self.access_key in self.state.service_accounts
+        if not known_key:
+            self._admin_error(403, "InvalidAccessKeyId")
+            return
+        if command in ENCRYPTED_REQUESTS:
+            # Decrypt outside the lock, the Argon2 KDF is slow and releases the GIL.
+            self.body = decrypt_payload(self.body, self.state.secret_key_for(self.access_key))
+        with self.state.lock:
+            handler()
+
+    def _requester_parent(self) -> str:
+        return self.state.service_accounts[self.access_key]["parentUser"]
+
+    def _effective_policy(self, account: dict) -> str:
+        if account["policy"] is not None:
+            return account["policy"]
+        return self.state.users.get(account["parentUser"], {}).get("policy", "{}")
+
+    def _admin_info_service_account(self):
+        account = self.state.service_accounts.get(self.query.get("accessKey", ""))
+        if account is None or account["parentUser"] != self._requester_parent():
+            self._admin_error(
+                403, "XMinioInvalidIAMCredentials", "The security token included in the request is invalid"
+            )
+            return
+        self._send_encrypted(
+            {
+                "parentUser": account["parentUser"],
+                "accountStatus": account["status"],
+                "impliedPolicy": account["policy"] is None,
+                "policy": self._effective_policy(account),
+                "name": account["name"],
+                "description": account["description"],
+                "expiration": None,
+            }
+        )
+
+    def _admin_list_service_accounts(self):
+        user = self.query.get("user", "")
+        accounts = [
+            {
+                "parentUser": account["parentUser"],
+                "accountStatus": account["status"],
+                "impliedPolicy": account["policy"] is None,
+                "accessKey": access_key,
+                "name": account["name"],
+                "description": account["description"],
+                "expiration": None,
+            }
+            for access_key, account in self.state.service_accounts.items()
+            if account["parentUser"] == user
+        ]
+        self._send_encrypted({"accounts": accounts})
+
+    def _admin_add_service_account(self):
+        request = json.loads(self.body)
+        access_key = request.get("accessKey") or _random_key(20)
+        secret_key = request.get("secretKey") or _random_key(40)
+        if access_key in self.state.service_accounts:
+            self._admin_error(409, "XMinioIAMServiceAccountNotAllowed", "Service account already exists")
+            return
+        policy = request.get("policy")
+        self.state.add_service_account(
+            access_key,
+            secret_key,
+            parent=self._requester_parent(),
+            name=request.get("name", ""),
+            description=request.get("description", ""),
+            policy=json.dumps(policy) if policy else None,
+        )
+        self._send_encrypted({"credentials": {"accessKey": access_key, "secretKey": secret_key, "expiration": None}})
+
+    def _admin_update_service_account(self):
+        account = self.state.service_accounts.get(self.query.get("accessKey", ""))
+        if account is None:
+            self._admin_error(403, "XMinioInvalidIAMCredentials")
+            return
+        request = json.loads(self.body)
+        if "newPolicy" in request:
+            account["policy"] = json.dumps(request["newPolicy"])
+        for field, target in (("newName", "name"), ("newDescription", "description"), ("newSecretKey", "secretKey")):
+            if field in request:
+                account[target] = request[field]
+        self._send(204)
+
+    def _admin_delete_service_account(self):
+        if self.state.service_accounts.pop(self.query.get("accessKey", ""), None) is None:
+            self._admin_error(404, "XMinioAdminServiceAccountNotFound")
+            return
+        self._send(204)
+
+    def _admin_info(self):
+        info = {
+            "mode": "online",
+            "servers": [{"state": "online", "endpoint": self.headers.get("Host"), "version": VERSION}],
+        }
+        self._send(200, json.dumps(info).encode(), "application/json")
+
+    def _admin_list_canned_policies(self):
+        policies = {name: json.loads(policy) for name, policy in self.state.canned_policies.items()}
+        self._send(200, json.dumps(policies).encode(), "application/json")
+
+    def _admin_info_canned_policy(self):
+        policy = self.state.canned_policies.get(self.query.get("name", ""))
+        if policy is None:
+            self._admin_error(404, "XMinioAdminNoSuchPolicy", "The canned policy does not exist")
+            return
+        self._send(200, policy.encode(), "application/json")
+
+    def _admin_add_canned_policy(self):
+        try:
+            json.loads(self.body)
+        except ValueError:
+            self._admin_error(400, "XMinioMalformedIAMPolicy")
+            return
+        self.state.canned_policies[self.query["name"]] = self.body.decode()
+        self._send(200)
+
+    def _admin_remove_canned_policy(self):
+        if self.state.canned_policies.pop(self.query.get("name", ""), None) is None:
+            self._admin_error(404, "XMinioAdminNoSuchPolicy")
+            return
+        self._send(200)
+
+    def _admin_list_users(self):
+        names = (self.state.users.keys() | self.state.user_policies.keys()) - {CONTROLLER_USER}
+        users = {
+            name: {"policyName": ",".join(sorted(self.state.user_policies.get(name, ()))), "status": "enabled"}
+            for name in sorted(names)
+        }
+        self._send_encrypted(users)
+
+    def _admin_user_info(self):
+        name = self.query.get("accessKey", "")
+        if name not in self.state.users and name not in self.state.user_policies:
+            self._admin_error(404, "XMinioAdminNoSuchUser")
+            return
+        info = {"policyName": ",".join(sorted(self.state.user_policies.get(name, ()))), "status": "enabled"}
+        self._send(200, json.dumps(info).encode(), "application/json")
+
+    def _admin_set_user_or_group_policy(self):
+        policy_names = set(self.query.get("policyName", "").split(","))
+        missing = policy_names - set(self.state.canned_policies)
+        if missing:
+            self._admin_error(404, "XMinioAdminNoSuchPolicy", f"Policies {missing} do not exist")
+            return
+        self.state.user_policies[self.query["userOrGroup"]] = policy_names
+        self._send(200)
+
+
+class FakeMinioHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, address: tuple[str, int], state: FakeMinioState, latency: float, audit_webhook: AuditWebhook | None
+    ):
+        super().__init__(address, FakeMinioRequestHandler)
+        self.state = state
+        self.latency = latency
+        self.audit_webhook = audit_webhook
+
+
+class FakeMinioServer:
+    """
+    Run a fake MinIO server on a background thread.
+
+    Args:
+        latency: seconds to sleep before answering each request
+        host: the address to bind to
+        port: the port to bind to, 0 picks a free port
+        audit_webhook: post an audit log entry for every successful write to this URL
+        audit_token: the token to send with the audit log entries
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        audit_webhook: str | None = None,
+        audit_token: str | None = None,
+    ):
+        self.state = FakeMinioState()
+        self.audit_webhook = AuditWebhook(audit_webhook, audit_token) if audit_webhook else None
+        self._server = FakeMinioHTTPServer((host, port), self.state, latency, self.audit_webhook)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    @property
+    def latency(self) -> float:
+        return self._server.latency
+
+    @latency.setter
+    def latency(self, value: float):
+        self._server.latency = value
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-minio", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self.audit_webhook is not None:
+            self.audit_webhook.close()
+
+    def emit_audit(
+        self, api_name: str, bucket: str = "", command: str = "", query: dict | None = None, access_key: str = "drift"
+    ):
+        """
+        Send an audit log entry for a change made outside MinIO Manager, e.g. after changing `state` directly.
+
+        Args:
+            api_name: the S3 or admin API call, e.g. "PutBucketVersioning" or "AddCannedPolicy"
+            bucket: the bucket of S3 API calls
+            command: the command of admin API calls, e.g. "add-canned-policy"
+            query: the query parameters of admin API calls, e.g. {"name": "my-policy"}
+            access_key: the access key that made the change
+        """
+        request_path = ADMIN_PREFIX + command if command else f"/{bucket}"
+        self.audit_webhook.emit(audit_entry(api_name, bucket, request_path, query, access_key))
+
+    def __enter__(self) -> FakeMinioServer:
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake MinIO server for local development.")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds of latency added to each request")
+    parser.add_argument("--audit-webhook", help="post an audit log entry for every successful write to this URL")
+    args = parser.parse_args()
+    fake = FakeMinioServer(latency=args.latency, port=args.port, audit_webhook=args.audit_webhook)
+    print(f"Fake MinIO listening on {fake.endpoint}, controller access key '{CONTROLLER_ACCESS_KEY}'")
+    fake._server.serve_forever()
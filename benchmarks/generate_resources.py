@@ -0,0 +1,146 @@
+"""
+Generate a synthetic resources.yaml, plus the policy and lifecycle files it references.
+
+Example:
+    python -m benchmarks.generate_resources /tmp/bench --buckets 1000 --service-accounts 100 --iam-policies 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+import yaml
+
+BUCKET_PREFIX = "bench-"
+LIFECYCLE_FILE = "lifecycle.json"
+LIFECYCLE_POLICY = {
+    "Rules": [
+        {
+            "Expiration": {"ExpiredObjectDeleteMarker": True},
+            "ID": "ExpireDeleteMarkerAndOldVersionsAfter30Days",
+            "NoncurrentVersionExpiration": {"NoncurrentDays": 30},
+            "Status": "Enabled",
+        }
+    ]
+}
+
+
+def bucket_name(index: int) -> str:
+    return f"{BUCKET_PREFIX}bucket-{index:06d}"
+
+
+def _bucket_statement(bucket: str, actions: list[str]) -> dict:
+    return {
+        "Effect": "Allow",
+        "Action": actions,
+        "Resource": [f"arn:aws:s3:::{bucket}", f"arn:aws:s3:::{bucket}/*"],
+    }
+
+
+def _write_json(directory: Path, relative_path: str, content: dict) -> str:
+    path = directory / relative_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(content, indent=2))
+    return relative_path
+
+
+def generate(
+    directory: str | Path,
+    buckets: int,
+    service_accounts: int = 0,
+    iam_policies: int = 0,
+    bucket_policies: int = 0,
+    shared_policy_files: bool = True,
+) -> Path:
+    """
+    Write a resources.yaml with the requested number of resources to the given directory.
+
+    Every bucket gets versioning, every fourth bucket a dedicated lifecycle file and every other bucket an automatically
+    created service account. Service accounts get a policy granting access to one of the buckets; with
+    shared_policy_files, all service accounts use a handful of policy files like most real deployments do.
+
+    Args:
+        directory: where to write resources.yaml and the files it references
+        buckets: number of buckets
+        service_accounts: number of stand-alone service accounts
+        iam_policies: number of IAM policies
+        bucket_policies: number of bucket policies, attached to the first buckets
+        shared_policy_files: whether service accounts share policy files
+
+    Returns: Path to the generated resources.yaml
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / LIFECYCLE_FILE).write_text(json.dumps(LIFECYCLE_POLICY, indent=1))
+
+    resources: dict[str, list] = {"buckets": []}
+    for i in range(buckets):
+        bucket: dict = {
+            "name": bucket_name(i),
+            "create_service_account": i % 2 == 0,
+            "versioning": "Enabled" if i % 3 else "Suspended",
+        }
+        if i % 4 == 0:
+            bucket["object_lifecycle_file"] = LIFECYCLE_FILE
+        resources["buckets"].append(bucket)
+
+    if bucket_policies:
+        resources["bucket_policies"] = []
+        for i in range(min(bucket_policies, buckets)):
+            name = bucket_name(i)
+            policy = {
+                "Version": "2012-10-17",
+                "Statement": [{**_bucket_statement(name, ["s3:GetObject"]), "Principal": {"AWS": ["*"]}}],
+            }
+            policy_file = _write_json(directory, f"bucket_policies/{name}.json", policy)
+            resources["bucket_policies"].append({"bucket": name, "policy_file": policy_file})
+
+    if service_accounts:
+        resources["service_accounts"] = []
+        for i in range(service_accounts):
+            if shared_policy_files:
+                file_name, target = f"shared-{i % 5}", bucket_name(i % 5)
+            else:
+                file_name, target = f"sa-{i:06d}", bucket_name(i % max(buckets, 1))
+            policy = {"Version": "2012-10-17", "Statement": [_bucket_statement(target, ["s3:GetObject"])]}
+            policy_file = _write_json(directory, f"user_policies/{file_name}.json", policy)
+            resources["service_accounts"].append({"name": f"{BUCKET_PREFIX}sa-{i:06d}", "policy_file": policy_file})
+
+    if iam_policies:
+        resources["iam_policies"] = []
+        for i in range(iam_policies):
+            name = f"{BUCKET_PREFIX}policy-{i:06d}"
+            policy = {"Version": "2012-10-17", "Statement": [_bucket_statement(bucket_name(i), ["s3:ListBucket"])]}
+            policy_file = _write_json(directory, f"iam_policies/{name}.json", policy)
+            resources["iam_policies"].append({"name": name, "policy_file": policy_file})
+
+    resources_file = directory / "resources.yaml"
+    with resources_file.open("w") as f:
+        yaml.safe_dump(resources, f, sort_keys=False)
+    return resources_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic MinIO Manager resources file.")
+    parser.add_argument("directory", help="output directory")
+    parser.add_argument("--buckets", type=int, default=100)
+    parser.add_argument("--service-accounts", type=int, default=10)
+    parser.add_argument("--iam-policies", type=int, default=5)
+    parser.add_argument("--bucket-policies", type=int, default=10)
+    parser.add_argument("--unique-policy-files", action="store_true", help="give every service account its own file")
+    args = parser.parse_args()
+    resources_file = generate(
+        args.directory,
+        args.buckets,
+        args.service_accounts,
+        args.iam_policies,
+        args.bucket_policies,
+        shared_policy_files=not args.unique_policy_files,
+    )
+    print(f"Wrote {resources_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Measure how much memory parsed resources take.
+
+A resources file is generated and parsed in this process with ClusterResources, and the memory still allocated once
+parsing is done is reported, both in total and per resource. Compare shared and unique policy files to see the effect
+of sharing policy documents between resources.
+
+Example:
+    python -m benchmarks.memory_footprint --buckets 50000 --service-accounts 50000
+    python -m benchmarks.memory_footprint --buckets 50000 --service-accounts 50000 --unique-policy-files
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.generate_resources import generate
+from benchmarks.run_benchmarks import child_environment
+
+
+def measure(directory: Path) -> tuple[int, int, int, float]:
+    """
+    Parse the resources in the given directory.
+
+    Returns: the number of resources, the retained and peak memory in bytes, and the parse time in seconds
+    """
+    # Settings are parsed when minio_manager is imported, from the environment and the command line arguments.
+    os.environ.update(child_environment("localhost:9000", {"MINIO_MANAGER_LOG_LEVEL": "INFO"}))
+    sys.argv = sys.argv[:1]
+    os.chdir(directory)
+    from minio_manager.classes.resource_parser import ClusterResources
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    resources = ClusterResources()
+    resources.parse_resources("resources.yaml")
+    parse_time = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(resources), retained - baseline, peak - baseline, parse_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory footprint of parsed MinIO Manager resources.")
+    parser.add_argument("--buckets", type=int, default=10000)
+    parser.add_argument("--service-accounts", type=int, default=10000)
+    parser.add_argument("--iam-policies", type=int, default=1000)
+    parser.add_argument("--bucket-policies", type=int, default=1000)
+    parser.add_argument("--unique-policy-files", action="store_true", help="give every service account its own file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="mm-memory-") as directory:
+        generate(
+            directory,
+            args.buckets,
+            args.service_accounts,
+            args.iam_policies,
+            args.bucket_policies,
+            shared_policy_files=not args.unique_policy_files,
+        )
+        count, retained, peak, parse_time = measure(Path(directory))
+
+    print(f"resources:     {count}")
+    print(f"parse time:    {parse_time:.2f}s")
+    print(f"retained:      {retained / 2**20:.1f} MiB ({retained / count:.0f} bytes per resource)")
+    print(f"peak:          {peak / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Benchmark MinIO Manager end-to-end against the in-process fake MinIO server.
+
+For every scale, three scenarios are run in a fresh `python -m minio_manager` process:
+
+- cold: an empty cluster, everything has to be created
+- no-change: the cluster already matches the resources file
+- drift: a fraction of the resources were changed or removed out-of-band
+
+For each run the wall time, the API calls received by the fake server and the peak RSS of the process are reported.
+With --check-budgets, the API calls are also counted per resource by MinIO Manager itself, and the run fails when a
+resource takes more calls than call_budgets.py allows, so CI catches handlers making more calls than they need to.
+
+Example:
+    python -m benchmarks.run_benchmarks --scales 100,1000 --latency 0.002 --output results.json
+    python -m benchmarks.run_benchmarks --scales 10000 --env MINIO_MANAGER_STREAM=True
+    python -m benchmarks.run_benchmarks --scales 100 --scenarios cold,no-change --check-budgets
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import yaml
+
+from benchmarks.call_budgets import check_budgets
+from benchmarks.fake_minio import (
+    CONTROLLER_ACCESS_KEY,
+    CONTROLLER_SECRET_KEY,
+    CONTROLLER_USER,
+    FakeMinioServer,
+    is_read,
+)
+from benchmarks.generate_resources import LIFECYCLE_FILE, generate
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+SCENARIOS = ("cold", "no-change", "drift")
+
+
+@dataclass
+class RunResult:
+    scale: int
+    scenario: str
+    exit_code: int | None
+    wall_time: float
+    peak_rss_mb: float
+    api_calls: int
+    reads: int
+    writes: int
+    calls: dict[str, int] = field(default_factory=dict)
+    budget_violations: list[str] = field(default_factory=list)
+
+
+def child_environment(endpoint: str, extra_env: dict[str, str] | None = None) -> dict[str, str]:
+    """The environment for a minio_manager process that talks to the fake server."""
+    env = {k: v for k, v in os.environ.items() if not k.startswith("MINIO_MANAGER_")}
+    env.update(
+        {
+            "PYTHONPATH": str(REPO_ROOT),
+            "MINIO_MANAGER_CLUSTER_NAME": "benchmark",
+            "MINIO_MANAGER_S3_ENDPOINT": endpoint,
+            "MINIO_MANAGER_S3_ENDPOINT_SECURE": "False",
+            "MINIO_MANAGER_MINIO_CONTROLLER_USER": CONTROLLER_USER,
+            "MINIO_MANAGER_SECRET_BACKEND_TYPE": "yaml",
+            "MINIO_MANAGER_SECRET_BACKEND_PATH": "secrets.yaml",
+            "MINIO_MANAGER_SECRET_BACKEND_S3_ACCESS_KEY": "unused",
+            "MINIO_MANAGER_SECRET_BACKEND_S3_SECRET_KEY": "unused",
+            "MINIO_MANAGER_CLUSTER_RESOURCES_FILE": "resources.yaml",
+            "MINIO_MANAGER_DEFAULT_BUCKET_VERSIONING": "Enabled",
+            "MINIO_MANAGER_DEFAULT_LIFECYCLE_POLICY_FILE": LIFECYCLE_FILE,
+            "MINIO_MANAGER_LOG_LEVEL": "INFO",
+        }
+    )
+    env.update(extra_env or {})
+    return env
+
+
+def write_secrets(directory: Path):
+    secrets = {CONTROLLER_USER: {"access_key": CONTROLLER_ACCESS_KEY, "secret_key": CONTROLLER_SECRET_KEY}}
+    with (directory / "secrets.yaml").open("w") as f:
+        yaml.safe_dump(secrets, f)
+
+
+def run_minio_manager(
+    directory: Path, env: dict[str, str], timeout: float, log_file: Path
+) -> tuple[int | None, float, float]:
+    """
+    Run MinIO Manager once and return its exit code, wall time and peak RSS in MiB.
+
+    os.wait4 is used instead of Popen.wait, so the peak RSS is that of this child only.
+    """
+    start = time.perf_counter()
+    with log_file.open("a") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "minio_manager"], cwd=directory, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        deadline = start + timeout
+        while True:
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if time.perf_counter() > deadline:
+                process.kill()
+                pid, status, rusage = os.wait4(process.pid, 0)
+                process.returncode = -9
+                return None, time.perf_counter() - start, rusage.ru_maxrss / 1024
+            time.sleep(0.01)
+    wall_time = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, wall_time, rusage.ru_maxrss / 1024
+
+
+def apply_drift(server: FakeMinioServer, fraction: float):
+    """Change or remove a fraction of the live resources, cycling through the kinds of drift we see in practice."""
+    state = server.state
+    with state.lock:
+        buckets = sorted(state.buckets)
+        step = max(int(1 / fraction), 1) if fraction else 0
+        for i, name in enumerate(buckets[::step] if step else []):
+            bucket = state.buckets[name]
+            match i % 4:
+                case 0:
+                    del state.buckets[name]
+                case 1:
+                    bucket["versioning"] = "Suspended" if bucket["versioning"] == "Enabled" else "Enabled"
+                case 2:
+                    bucket["lifecycle"] = None
+                case 3:
+                    bucket["policy"] = None
+
+        managed_accounts = [k for k, v in state.service_accounts.items() if k != CONTROLLER_ACCESS_KEY and v["policy"]]
+        for access_key in managed_accounts[::step] if step else []:
+            state.service_accounts[access_key]["policy"] = json.dumps({"Version": "2012-10-17", "Statement": []})
+
+        for name in sorted(state.canned_policies)[::step] if step else []:
+            del state.canned_policies[name]
+
+
+def _summarise(scale: int, scenario: str, run: tuple[int | None, float, float], server: FakeMinioServer) -> RunResult:
+    exit_code, wall_time, peak_rss = run
+    with server.state.lock:
+        calls = dict(server.state.call_counts)
+    reads = sum(count for op, count in calls.items() if is_read(op))
+    return RunResult(
+        scale=scale,
+        scenario=scenario,
+        exit_code=exit_code,
+        wall_time=round(wall_time, 3),
+        peak_rss_mb=round(peak_rss, 1),
+        api_calls=sum(calls.values()),
+        reads=reads,
+        writes=sum(calls.values()) - reads,
+        calls=dict(sorted(calls.items())),
+    )
+
+
+def benchmark_scale(
+    scale: int,
+    latency: float,
+    drift_fraction: float,
+    timeout: float,
+    scenarios: tuple[str, ...],
+    keep: bool,
+    extra_env: dict[str, str] | None = None,
+    check: bool = False,
+) -> list[RunResult]:
+    """Run the requested scenarios for one scale, each scenario building on the cluster state of the previous one."""
+    results = []
+    directory = Path(tempfile.mkdtemp(prefix=f"mm-bench-{scale}-"))
+    generate(
+        directory,
+        buckets=scale,
+        service_accounts=max(scale // 10, 1),
+        iam_policies=max(scale // 20, 1),
+        bucket_policies=max(scale // 10, 1),
+    )
+    write_secrets(directory)
+    log_file = directory / "minio-manager.log"
+
+    with FakeMinioServer(latency=latency) as server:
+        env = child_environment(server.endpoint, extra_env)
+        for scenario in SCENARIOS:
+            if scenario == "drift":
+                apply_drift(server, drift_fraction)
+            server.state.reset_counts()
+            if scenario not in scenarios and scenario != "cold":
+                continue
+            accounting_file = directory / f"calls-{scenario}.json"
+            if check:
+                env["MINIO_MANAGER_CALL_ACCOUNTING_FILE"] = str(accounting_file)
+            run = run_minio_manager(directory, env, timeout, log_file)
+            result = _summarise(scale, scenario, run, server)
+            if check and accounting_file.exists():
+                summary = json.loads(accounting_file.read_text())["summary"]
+                result.budget_violations = check_budgets(scenario, summary)
+            if scenario in scenarios:
+                results.append(result)
+                print_result(result)
+
+    if keep:
+        print(f"Kept benchmark directory {directory}")
+    else:
+        shutil.rmtree(directory)
+    return results
+
+
+def print_result(result: RunResult):
+    status = "timeout" if result.exit_code is None else f"exit {result.exit_code}"
+    print(
+        f"{result.scale:>7} {result.scenario:<10} {result.wall_time:>9.2f}s {result.peak_rss_mb:>8.1f} MiB "
+        f"{result.api_calls:>8} calls ({result.reads} reads, {result.writes} writes) [{status}]",
+        flush=True,
+    )
+    for violation in result.budget_violations:
+        print(f"        over budget: {violation}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MinIO Manager against a fake MinIO server.")
+    parser.add_argument("--scales", default="100,1000,10000", help="comma-separated numbers of buckets")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenarios to report")
+    parser.add_argument("--latency", type=float, default=0.001, help="seconds of latency added to each API call")
+    parser.add_argument("--drift-fraction", type=float, default=0.1, help="fraction of resources drifted")
+    parser.add_argument("--timeout", type=float, default=3600, help="seconds before a single run is aborted")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the generated resources and logs")
+    parser.add_argument(
+        "--check-budgets",
+        action="store_true",
+        help="fail when resources take more API calls than call_budgets.py allows",
+    )
+    parser.add_argument(
+        "--env", action="append", default=[], metavar="NAME=VALUE", help="extra environment variable for MinIO Manager"
+    )
+    args = parser.parse_args()
+    extra_env = dict(variable.split("=", 1) for variable in args.env)
+
+    scenarios = tuple(args.scenarios.split(","))
+    results = []
+    print(f"{'scale':>7} {'scenario':<10} {'wall time':>10} {'peak RSS':>12} {'API calls':>9}")
+    for scale in (int(s) for s in args.scales.split(",")):
+        results += benchmark_scale(
+            scale, args.latency, args.drift_fraction, args.timeout, scenarios, args.keep, extra_env, args.check_budgets
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps([asdict(r) for r in results], indent=2))
+    if args.check_budgets and any(result.budget_violations or result.exit_code != 0 for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,201 @@
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+from minio_manager import bootstrap
+from minio_manager.classes.capabilities import capabilities
+from minio_manager.classes.journal import Journal
 from minio_manager.classes.logging_config import logger
-from minio_manager.classes.resource_parser import cluster_resources
+from minio_manager.classes.profiler import phase
+from minio_manager.classes.resource_parser import ClusterResources
 from minio_manager.classes.settings import settings
-from minio_manager.resource_handler import handle_resources
+from minio_manager.resource_handler import handle_resource_stream, handle_resources
+from minio_manager.utilities import get_error_count, read_json, read_yaml, start_time
 
 
-def main():
+def check_settings():
+    """Check the settings that can not be validated when they are loaded."""
+    if not settings.s3_endpoint_secure:
+        logger.warning("Using an insecure connection to MinIO. This is not recommended for production environments.")
+    sapbf = settings.service_account_policy_base_file
+    if sapbf and not Path(settings.service_account_policy_base_file).is_file():
+        logger.critical(f"Provided base policy file '{settings.service_account_policy_base_file}' not found.")
+        logger.critical("Either provide a valid base policy file, or leave this option empty.")
+
+
+def select_resources(cluster_resources: ClusterResources) -> ClusterResources:
+    """Select the parsed resources to reconcile, according to the shard, selector and since settings."""
+    resources = cluster_resources
+    if settings.shard_index_count:
+        resources = cluster_resources.shard(*settings.shard_index_count)
+        logger.info(f"Shard {settings.shard} contains {len(resources)} of {len(cluster_resources)} resources.")
+    if settings.only or settings.kind:
+        resources = resources.select(settings.selectors, settings.kind)
+        logger.info(f"Selected {len(resources)} of {len(cluster_resources)} resources.")
+    if settings.since:
+        from minio_manager.resource_diff import changed_since
+
+        changed = changed_since(settings.since, settings.cluster_resources_file)
+        resources = resources.subset(changed)
+        logger.info(f"{len(resources)} of {len(cluster_resources)} resources changed since '{settings.since}'.")
+    return resources
+
+
+def dry_run(resources: ClusterResources):
+    logger.info("Dry run mode enabled. No changes will be made.")
+    # Still check that the secret backend and the controller user's credentials can be loaded.
+    bootstrap.wait()
+    if settings.controller_policy_file:
+        from minio_manager.policy_evaluator import check_service_account_policies
+
+        controller_policy = read_json(settings.controller_policy_file)
+        check_service_account_policies(resources, controller_policy)
+
+
+def start_journal(resources: ClusterResources) -> tuple[Journal, ClusterResources]:
+    """Start the journal, leaving out the resources a previous run already reconciled when resuming."""
+    from minio_manager.resource_diff import fingerprint_resources
+
+    fingerprints = fingerprint_resources(read_yaml(settings.cluster_resources_file))
+    header = {
+        "cluster": settings.cluster_name,
+        "endpoint": settings.s3_endpoint,
+        "resources_file": settings.cluster_resources_file,
+    }
+    journal = Journal(settings.journal_file, header, fingerprints)
+    reconciled = journal.start(settings.resume)
+    if reconciled:
+        remaining = resources.subset(set(resources.resource_keys()) - reconciled)
+        logger.info(f"Resuming, {len(resources) - len(remaining)} resources were already reconciled.")
+        resources = remaining
+    return journal, resources
+
+
+def finish(journal: Journal | None, completed: bool):
+    """
+    Save the secret backend and close the journal, wait for the background threads and save the detected capabilities,
+    also after errors.
+    """
+    if journal is not None:
+        from minio_manager.classes.secrets import secrets
+
+        try:
+            if secrets.lazy_initialized:
+                secrets.save()
+                journal.credentials_saved()
+        finally:
+            # A run that stopped early, or had errors, can be resumed.
+            journal.close(completed and get_error_count() == 0)
+    bootstrap.join()
+    if capabilities.lazy_initialized:
+        capabilities.save()
+
+
+def reconcile(cluster_resources: ClusterResources | None = None) -> ClusterResources | None:
+    """
+    Reconcile the resources as configured by the settings, see Reconciler.
+
+    Args:
+        cluster_resources: the resources to reconcile, parsed from the cluster resources file if not given. The
+            journal only applies to the cluster resources file.
+
+    Returns: all resources, also those that were not selected, or None in daemon mode
+    """
+    journal = None
+    completed = False
     try:
-        logger.info(f"Running MinIO Manager against cluster '{settings.s3_endpoint}'")
-        cluster_resources.parse_resources(settings.cluster_resources_file)
-        if settings.dry_run:
-            logger.info("Dry run mode enabled. No changes will be made.")
-            return
+        with phase("startup"):
+            check_settings()
+            logger.info(f"Running MinIO Manager against cluster '{settings.s3_endpoint}'")
+            bootstrap.start()
+        if settings.daemon and not settings.dry_run:
+            from minio_manager.daemon import Daemon
 
-        logger.info("Applying cluster resources...")
-        handle_resources(cluster_resources)
+            Daemon().run()
+            return None
+
+        from_file = cluster_resources is None
+        if from_file:
+            cluster_resources = ClusterResources()
+        if from_file and settings.stream and not settings.dry_run:
+            # Resources with errors are not applied, and the whole file is checked before handling orphans.
+            handle_resource_stream(cluster_resources.stream_resources(settings.cluster_resources_file))
+        else:
+            if from_file:
+                with phase("parsing"):
+                    cluster_resources.parse_resources(settings.cluster_resources_file)
+            resources = select_resources(cluster_resources)
+            if settings.dry_run:
+                dry_run(resources)
+                return cluster_resources
+
+            if settings.journal_file and from_file:
+                journal, resources = start_journal(resources)
+            if resources:
+                logger.info("Applying cluster resources...")
+                handle_resources(resources, journal)
+            else:
+                logger.info("No resources to apply.")
+
+        if settings.orphans != "ignore":
+            from minio_manager.orphan_handler import handle_orphans
+
+            with phase("orphans"):
+                handle_orphans(cluster_resources)
+        completed = True
+        return cluster_resources
     finally:
-        from minio_manager.classes.secrets import secrets
+        finish(journal, completed)
+
 
-        # Cleanup functions must be idempotent.
+def cleanup():
+    """Clean up and report at the end of a run, also after errors. Cleanup functions must be idempotent."""
+    from minio_manager.classes.http_client import http_client
+    from minio_manager.classes.secrets import secrets
+
+    if secrets.lazy_initialized:
         secrets.cleanup()
+    if (settings.record_file or settings.replay_file) and http_client.lazy_initialized:
+        http_client.report()
+    if settings.call_accounting or settings.call_accounting_file:
+        from minio_manager.classes.call_accounting import call_accounting
+
+        call_accounting.report()
+
+
+def main():
+    try:
+        logger.info("Starting MinIO Manager...")
+        if settings.profile or settings.profile_memory:
+            logger.info(
+                f"Importing MinIO Manager and loading the settings took {time.time() - start_time:.2f} seconds."
+            )
+        if settings.export_state:
+            from minio_manager.snapshot import export_state
+
+            export_state(settings.export_state)
+            return
+        if settings.plan_state:
+            from minio_manager.plan import plan
+
+            plan(settings.plan_state)
+            return
+        if settings.clusters_file:
+            from minio_manager.fanout import reconcile_clusters
+
+            exit_code = reconcile_clusters(settings.clusters_file)
+            if exit_code:
+                sys.exit(exit_code)
+            return
+        if settings.groups:
+            from minio_manager.batch import reconcile_groups
+
+            exit_code = reconcile_groups(settings.groups)
+            if exit_code:
+                sys.exit(exit_code)
+            return
+        reconcile()
+    finally:
+        cleanup()
@@ -0,0 +1,152 @@
+"""
+Reconcile the resources files of many groups in one run, like `examples/my_group/` and the directories next to it.
+
+The groups are reconciled one after another, sharing everything that does not depend on their resources: the secret
+backend is downloaded and decrypted once, the clients and their connection pools are reused, the controller user's
+service accounts are listed once (see ServiceAccountIndex) and observed states are kept (see StateCache). Every group
+has its own error count and exit code, so a critical error in one group, like an invalid resources file, does not stop
+the others. Log messages are prefixed with the name of the group.
+
+Orphaned resources are handled once, after all groups, against the resources of all groups together, as every group
+only declares part of the resources on the cluster. They are not handled if the resources of a group could not be
+parsed, as its resources would look orphaned.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import sys
+import time
+from pathlib import Path
+
+from minio_manager import app
+from minio_manager.classes.logging_config import PrefixFilter, logger
+from minio_manager.classes.profiler import phase
+from minio_manager.classes.resource_parser import RESOURCE_KINDS, ClusterResources
+from minio_manager.classes.secrets import secrets
+from minio_manager.classes.settings import Settings, settings
+from minio_manager.classes.state_cache import state_cache
+from minio_manager.service_account_handler import service_account_index
+from minio_manager.utilities import error_counter, get_error_count
+
+DEFAULT_RESOURCES_FILE = "resources.yaml"
+
+
+def read_groups(groups: tuple[str, ...]) -> dict[str, str]:
+    """
+    Find the resources file and the name of every group.
+
+    Args:
+        groups: resources files, named after the file, or group directories containing a resources.yaml, named after
+            the directory
+
+    Returns: dict mapping the name of every group to its resources file
+    """
+    resources_files = {}
+    for group in groups:
+        path = Path(group)
+        if path.is_dir():
+            name, resources_file = path.resolve().name, path / DEFAULT_RESOURCES_FILE
+        else:
+            name, resources_file = path.stem, path
+        if name in resources_files:
+            logger.critical(f"Groups must have unique names, '{name}' is used by more than one group.")
+            sys.exit(195)
+        resources_files[name] = str(resources_file)
+    return resources_files
+
+
+def group_settings(name: str, resources_file: str) -> Settings:
+    """The settings to reconcile a single group with."""
+    update = {"cluster_resources_file": resources_file, "orphans": "ignore", "groups": ()}
+    if settings.journal_file:
+        journal_file = Path(settings.journal_file)
+        update["journal_file"] = str(journal_file.with_name(f"{journal_file.stem}-{name}{journal_file.suffix}"))
+    return settings.model_copy(update=update)
+
+
+def reconcile_group(name: str, resources_file: str) -> tuple[int, int, ClusterResources | None]:
+    """
+    Reconcile the resources of a single group, in a copy of the current context.
+
+    Args:
+        name: the name of the group
+        resources_file: the resources file of the group
+
+    Returns: the exit code MinIO Manager would have exited with when reconciling only this group, the number of errors,
+        and the parsed resources of the group, or None if they could not be parsed
+    """
+    scoped_settings = group_settings(name, resources_file)
+    settings.lazy_use(settings.lazy_scoped(lambda: scoped_settings))
+    error_counter.lazy_use(error_counter.lazy_scoped())
+    prefix = PrefixFilter(name)
+    # On the queue handler, which runs on the thread logging the message, so messages logged after the group finished
+    # are not prefixed with its name.
+    logger.queue_handler.addFilter(prefix)
+    resources = None
+    try:
+        resources = app.reconcile()
+        exit_code = 1 if get_error_count() else 0
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+        if exit_code == 0:
+            # Parsing exits successfully if the resources file has no resources.
+            resources = ClusterResources()
+    except Exception:
+        logger.exception("Unexpected error while reconciling")
+        exit_code = 1
+    finally:
+        if secrets.lazy_initialized:
+            # Save the credentials of new service accounts right away, in case a later group is interrupted.
+            secrets.save()
+        logger.queue_handler.removeFilter(prefix)
+    return exit_code, get_error_count(), resources
+
+
+def handle_orphans(group_resources: list[ClusterResources]) -> int:
+    """Handle the orphaned resources of all groups together, returning the exit code."""
+    from minio_manager.orphan_handler import handle_orphans as handle_cluster_orphans
+
+    declared = ClusterResources()
+    for resources in group_resources:
+        for kind in RESOURCE_KINDS:
+            getattr(declared, kind).extend(getattr(resources, kind))
+    error_count = get_error_count()
+    with phase("orphans"):
+        handle_cluster_orphans(declared)
+    return 1 if get_error_count() > error_count else 0
+
+
+def reconcile_groups(groups: tuple[str, ...]) -> int:
+    """
+    Reconcile the resources of every group, one group after another.
+
+    Args:
+        groups: the resources files or directories of the groups
+
+    Returns: the exit code of the first group that failed, 1 if handling the orphaned resources failed, or 0
+    """
+    resources_files = read_groups(groups)
+    logger.info(f"Reconciling {len(resources_files)} groups...")
+    results: dict[str, tuple[int, int, float]] = {}
+    group_resources = []
+    with service_account_index(), state_cache():
+        for name, resources_file in resources_files.items():
+            logger.info(f"Reconciling group '{name}' from {resources_file}...")
+            start = time.perf_counter()
+            exit_code, error_count, resources = contextvars.copy_context().run(reconcile_group, name, resources_file)
+            results[name] = exit_code, error_count, time.perf_counter() - start
+            if resources is not None:
+                group_resources.append(resources)
+
+    orphans_exit_code = 0
+    if settings.orphans != "ignore" and not settings.dry_run:
+        if len(group_resources) == len(resources_files):
+            orphans_exit_code = handle_orphans(group_resources)
+        else:
+            logger.warning("Not handling orphaned resources, as the resources of some groups could not be parsed.")
+
+    for name, (exit_code, error_count, seconds) in results.items():
+        log = logger.info if exit_code == 0 else logger.warning
+        log(f"Group '{name}': exit code {exit_code}, {error_count} errors, {seconds:.2f} seconds.")
+    return next((result[0] for result in results.values() if result[0] != 0), orphans_exit_code)
@@ -0,0 +1,41 @@
+"""
+Run the slow parts of starting MinIO Manager at the same time.
+
+Loading the secret backend (downloading and decrypting the KeePass database) and the controller user's credentials,
+parsing the resources and opening a connection to MinIO do not depend on each other. The secret backend, the controller
+user and the clients are created on first use, so start() creates them in the background while the main thread parses
+the resources. The first API call then only waits for whatever is still running.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import threading
+
+from minio_manager.classes.client_manager import client_manager
+from minio_manager.classes.http_client import warm_up
+from minio_manager.classes.logging_config import logger
+from minio_manager.utilities import start_thread
+
+# Per context, so reconcilers running at the same time only wait for their own threads.
+_threads: contextvars.ContextVar[list[threading.Thread]] = contextvars.ContextVar("minio_manager.bootstrap_threads")
+
+
+def start():
+    """Start loading the secret backend, the controller user and the clients, and warming up the connection."""
+    logger.debug("Loading the secret backend and warming up the connection to MinIO in the background.")
+    # The clients need the controller user's credentials, which need the secret backend.
+    _threads.set([start_thread(warm_up, name="bootstrap-warm-up"), client_manager.lazy_start()])
+
+
+def join():
+    """Wait for everything started in the background to finish, successfully or not."""
+    for thread in _threads.get([]):
+        thread.join()
+    _threads.set([])
+
+
+def wait():
+    """Wait for everything started in the background, exiting like it would have if it had failed on the main thread."""
+    join()
+    client_manager.lazy_get()
@@ -1,9 +1,11 @@
 from minio import S3Error
+from minio.versioningconfig import OFF
 
+from minio_manager.classes.capabilities import capabilities
 from minio_manager.classes.client_manager import client_manager
 from minio_manager.classes.logging_config import logger
 from minio_manager.classes.minio_resources import Bucket, ServiceAccount
-from minio_manager.classes.settings import settings
+from minio_manager.classes.state_cache import observed_state
 from minio_manager.service_account_handler import handle_service_account
 from minio_manager.utilities import compare_objects
 
@@ -16,18 +18,26 @@ def configure_versioning(bucket):
     if not bucket.versioning:
         return
 
-    versioning_status = client_manager.s3.get_bucket_versioning(bucket.name)
-    if versioning_status.status != bucket.versioning.status:
+    key = ("bucket_versioning", bucket.name)
+    state = observed_state()
+    versioning_status = state.read(key, lambda: client_manager.s3.get_bucket_versioning(bucket.name).status)
+    if versioning_status != bucket.versioning.status:
         # Versioning status does not match desired state
+        state.forget(key)
         try:
             client_manager.s3.set_bucket_versioning(bucket.name, bucket.versioning)
         except S3Error as s3e:
             if s3e.code == "InvalidBucketState":
                 logger.error(f"Bucket {bucket.name}: error setting versioning: {s3e.message}")
-                return
+            else:
+                logger.error(f"Bucket {bucket.name}: failed to set versioning: {s3e.code}")
+            return
+        state.written(
+            key, bucket.versioning.status, lambda: client_manager.s3.get_bucket_versioning(bucket.name).status
+        )
         if bucket.versioning.status == "Suspended":
             logger.warning(f"Bucket {bucket.name}: versioning is suspended!")
-        logger.debug(f"Bucket {bucket.name}: versioning {bucket.versioning.status.lower()}")
+        logger.debug("Bucket %s: versioning %s", bucket.name, bucket.versioning.status.lower())
 
 
 def check_bucket_lifecycle(bucket):
@@ -40,16 +50,20 @@ def check_bucket_lifecycle(bucket):
     :return: bool
     """
     # First compare the current lifecycle configuration with the desired configuration
-    logger.debug(f"Bucket {bucket.name}: comparing existing lifecycle management policy with desired state for bucket")
+    logger.debug("Bucket %s: comparing existing lifecycle management policy with desired state for bucket", bucket.name)
     try:
-        lifecycle_status = client_manager.s3.get_bucket_lifecycle(bucket.name)
+        lifecycle_status = observed_state().read(
+            ("bucket_lifecycle", bucket.name), lambda: client_manager.s3.get_bucket_lifecycle(bucket.name)
+        )
+        if lifecycle_status is not None:
+            capabilities.set("lifecycle_get", True)
         lifecycle_diff = compare_objects(lifecycle_status, bucket.lifecycle_config)
         if not lifecycle_diff:
             # If there is no difference, there is no need to update the lifecycle configuration
-            logger.debug(f"Bucket {bucket.name}: lifecycle management policies already up to date")
+            logger.debug("Bucket %s: lifecycle management policies already up to date", bucket.name)
             return True
 
-        logger.debug(f"Bucket {bucket.name}: current lifecycle management policy does not match desired state")
+        logger.debug("Bucket %s: current lifecycle management policy does not match desired state", bucket.name)
     except ValueError as ve:
         # This error occurs even if the bucket has a lifecycle configuration.
         # This happens specifically with the minio-py library and might be a bug.
@@ -59,7 +73,7 @@ def check_bucket_lifecycle(bucket):
 
         logger.warning("minio-py does not appear to support a GET request on this lifecycle API endpoint!")
         logger.warning("Ignoring this error and always overwriting the lifecycle policy.")
-        settings._get_on_lifecycle_supported = False
+        capabilities.set("lifecycle_get", False)
         return False
 
 
@@ -74,8 +88,7 @@ def configure_lifecycle(bucket):
         # TODO: ensure that the bucket does not have a lifecycle configuration
         return
 
-    # noinspection PyProtectedMember
-    if settings._get_on_lifecycle_supported:
+    if capabilities.get("lifecycle_get") is not False:
         # compare the current lifecycle configuration with the desired state
         if check_bucket_lifecycle(bucket):
             # existing lifecycle matches desired state, no need to update
@@ -84,13 +97,43 @@ def configure_lifecycle(bucket):
         logger.debug("get_bucket_lifecycle() does not appear to work, overwriting lifecycle policy")
 
     # Updating existing lifecycle configuration was found to be problematic, so we always delete any existing
-    # lifecycle configuration before setting the new one.
-    client_manager.s3.delete_bucket_lifecycle(bucket.name)
-    logger.debug(f"Bucket {bucket.name}: removed existing lifecycle management policy")
+    # lifecycle configuration before setting the new one. A bucket created in this run has none.
+    key = ("bucket_lifecycle", bucket.name)
+    state = observed_state()
+    if state.get(key) is not None:
+        state.forget(key)
+        client_manager.s3.delete_bucket_lifecycle(bucket.name)
+        logger.debug("Bucket %s: removed existing lifecycle management policy", bucket.name)
     client_manager.s3.set_bucket_lifecycle(bucket.name, bucket.lifecycle_config)
+    state.written(key, bucket.lifecycle_config, lambda: client_manager.s3.get_bucket_lifecycle(bucket.name))
     logger.info(f"Bucket {bucket.name}: lifecycle management policies updated")
 
 
+def prefetch_buckets(buckets: list[Bucket]):
+    """
+    Check which buckets exist with a single call, instead of one call per bucket, if the controller user may list
+    all buckets.
+
+    Only buckets that are listed are known to exist: the others are checked one by one, as the controller user may not
+    be allowed to see them.
+    """
+    if len(buckets) < 2 or capabilities.get("list_buckets") is False:
+        return
+    try:
+        existing = {bucket.name for bucket in client_manager.s3.list_buckets()}
+    except S3Error as s3e:
+        if s3e.code == "AccessDenied":
+            capabilities.set("list_buckets", False)
+        else:
+            logger.debug("Unable to list buckets, checking them one by one: %s", s3e)
+        return
+    capabilities.set("list_buckets", True)
+    state = observed_state()
+    for bucket in buckets:
+        if bucket.name in existing:
+            state.set(("bucket", bucket.name), True)
+
+
 def handle_bucket(bucket: Bucket):
     """Handle the specified bucket.
 
@@ -102,11 +145,16 @@ def handle_bucket(bucket: Bucket):
         bucket (Bucket): The bucket to handle.
     """
     try:
-        if not client_manager.s3.bucket_exists(bucket.name):
+        state = observed_state()
+        if not state.read(("bucket", bucket.name), lambda: client_manager.s3.bucket_exists(bucket.name)):
             logger.info(f"Creating bucket {bucket.name}")
             client_manager.s3.make_bucket(bucket.name)
+            state.set(("bucket", bucket.name), True)
+            state.set(("bucket_versioning", bucket.name), OFF)
+            state.set(("bucket_lifecycle", bucket.name), None)
+            state.set(("bucket_policy", bucket.name), None)
         else:
-            logger.debug(f"Bucket {bucket.name} already exists")
+            logger.debug("Bucket %s already exists", bucket.name)
     except S3Error as s3e:
         if s3e.code == "AccessDenied":
             logger.error(f"Controller user does not have permission to manage bucket {bucket.name}")
@@ -121,6 +169,4 @@ def handle_bucket(bucket: Bucket):
 
     if bucket.create_service_account:
         # TODO: is there a nicer way to go about this?
-        service_account = ServiceAccount(name=bucket.name)
-        service_account.generate_service_account_policy()
-        handle_service_account(service_account)
+        handle_service_account(ServiceAccount(bucket.name).with_base_policy())
@@ -0,0 +1,91 @@
+"""
+Run the encryption and decryption of MinIO admin API payloads in an executor.
+
+The admin API encrypts request and response payloads with a key derived by Argon2id for every single payload, which
+takes tens of milliseconds of CPU time. When thousands of service accounts are created or updated from multiple
+threads, this CPU-bound work limits the throughput. With a process pool as executor, the key derivations run in
+parallel on all CPUs, while the calling threads wait for the network.
+
+minio-py has no hook for this, so the encrypt and decrypt functions used by minio.minioadmin are replaced once the
+executor is configured. This applies to every MinioAdmin client in the process.
+"""
+
+from __future__ import annotations
+
+import atexit
+import io
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from minio import crypto, minioadmin
+from urllib3 import BaseHTTPResponse, HTTPResponse
+
+_executor: Executor | None = None
+
+
+def _decrypt_bytes(data: bytes, secret_key: str) -> bytes:
+    response = HTTPResponse(body=io.BytesIO(data), preload_content=False)
+    return crypto.decrypt(response, secret_key)
+
+
+def encrypt(payload: bytes, password: str) -> bytes:
+    """Encrypt a request payload like minio.crypto.encrypt, in the configured executor."""
+    if _executor is None:
+        return crypto.encrypt(payload, password)
+    return _executor.submit(crypto.encrypt, payload, password).result()
+
+
+def decrypt(response: BaseHTTPResponse, secret_key: str) -> bytes:
+    """Decrypt a response like minio.crypto.decrypt, in the configured executor."""
+    if _executor is None:
+        return crypto.decrypt(response, secret_key)
+    try:
+        data = response.read()
+    finally:
+        response.close()
+        response.release_conn()
+    return _executor.submit(_decrypt_bytes, data, secret_key).result()
+
+
+def set_executor(executor: Executor | None):
+    """
+    Configure the executor that encrypts and decrypts admin API payloads.
+
+    Args:
+        executor: the executor, or None to encrypt and decrypt in the calling thread
+    """
+    global _executor
+    _executor = executor
+    minioadmin.encrypt = encrypt
+    minioadmin.decrypt = decrypt
+
+
+def start_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Start a process pool for encrypting and decrypting admin API payloads, and configure it as executor.
+
+    The workers are started by a fork server, as forking this process is unsafe once it runs threads, like the log
+    listener and the threads loading the settings and secrets. The fork server imports this module once, so the
+    workers only import minio-py's crypto functions and do not initialise MinIO Manager.
+
+    A process pool that was started before, e.g. by another reconciler in the same process, is used instead.
+
+    Args:
+        workers: the number of worker processes
+
+    Returns: ProcessPoolExecutor
+    """
+    if isinstance(_executor, ProcessPoolExecutor):
+        return _executor
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+    else:
+        context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    # Start the fork server and the first worker now, so failing to start them is not blamed on a resource.
+    executor.submit(os.getpid).result()
+    set_executor(executor)
+    atexit.register(executor.shutdown, cancel_futures=True)
+    return executor
@@ -0,0 +1,145 @@
+"""
+Count the API calls made for every resource, to find handlers making more calls than they need to.
+
+Every request sent through the shared connection pool, see http_client.py, is attributed to the resource being handled
+and to the handler function that made it, and counted as a read (GET and HEAD) or a write (any other method). At the
+end of the run a summary is logged per kind of resource, separately for unchanged resources (no writes) and changed
+ones, e.g.:
+
+    unchanged bucket: 3 reads, 0 writes per resource, at most 4 reads and 0 writes (40 resources)
+
+Calls that are shared by many resources, like listing the service accounts once, count towards the resource that
+needed them first. Calls made outside of handling a resource, like loading the secret backend, are counted separately.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+
+import urllib3
+
+from minio_manager.classes.lazy_singleton import LazySingleton
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.profiler import current_resource
+from minio_manager.classes.settings import settings
+
+OUTSIDE_RESOURCES = "outside resources"
+READ_METHODS = frozenset({"GET", "HEAD"})
+
+
+def calling_handler() -> str:
+    """
+    The function making the current call, e.g. "bucket_handler.check_bucket_versioning".
+
+    This is the innermost function outside of minio_manager.classes, or the outermost one inside it for calls made by
+    the classes on their own, like loading the secret backend on a background thread.
+    """
+    frame = sys._getframe(1)
+    handler = "unknown"
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("minio_manager."):
+            handler = f"{module.rpartition('.')[2]}.{frame.f_code.co_qualname}"
+            if not module.startswith("minio_manager.classes."):
+                break
+        frame = frame.f_back
+    return handler
+
+
+class CallAccounting:
+    """CallAccounting counts the reads and writes made for every resource, and by every handler for it."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: dict[str, Counter[tuple[str, str]]] = {}
+
+    def record(self, method: str):
+        resource = current_resource.get() or OUTSIDE_RESOURCES
+        kind = "reads" if method.upper() in READ_METHODS else "writes"
+        handler = calling_handler()
+        with self.lock:
+            self.calls.setdefault(resource, Counter())[handler, kind] += 1
+
+    def resources(self) -> dict[str, dict]:
+        """The reads and writes made for every resource, in total and by handler."""
+        with self.lock:
+            calls = {resource: Counter(counts) for resource, counts in self.calls.items()}
+        result = {}
+        for resource, counts in sorted(calls.items()):
+            handlers: dict[str, dict[str, int]] = {}
+            for (handler, kind), count in sorted(counts.items()):
+                handlers.setdefault(handler, {"reads": 0, "writes": 0})[kind] = count
+            result[resource] = {
+                "reads": sum(handler["reads"] for handler in handlers.values()),
+                "writes": sum(handler["writes"] for handler in handlers.values()),
+                "handlers": handlers,
+            }
+        return result
+
+    @staticmethod
+    def summarise(resources: dict[str, dict]) -> dict[str, dict]:
+        """
+        Summarise the calls per kind of resource, separately for unchanged and changed resources.
+
+        Returns: the number of resources, the average reads and writes, and the most reads and writes per resource, by
+            e.g. "unchanged bucket"
+        """
+        groups: dict[str, list[dict]] = {}
+        for resource, calls in resources.items():
+            if resource == OUTSIDE_RESOURCES:
+                group = OUTSIDE_RESOURCES
+            else:
+                # e.g. "bucket 'my-bucket'"
+                kind = resource.partition(" '")[0]
+                group = f"{'changed' if calls['writes'] else 'unchanged'} {kind}"
+            groups.setdefault(group, []).append(calls)
+        return {
+            group: {
+                "resources": len(calls),
+                "reads": round(sum(c["reads"] for c in calls) / len(calls), 2),
+                "writes": round(sum(c["writes"] for c in calls) / len(calls), 2),
+                "max_reads": max(c["reads"] for c in calls),
+                "max_writes": max(c["writes"] for c in calls),
+            }
+            for group, calls in sorted(groups.items())
+        }
+
+    def report(self):
+        """Log the summary, and write all counts to call_accounting_file if configured."""
+        resources = self.resources()
+        summary = self.summarise(resources)
+        logger.info("API calls per resource:")
+        for group, calls in summary.items():
+            logger.info(
+                f"  {group}: {calls['reads']:g} reads, {calls['writes']:g} writes per resource, at most "
+                f"{calls['max_reads']} reads and {calls['max_writes']} writes ({calls['resources']} resources)"
+            )
+        handlers: Counter[str] = Counter()
+        for calls in resources.values():
+            for handler, counts in calls["handlers"].items():
+                handlers[handler] += counts["reads"] + counts["writes"]
+        for handler, count in handlers.most_common(settings.profile_top):
+            logger.debug("%s made %s API calls", handler, count)
+        if settings.call_accounting_file:
+            path = Path(settings.call_accounting_file)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({"summary": summary, "resources": resources}, indent=2), encoding="utf-8")
+            logger.info(f"Wrote the API calls of {len(resources)} resources to {path}.")
+
+
+def accounting_pool_manager(pool_manager_class: type[urllib3.PoolManager]) -> type[urllib3.PoolManager]:
+    """A subclass of the given connection pool class that counts every request, see CallAccounting."""
+
+    class AccountingPoolManager(pool_manager_class):
+        def urlopen(self, method: str, url: str, redirect: bool = True, **kw):
+            call_accounting.record(method)
+            return super().urlopen(method, url, redirect, **kw)
+
+    return AccountingPoolManager
+
+
+call_accounting = LazySingleton("call_accounting", CallAccounting)  # type: CallAccounting
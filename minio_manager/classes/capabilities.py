@@ -0,0 +1,126 @@
+"""
+Remember which APIs the MinIO server supports, so the fastest way of calling it is used from the first call on.
+
+Capabilities are detected while reconciling, by trying the fast way the first time it is useful:
+
+- lifecycle_get: getting the lifecycle configuration of a bucket works, minio-py fails on some configurations
+- bulk_policy_list: listing the IAM policies returns their documents, so they do not have to be retrieved one by one
+- list_buckets: the controller user may list all buckets, so their existence does not have to be checked one by one
+- service_account_names: listing the service accounts returns their names, so service accounts listed without one
+  have none and do not have to be read one by one. Older MinIO versions only list the access keys. Only support is
+  recorded, as MinIO also leaves out the name of service accounts that have none.
+
+With `capabilities_file`, detected capabilities are saved by endpoint and server version, and used by the next runs
+for `capabilities_ttl` seconds. Without it, they are only used for the rest of the run.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from minio.error import MinioAdminException
+from urllib3.exceptions import HTTPError
+
+from minio_manager.classes.client_manager import client_manager
+from minio_manager.classes.lazy_singleton import LazySingleton
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.settings import settings
+
+CAPABILITY_NAMES = ("lifecycle_get", "bulk_policy_list", "list_buckets", "service_account_names")
+
+
+class Capabilities:
+    """
+    Capabilities holds what the MinIO server of the current settings is known to support.
+
+    A capability is True if it is supported, False if it is not and None if that is not known yet.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.known: dict[str, bool] = {}
+        self.detected_at = time.time()
+        self.changed = False
+        self._server_version: str | None = None
+        self._server_version_read = False
+        if settings.capabilities_file:
+            self.load()
+
+    def server_version(self) -> str | None:
+        """The versions of the MinIO servers, or None if the controller user may not get them."""
+        if not self._server_version_read:
+            self._server_version_read = True
+            try:
+                info = json.loads(client_manager.admin.info())
+                versions = sorted({server.get("version", "") for server in info.get("servers") or []})
+                self._server_version = ",".join(versions) or None
+            except (MinioAdminException, HTTPError, ValueError) as e:
+                logger.debug("Unable to get the MinIO server version: %s", e)
+        return self._server_version
+
+    def read_file(self) -> dict:
+        try:
+            return json.loads(Path(settings.capabilities_file).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to read capabilities file {settings.capabilities_file}, detecting them again: {e}")
+            return {}
+
+    def load(self):
+        """Use the capabilities detected by a previous run, unless they expired or the server was upgraded."""
+        entry = self.read_file().get(settings.s3_endpoint)
+        if not isinstance(entry, dict):
+            return
+        if time.time() - entry.get("detected_at", 0) > settings.capabilities_ttl:
+            logger.debug("Capabilities of %s expired, detecting them again.", settings.s3_endpoint)
+            return
+        if entry.get("version") != self.server_version():
+            logger.info(f"MinIO on {settings.s3_endpoint} was upgraded, detecting its capabilities again.")
+            return
+        capabilities = entry.get("capabilities") or {}
+        self.known = {name: value for name, value in capabilities.items() if name in CAPABILITY_NAMES}
+        self.detected_at = entry["detected_at"]
+        logger.debug("Loaded capabilities of %s: %s", settings.s3_endpoint, self.known)
+
+    def get(self, name: str) -> bool | None:
+        """Whether a capability is supported, or None if that is not known yet."""
+        with self.lock:
+            return self.known.get(name)
+
+    def set(self, name: str, supported: bool):
+        """Record whether a capability is supported."""
+        with self.lock:
+            if self.known.get(name) == supported:
+                return
+            self.known[name] = supported
+            self.changed = True
+        log = logger.debug if supported else logger.info
+        log(f"MinIO on {settings.s3_endpoint} {'supports' if supported else 'does not support'} {name}.")
+
+    def save(self):
+        """Save the capabilities detected in this run to the capabilities file, if any."""
+        if not settings.capabilities_file or not self.changed:
+            return
+        entries = self.read_file()
+        with self.lock:
+            entries[settings.s3_endpoint] = {
+                "version": self.server_version(),
+                "detected_at": self.detected_at,
+                "capabilities": dict(self.known),
+            }
+            self.changed = False
+        path = Path(settings.capabilities_file)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Replaced at once, so runs against other endpoints saving at the same time never see a partial file.
+        with tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".tmp", delete=False, encoding="utf-8") as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+        os.replace(f.name, path)
+
+
+capabilities = LazySingleton("capabilities", Capabilities)  # type: Capabilities
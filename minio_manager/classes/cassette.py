@@ -0,0 +1,208 @@
+"""
+Record the API calls of a run to a cassette file, and replay them later without MinIO.
+
+A cassette is a JSON Lines file: a header, followed by every request with its response and how long it took, e.g.:
+
+    {"version": 1, "endpoint": "minio.example.com", "recorded_at": 1700000000.0}
+    {"method": "GET", "path": "/my-bucket", "query": "versioning=", "status": 200, "headers": {...}, "body": "...",
+     "start_ms": 12.3, "elapsed_ms": 4.5}
+
+Secrets are masked in the response bodies with the patterns of MinioManagerFilter, and requests are recorded without
+their headers and bodies. The responses of the admin API are encrypted with the secret key of the controller user, so
+they are recorded decrypted, and encrypted again with the secret key of the controller user of the replaying run. The
+secret backend bucket is recorded without its contents: replay with the YAML secret backend.
+
+When replaying, every request is answered with the next recorded response to the same method, path and query, after
+the recorded time multiplied by `replay_latency_scale`. Requests that were not recorded fail.
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+import json
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import urllib3
+from minio import crypto
+from urllib3 import HTTPHeaderDict, HTTPResponse
+
+from minio_manager.classes.logging_config import MinioManagerFilter, logger
+from minio_manager.classes.settings import settings
+
+CASSETTE_VERSION = 1
+ADMIN_PREFIX = "/minio/admin/"
+# Response headers that describe the connection or the encoding of the body as it was sent, rather than the response.
+SKIPPED_HEADERS = frozenset(
+    {"connection", "content-encoding", "content-length", "date", "keep-alive", "transfer-encoding"}
+)
+
+
+def request_key(method: str, url: str) -> tuple[str, str, str]:
+    """The method, path and query identifying a request, with the query parameters in a fixed order."""
+    parts = urlsplit(url)
+    return method, parts.path, urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+
+def controller_secret_key() -> str:
+    from minio_manager.classes.controller_user import controller_user
+
+    return controller_user.secret_key
+
+
+def is_encrypted(path: str, headers: HTTPHeaderDict) -> bool:
+    """Whether a response is an encrypted admin API payload."""
+    return path.startswith(ADMIN_PREFIX) and headers.get("Content-Type") == "application/octet-stream"
+
+
+def replace_body(response: HTTPResponse, data: bytes, preload_content: bool, **kw) -> HTTPResponse:
+    """A response like the given one, with the given body, which can be read again by the caller."""
+    return HTTPResponse(
+        body=io.BytesIO(data),
+        headers=response.headers,
+        status=response.status,
+        reason=response.reason,
+        preload_content=preload_content,
+        decode_content=False,
+        **kw,
+    )
+
+
+class RecordingPoolManager(urllib3.PoolManager):
+    """
+    RecordingPoolManager sends requests like the default pool, appending every request and its response to a cassette.
+
+    Args:
+        cassette_file: the file to record to, replaced when recording starts
+    """
+
+    def __init__(self, cassette_file: str, **kw):
+        super().__init__(**kw)
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.calls = 0
+        self.file = open(cassette_file, "w", encoding="utf-8")  # noqa: SIM115, closed with close()
+        header = {"version": CASSETTE_VERSION, "endpoint": settings.s3_endpoint, "recorded_at": time.time()}
+        self.file.write(json.dumps(header) + "\n")
+        self.file.flush()
+        logger.info(f"Recording all API calls to {cassette_file}.")
+
+    def urlopen(self, method: str, url: str, redirect: bool = True, **kw):
+        preload_content = kw.pop("preload_content", True)
+        start = time.perf_counter()
+        response = super().urlopen(method, url, redirect, preload_content=False, **kw)
+        try:
+            data = response.read(decode_content=True)
+        finally:
+            response.release_conn()
+        elapsed = time.perf_counter() - start
+        self.record(method, url, response, data, start - self.start, elapsed)
+        return replace_body(response, data, preload_content, request_method=method, request_url=url)
+
+    def record(self, method: str, url: str, response: HTTPResponse, data: bytes, start: float, elapsed: float):
+        method, path, query = request_key(method, url)
+        entry = {
+            "method": method,
+            "path": path,
+            "query": query,
+            "status": response.status,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() not in SKIPPED_HEADERS},
+            "start_ms": round(start * 1000, 3),
+            "elapsed_ms": round(elapsed * 1000, 3),
+        }
+        if path.strip("/").split("/")[0] == settings.secret_backend_s3_bucket:
+            entry["omitted"] = True
+            data = b""
+        elif data and is_encrypted(path, response.headers):
+            try:
+                data = crypto.decrypt(
+                    HTTPResponse(body=io.BytesIO(data), preload_content=False), controller_secret_key()
+                )
+                entry["encrypted"] = True
+            except Exception as e:  # the payload is recorded as is
+                logger.debug("Unable to decrypt the response to %s %s: %s", method, path, e)
+        try:
+            entry["body"] = MinioManagerFilter.mask_secrets(data.decode())
+        except UnicodeDecodeError:
+            entry["body_base64"] = base64.b64encode(data).decode()
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.calls += 1
+
+    def report(self):
+        with self.lock:
+            self.file.close()
+        logger.info(f"Recorded {self.calls} API calls.")
+
+
+class ReplayPoolManager(urllib3.PoolManager):
+    """
+    ReplayPoolManager answers requests with the responses recorded in a cassette, without any network traffic.
+
+    Args:
+        cassette_file: the cassette to replay
+        latency_scale: the recorded time of every call is multiplied by this, 0 to answer right away
+    """
+
+    def __init__(self, cassette_file: str, latency_scale: float, **kw):
+        super().__init__(**kw)
+        self.lock = threading.Lock()
+        self.latency_scale = latency_scale
+        self.responses: dict[tuple[str, str, str], deque[dict]] = {}
+        self.replayed: Counter[str] = Counter()
+        self.missing: Counter[str] = Counter()
+        with open(cassette_file, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != CASSETTE_VERSION:
+                logger.critical(f"{cassette_file} is not a version {CASSETTE_VERSION} cassette.")
+            for line in f:
+                entry = json.loads(line)
+                key = entry["method"], entry["path"], entry["query"]
+                self.responses.setdefault(key, deque()).append(entry)
+        self.recorded = sum(len(entries) for entries in self.responses.values())
+        logger.info(
+            f"Replaying {self.recorded} API calls recorded against {header.get('endpoint')} from {cassette_file}."
+        )
+
+    def next_entry(self, key: tuple[str, str, str]) -> dict | None:
+        """The next recorded response to a request, the last one being reused when a request is repeated more often."""
+        with self.lock:
+            entries = self.responses.get(key)
+            if not entries:
+                self.missing[f"{key[0]} {key[1]}"] += 1
+                return None
+            self.replayed[f"{key[0]} {key[1]}"] += 1
+            return entries.popleft() if len(entries) > 1 else entries[0]
+
+    def urlopen(self, method: str, url: str, redirect: bool = True, **kw):
+        key = request_key(method, url)
+        entry = self.next_entry(key)
+        if entry is None:
+            raise urllib3.exceptions.HTTPError(f"{method} {key[1]}?{key[2]} was not recorded in the cassette")
+        if self.latency_scale:
+            time.sleep(entry["elapsed_ms"] / 1000 * self.latency_scale)
+        data = base64.b64decode(entry["body_base64"]) if "body_base64" in entry else entry["body"].encode()
+        if entry.get("encrypted"):
+            data = crypto.encrypt(data, controller_secret_key())
+        return HTTPResponse(
+            body=io.BytesIO(data),
+            headers=HTTPHeaderDict(entry["headers"]),
+            status=entry["status"],
+            preload_content=kw.get("preload_content", True),
+            decode_content=False,
+            request_method=method,
+            request_url=url,
+        )
+
+    def report(self):
+        with self.lock:
+            replayed, missing = sum(self.replayed.values()), sum(self.missing.values())
+        log = logger.warning if missing else logger.info
+        log(f"Replayed {replayed} of {self.recorded} recorded API calls, {missing} calls were not recorded.")
+        for call, count in self.missing.most_common(10):
+            logger.debug("Not recorded: %s (%s times)", call, count)
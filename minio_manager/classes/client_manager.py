@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import json
+import threading
 
 from minio import Minio, MinioAdmin, credentials
 
 from minio_manager import logger
 from minio_manager.classes.controller_user import controller_user
+from minio_manager.classes.http_client import http_client
+from minio_manager.classes.lazy_singleton import LazySingleton
 from minio_manager.classes.settings import settings
 
 
@@ -28,18 +31,22 @@ class ClientManager:
     Methods:
         admin:
             A property that initializes and returns the MinIO Admin client if it is not already initialized.
+        controller_user_policy:
+            A property that returns the policy of the controller user, initializing the admin client if needed.
     """
 
     s3: Minio
     _admin: MinioAdmin = None
-    controller_user_policy: dict
+    _controller_user_policy: dict = None
 
     def __init__(self):
+        self._admin_lock = threading.Lock()
         self.s3 = Minio(
             endpoint=settings.s3_endpoint,
             access_key=controller_user.access_key,
             secret_key=controller_user.secret_key,
             secure=settings.s3_endpoint_secure,
+            http_client=http_client.lazy_get(),
         )
 
     @property
@@ -47,23 +54,44 @@ class ClientManager:
         if self._admin is not None:
             return self._admin
 
-        logger.debug("Initialising admin client.")
-        admin_provider = credentials.StaticProvider(controller_user.access_key, controller_user.secret_key)
-        self._admin = MinioAdmin(
-            endpoint=settings.s3_endpoint, credentials=admin_provider, secure=settings.s3_endpoint_secure
-        )
-        logger.debug("Admin client initialised.")
-        self.controller_user_policy = self._setup_controller_user_policy()
+        with self._admin_lock:
+            if self._admin is not None:
+                return self._admin
+
+            logger.debug("Initialising admin client.")
+            admin_provider = credentials.StaticProvider(controller_user.access_key, controller_user.secret_key)
+            admin = MinioAdmin(
+                endpoint=settings.s3_endpoint,
+                credentials=admin_provider,
+                secure=settings.s3_endpoint_secure,
+                http_client=http_client.lazy_get(),
+            )
+            logger.debug("Admin client initialised.")
+            if settings.admin_crypto_workers:
+                from minio_manager.classes.admin_crypto import start_process_pool
+
+                logger.debug(f"Starting {settings.admin_crypto_workers} processes for admin API payload encryption.")
+                start_process_pool(settings.admin_crypto_workers)
+            # Only publish the admin client once it is ready, other threads use it without taking the lock.
+            self._controller_user_policy = self._setup_controller_user_policy(admin)
+            self._admin = admin
         return self._admin
 
-    def _setup_controller_user_policy(self) -> dict:
-        """Get the S3 client."""
+    @property
+    def controller_user_policy(self) -> dict:
+        """The policy of the controller user, which limits the policies of the service accounts it manages."""
+        _ = self.admin
+        return self._controller_user_policy
+
+    @staticmethod
+    def _setup_controller_user_policy(admin: MinioAdmin) -> dict:
+        """Get the policy of the controller user."""
         logger.debug("Retrieving controller user policy from MinIO.")
-        controller_user_info_raw = self._admin.get_service_account(controller_user.access_key)
+        controller_user_info_raw = admin.get_service_account(controller_user.access_key)
         controller_user_dict = json.loads(controller_user_info_raw)
         controller_user_policy = json.loads(controller_user_dict["policy"])
         logger.debug("Retrieved controller user policy from MinIO.")
         return controller_user_policy
 
 
-client_manager = ClientManager()
+client_manager = LazySingleton("client_manager", ClientManager)  # type: ClientManager
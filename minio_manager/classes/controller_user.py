@@ -1,18 +1,20 @@
-from minio_manager.classes.minio_resources import ServiceAccount
+from minio_manager.classes.lazy_singleton import LazySingleton
+from minio_manager.classes.minio_resources import Credentials, ServiceAccount
 from minio_manager.classes.secrets import secrets
 from minio_manager.classes.settings import settings
 
 
-class ControllerUser(ServiceAccount):
+class ControllerUser(Credentials):
     """
-    ControllerUser represents the controller user of our application.
+    ControllerUser represents the credentials of the controller user of our application.
     """
 
     def __init__(self, name: str):
-        super().__init__(name=name)
-        account = secrets.get_credentials(self, required=True)
-        self.access_key = account.access_key
-        self.secret_key = account.secret_key
+        self.account = ServiceAccount(name)
+        credentials = secrets.get_credentials(self.account, required=True)
+        super().__init__(credentials.access_key, credentials.secret_key)
 
 
-controller_user = ControllerUser(name=settings.minio_controller_user)
+controller_user = LazySingleton(
+    "controller_user", lambda: ControllerUser(name=settings.minio_controller_user)
+)  # type: ControllerUser
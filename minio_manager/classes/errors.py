@@ -55,6 +55,14 @@ class MinioAccessDeniedError(MinioManagerBaseError):
         super().__init__(message)
 
 
+class ReconcileError(MinioManagerBaseError):
+    """Raised by a Reconciler when reconciling stopped, where MinIO Manager would have exited with exit_code."""
+
+    def __init__(self, message: str, exit_code: int):
+        self.exit_code = exit_code
+        super().__init__(message, f"exit code {exit_code}")
+
+
 error_map = {
     "BaseError": MinioManagerBaseError,
     "ConnectionError": ConnectionError,
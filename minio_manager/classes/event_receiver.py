@@ -0,0 +1,293 @@
+"""
+Receive MinIO audit log and bucket notification webhooks, to reconcile resources changed outside MinIO Manager.
+
+Configure MinIO to send its audit log, or bucket notifications, to the daemon's `daemon_events_address`, e.g.:
+
+    mc admin config set myminio audit_webhook:minio-manager endpoint=http://minio-manager:8080 auth_token=...
+
+Every event is reduced to the targets it changed: a bucket, an IAM policy, the policies of a user, or a service account
+by access key. Reads, object operations and changes made by the controller user itself are ignored. DriftIndex maps the
+targets to the resources that declare them.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import hmac
+import json
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.minio_resources import ServiceAccount
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.utilities import start_thread
+
+# S3 API calls that change the configuration of a bucket, as named in the audit log.
+BUCKET_APIS = frozenset(
+    {
+        "PutBucket",
+        "DeleteBucket",
+        "PutBucketVersioning",
+        "PutBucketLifecycle",
+        "DeleteBucketLifecycle",
+        "PutBucketPolicy",
+        "DeleteBucketPolicy",
+    }
+)
+# Admin API calls that change IAM, by command, with the kind of target and the query parameter naming it.
+ADMIN_TARGETS = {
+    "add-canned-policy": ("iam_policy", "name"),
+    "remove-canned-policy": ("iam_policy", "name"),
+    "set-user-or-group-policy": ("user", "userOrGroup"),
+    "update-service-account": ("access_key", "accessKey"),
+    "delete-service-account": ("access_key", "accessKey"),
+}
+# Bucket notifications are mostly about objects, only these are about buckets.
+BUCKET_EVENTS = ("s3:BucketCreated:", "s3:BucketRemoved:")
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+
+def audit_targets(entry: dict) -> Iterator[tuple[str, str]]:
+    """Yield the (kind, name) targets changed by the API call of an audit log entry."""
+    api = entry.get("api") or {}
+    if api.get("name") in BUCKET_APIS and api.get("bucket"):
+        yield "bucket", api["bucket"]
+    command = urlsplit(entry.get("requestPath") or "").path.rstrip("/").rpartition("/")[2]
+    if command in ADMIN_TARGETS:
+        kind, parameter = ADMIN_TARGETS[command]
+        name = (entry.get("requestQuery") or {}).get(parameter)
+        if name:
+            yield kind, name
+
+
+def notification_targets(event: dict) -> Iterator[tuple[str, str]]:
+    """Yield the buckets created or removed according to a bucket notification."""
+    for record in event.get("Records") or []:
+        if str(record.get("eventName", "")).startswith(BUCKET_EVENTS):
+            name = ((record.get("s3") or {}).get("bucket") or {}).get("name")
+            if name:
+                yield "bucket", name
+
+
+def parse_events(body: bytes) -> list[dict]:
+    """Parse a webhook request body: a JSON object, a list of them, or one object per line when MinIO batches them."""
+    try:
+        events = json.loads(body)
+    except ValueError:
+        events = [json.loads(line) for line in body.splitlines() if line.strip()]
+    if isinstance(events, dict):
+        events = [events]
+    return [event for event in events if isinstance(event, dict)]
+
+
+def event_origin(event: dict) -> str | None:
+    """The access key that made the change an event is about."""
+    if "accessKey" in event:
+        return event["accessKey"]
+    for record in event.get("Records") or []:
+        return (record.get("userIdentity") or {}).get("principalId")
+    return None
+
+
+class ContextHTTPServer(ThreadingHTTPServer):
+    """A ThreadingHTTPServer handling every request in a copy of the context it was created in, see start_thread()."""
+
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.context = contextvars.copy_context()
+
+    def process_request_thread(self, request, client_address):
+        self.context.copy().run(super().process_request_thread, request, client_address)
+
+
+class EventReceiver:
+    """
+    EventReceiver listens for webhooks from MinIO on a background thread, collecting the targets they changed.
+
+    Bursts of events, like a script changing many buckets, are coalesced: take() only returns the targets once no events
+    arrived for the debounce period, or once they have been waiting for ten debounce periods.
+
+    Args:
+        address: the host:port to listen on
+        token: the token MinIO sends in the Authorization header, None to accept all webhooks
+        ignored_access_key: the access key of the controller user, whose changes are not drift
+    """
+
+    def __init__(self, address: str, token: str | None, ignored_access_key: str | None):
+        self.token = token
+        self.ignored_access_key = ignored_access_key
+        self.lock = threading.Lock()
+        self.pending: set[tuple[str, str]] = set()
+        self.first_event = 0.0
+        self.last_event = 0.0
+        host, _, port = address.rpartition(":")
+        self.server = ContextHTTPServer((host, int(port)), self._request_handler())
+        start_thread(self.server.serve_forever, name="event-receiver")
+        if not token:
+            logger.warning("Accepting MinIO webhooks without a token, set daemon_events_token to require one.")
+        logger.info(f"Receiving MinIO audit log and bucket notification webhooks on {self.address}.")
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def _request_handler(self) -> type[BaseHTTPRequestHandler]:
+        receiver = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                # MinIO checks whether webhook targets are online.
+                self._respond(200)
+
+            def do_GET(self):
+                self._respond(200)
+
+            def do_POST(self):
+                if not receiver.authorized(self.headers.get("Authorization")):
+                    self._respond(401)
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_BODY_SIZE:
+                    self._respond(413)
+                    return
+                try:
+                    events = parse_events(self.rfile.read(length))
+                except ValueError:
+                    self._respond(400)
+                    return
+                receiver.add(events)
+                self._respond(200)
+
+            def _respond(self, status: int):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):  # noqa: A002, overrides BaseHTTPRequestHandler
+                logger.debug("Webhook from %s: " + format, self.client_address[0], *args)
+
+        return RequestHandler
+
+    def authorized(self, authorization: str | None) -> bool:
+        if not self.token:
+            return True
+        if not authorization:
+            return False
+        # MinIO sends the token as is, or prefixed with "Bearer" depending on the version.
+        token = authorization.removeprefix("Bearer ").strip()
+        return hmac.compare_digest(token.encode(), self.token.encode())
+
+    def add(self, events: Iterable[dict]):
+        """Collect the targets changed by the given events."""
+        targets = set()
+        for event in events:
+            if self.ignored_access_key and event_origin(event) == self.ignored_access_key:
+                continue
+            targets.update(audit_targets(event))
+            targets.update(notification_targets(event))
+        if not targets:
+            return
+        logger.debug("Received events changing %s", sorted(targets))
+        now = time.monotonic()
+        with self.lock:
+            if not self.pending:
+                self.first_event = now
+            self.pending.update(targets)
+            self.last_event = now
+
+    def take(self, debounce: float) -> set[tuple[str, str]]:
+        """
+        Take the targets changed since the previous take, once the events about them have settled.
+
+        Args:
+            debounce: seconds without new events before the targets are returned
+
+        Returns: the (kind, name) targets, empty if there are none or more events are expected
+        """
+        now = time.monotonic()
+        with self.lock:
+            if not self.pending:
+                return set()
+            if now - self.last_event < debounce and now - self.first_event < debounce * 10:
+                return set()
+            targets, self.pending = self.pending, set()
+        return targets
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class DriftIndex:
+    """
+    DriftIndex finds the resources declaring the targets changed by events, see EventReceiver.
+
+    Service accounts are found by their access key in the secret backend, which is only looked up when a service
+    account changed.
+
+    Args:
+        resources: the resources the daemon reconciles
+    """
+
+    def __init__(self, resources: ClusterResources):
+        self.resources = resources
+        self.buckets = {bucket.name for bucket in resources.buckets}
+        self.bucket_policies = {policy.bucket for policy in resources.bucket_policies}
+        self.iam_policies = {policy.name for policy in resources.iam_policies}
+        self.attachments: dict[str, set[str]] = {}
+        for attachment in resources.iam_policy_attachments:
+            for policy in attachment.policies:
+                self.attachments.setdefault(policy, set()).add(attachment.username)
+        self.users = {attachment.username for attachment in resources.iam_policy_attachments}
+        self._access_keys: dict[str, tuple[str, str]] | None = None
+
+    def access_keys(self) -> dict[str, tuple[str, str]]:
+        """The resource managing every service account, by access key."""
+        if self._access_keys is None:
+            from minio_manager.classes.secrets import secrets
+
+            accounts = {
+                account.full_name: ("service_accounts", account.full_name)
+                for account in self.resources.service_accounts
+            }
+            accounts.update(
+                {
+                    bucket.name: ("buckets", bucket.name)
+                    for bucket in self.resources.buckets
+                    if bucket.create_service_account
+                }
+            )
+            credentials = secrets.get_credentials_many([ServiceAccount(full_name) for full_name in accounts])
+            self._access_keys = {
+                credentials[full_name].access_key: key
+                for full_name, key in accounts.items()
+                if full_name in credentials and credentials[full_name].access_key
+            }
+        return self._access_keys
+
+    def keys(self, targets: Iterable[tuple[str, str]]) -> set[tuple[str, str]]:
+        """The (kind, name) keys of the resources declaring the given targets."""
+        keys = set()
+        for kind, name in targets:
+            if kind == "bucket":
+                if name in self.buckets:
+                    keys.add(("buckets", name))
+                if name in self.bucket_policies:
+                    keys.add(("bucket_policies", name))
+            elif kind == "iam_policy":
+                if name in self.iam_policies:
+                    keys.add(("iam_policies", name))
+                # Removing a policy detaches it from users.
+                keys.update(("iam_policy_attachments", user) for user in self.attachments.get(name, ()))
+            elif kind == "user" and name in self.users:
+                keys.add(("iam_policy_attachments", name))
+            elif kind == "access_key" and name in self.access_keys():
+                keys.add(self.access_keys()[name])
+        return keys
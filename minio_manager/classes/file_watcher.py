@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+from minio_manager.classes.logging_config import logger
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class FileWatcher:
+    """
+    FileWatcher waits for changes to a set of files.
+
+    On Linux inotify is used, watching the directories containing the files so that editors replacing a file are noticed
+    as well. Everywhere else, or if inotify is unavailable, the files are polled for changes to their modification time
+    and size.
+
+    Args:
+        poll_interval: seconds between polls when inotify is not available
+    """
+
+    def __init__(self, poll_interval: float):
+        self.poll_interval = poll_interval
+        self.files: set[Path] = set()
+        self._stats: dict[Path, tuple[int, int] | None] = {}
+        self._watches: dict[int, Path] = {}
+        self._inotify_fd: int | None = None
+        self._libc = None
+        if sys.platform.startswith("linux"):
+            self._setup_inotify()
+        if self._inotify_fd is None:
+            logger.info(f"Polling for file changes every {poll_interval} seconds.")
+
+    def _setup_inotify(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            logger.debug(f"inotify not available: {e}")
+            return
+        if fd < 0:
+            logger.debug(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+            return
+        self._libc = libc
+        self._inotify_fd = fd
+        logger.debug("Watching for file changes with inotify.")
+
+    def watch(self, files: set[str] | set[Path]):
+        """
+        Replace the set of watched files.
+
+        Args:
+            files: the files to watch, they do not need to exist
+        """
+        self.files = {Path(file).absolute() for file in files}
+        self._stats = {file: self._stat(file) for file in self.files}
+        if self._inotify_fd is None:
+            return
+        directories = {file.parent for file in self.files}
+        for directory in directories - set(self._watches.values()):
+            wd = self._libc.inotify_add_watch(self._inotify_fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                logger.warning(f"Unable to watch {directory}: {os.strerror(ctypes.get_errno())}")
+                continue
+            self._watches[wd] = directory
+        for wd, directory in list(self._watches.items()):
+            if directory not in directories:
+                self._libc.inotify_rm_watch(self._inotify_fd, wd)
+                del self._watches[wd]
+
+    def wait(self, timeout: float) -> set[Path]:
+        """
+        Wait until one of the watched files changes, or the timeout expires.
+
+        Args:
+            timeout: the maximum number of seconds to wait
+
+        Returns: the files that changed, empty if the timeout expired
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return set()
+            if self._inotify_fd is not None:
+                changed = self._wait_inotify(remaining)
+            else:
+                time.sleep(min(self.poll_interval, remaining))
+                changed = self._poll()
+            if changed:
+                return changed
+
+    def _wait_inotify(self, timeout: float) -> set[Path]:
+        readable, _, _ = select.select([self._inotify_fd], [], [], timeout)
+        if not readable:
+            return set()
+        # Editors and `git checkout` tend to write files in several steps, wait for them to finish.
+        time.sleep(0.1)
+        changed = set()
+        try:
+            data = os.read(self._inotify_fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        offset = 0
+        while offset < len(data):
+            wd, _, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + name_length].rstrip(b"\0")
+            offset += name_length
+            directory = self._watches.get(wd)
+            if directory is not None and name:
+                path = directory / os.fsdecode(name)
+                if path in self.files:
+                    changed.add(path)
+        for path in changed:
+            self._refresh_stat(path)
+        return changed
+
+    def _poll(self) -> set[Path]:
+        return {file for file in self.files if self._refresh_stat(file)}
+
+    def _refresh_stat(self, file: Path) -> bool:
+        current = self._stat(file)
+        changed = current != self._stats.get(file)
+        self._stats[file] = current
+        return changed
+
+    @staticmethod
+    def _stat(file: Path) -> tuple[int, int] | None:
+        try:
+            stat = file.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def close(self):
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import os
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import certifi
+import urllib3
+from urllib3 import Retry, Timeout
+
+from minio_manager.classes.lazy_singleton import LazySingleton
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.profiler import current_resource
+from minio_manager.classes.settings import settings
+
+
+def timed_pool_manager(pool_manager_class: type[urllib3.PoolManager]) -> type[urllib3.PoolManager]:
+    """
+    A subclass of the given connection pool class that logs every request taking longer than the slow call threshold,
+    with the resource being handled.
+
+    Responses are usually not preloaded, so this is the time until the response headers were received.
+    """
+
+    class TimedPoolManager(pool_manager_class):
+        def urlopen(self, method: str, url: str, redirect: bool = True, **kw):
+            start = time.perf_counter()
+            try:
+                return super().urlopen(method, url, redirect, **kw)
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                if elapsed > settings.slow_call_threshold:
+                    resource = current_resource.get() or "no resource"
+                    logger.warning(
+                        f"Slow API call {method} {urlsplit(url).path} took {elapsed:.0f} ms, handling {resource}"
+                    )
+
+    return TimedPoolManager
+
+
+def create_http_client() -> urllib3.PoolManager:
+    """
+    Create the connection pool shared by all MinIO clients, configured like the pool minio-py creates by default.
+
+    Sharing a single pool lets the S3 client, the admin client and the secret backend reuse the connections opened by
+    each other, including the connection opened by warm_up() during startup. Every thread handling resources can keep a
+    connection of its own. With a slow call threshold, slow requests are logged, see timed_pool_manager(). API calls can be
+    recorded to a cassette file, or replayed from one, see RecordingPoolManager and ReplayPoolManager, and counted per
+    resource, see CallAccounting.
+
+    Returns: urllib3.PoolManager
+    """
+    timeout = timedelta(minutes=5).seconds
+    pool_manager_kwargs = {
+        "timeout": Timeout(connect=timeout, read=timeout),
+        "maxsize": max(10, settings.concurrency),
+        "cert_reqs": "CERT_REQUIRED",
+        "ca_certs": os.environ.get("SSL_CERT_FILE") or certifi.where(),
+        "retries": Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+    }
+    args = ()
+    if settings.record_file:
+        from minio_manager.classes.cassette import RecordingPoolManager
+
+        pool_manager_class, args = RecordingPoolManager, (settings.record_file,)
+    elif settings.replay_file:
+        from minio_manager.classes.cassette import ReplayPoolManager
+
+        pool_manager_class, args = ReplayPoolManager, (settings.replay_file, settings.replay_latency_scale)
+    else:
+        pool_manager_class = urllib3.PoolManager
+    if settings.slow_call_threshold:
+        pool_manager_class = timed_pool_manager(pool_manager_class)
+    if settings.call_accounting or settings.call_accounting_file:
+        from minio_manager.classes.call_accounting import accounting_pool_manager
+
+        pool_manager_class = accounting_pool_manager(pool_manager_class)
+    return pool_manager_class(*args, **pool_manager_kwargs)
+
+
+def warm_up():
+    """
+    Open a connection to MinIO, so DNS resolution and the TCP and TLS handshakes are done before the first API call.
+
+    Failures are only logged; the API call that needs the connection reports them properly.
+    """
+    scheme = "https" if settings.s3_endpoint_secure else "http"
+    url = f"{scheme}://{settings.s3_endpoint}/minio/health/live"
+    try:
+        response = http_client.request("GET", url, retries=False, timeout=Timeout(connect=10, read=10))
+    except urllib3.exceptions.HTTPError as e:
+        logger.debug(f"Unable to warm up the connection to {settings.s3_endpoint}: {e}")
+        return
+    logger.debug("Warmed up the connection to %s, health check returned %s", settings.s3_endpoint, response.status)
+
+
+# minio-py only accepts a PoolManager, so clients are given http_client.lazy_get().
+http_client = LazySingleton("http_client", create_http_client)  # type: urllib3.PoolManager
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import IO
+
+from minio_manager.classes.logging_config import logger
+
+# Lines are synced to disk in batches. A run that is killed loses at most the last batch, and reconciles those
+# resources again when resumed.
+SYNC_BATCH_SIZE = 100
+SYNC_INTERVAL = 1.0
+
+
+class Journal:
+    """
+    Journal records which resources a run reconciled, so that an interrupted run can be resumed where it stopped.
+
+    The journal is a JSON lines file that is only appended to. The first line identifies the cluster and the resources
+    file, every other line a reconciled resource with the fingerprint of its desired state (see fingerprint_resources()).
+    When resuming, a resource is only skipped if it was reconciled with the fingerprint it has now, so resources that
+    changed since are reconciled again.
+
+    Resources that may have created credentials, like service accounts, are only written once the secret backend has
+    been saved, see credentials_saved(). A run that is killed before that reconciles them again when resumed, instead
+    of skipping service accounts whose credentials were lost.
+
+    Only the scheduler thread records resources, so Journal is not thread-safe.
+
+    Args:
+        path: the journal file
+        header: what identifies the run, a journal with a different header is not resumed
+        fingerprints: the fingerprint of every resource, by (kind, name) key
+    """
+
+    def __init__(self, path: str | Path, header: dict, fingerprints: dict[tuple[str, str], str]):
+        self.path = Path(path)
+        self.header = header
+        self.fingerprints = fingerprints
+        self.pending: list[str] = []
+        # Entries of resources waiting for their credentials to be saved.
+        self.unsaved: list[str] = []
+        self.last_sync = time.monotonic()
+        self.file: IO[str] | None = None
+
+    def read(self) -> set[tuple[str, str]] | None:
+        """
+        Read the resources a previous run reconciled, that have not changed since.
+
+        Returns: the (kind, name) keys of the reconciled resources, or None if there is no journal of the same run
+        """
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            logger.info(f"No journal found at {self.path}, reconciling all resources.")
+            return None
+        except OSError as e:
+            logger.warning(f"Unable to read journal {self.path}, reconciling all resources: {e}")
+            return None
+
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # The line that was being written when the previous run was killed.
+                logger.debug(f"Ignoring incomplete line in journal {self.path}")
+        if not entries or entries[0] != self.header:
+            logger.warning(f"Journal {self.path} is from another cluster or resources file, reconciling all resources.")
+            return None
+
+        reconciled = set()
+        for entry in entries[1:]:
+            key = entry.get("kind"), entry.get("name")
+            if key in self.fingerprints and self.fingerprints[key] == entry.get("fingerprint"):
+                reconciled.add(key)
+        return reconciled
+
+    def start(self, resume: bool) -> set[tuple[str, str]]:
+        """
+        Start recording reconciled resources.
+
+        Args:
+            resume: whether to continue the journal of a previous run, instead of starting a new one
+
+        Returns: the (kind, name) keys of the resources that do not need to be reconciled again
+        """
+        reconciled = self.read() if resume else None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if reconciled is not None:
+            self.file = self.path.open("a", encoding="utf-8")
+            return reconciled
+        self.file = self.path.open("w", encoding="utf-8")
+        self.pending.append(json.dumps(self.header))
+        self.sync()
+        return set()
+
+    def record(self, key: tuple[str, str], credentials: bool = False):
+        """
+        Record that a resource has been reconciled.
+
+        Args:
+            key: the (kind, name) key of the resource
+            credentials: whether reconciling the resource may have created credentials, which are only kept once the
+                secret backend has been saved
+        """
+        kind, name = key
+        entry = json.dumps({"kind": kind, "name": name, "fingerprint": self.fingerprints.get(key)})
+        if credentials:
+            self.unsaved.append(entry)
+            return
+        self.pending.append(entry)
+        if len(self.pending) >= SYNC_BATCH_SIZE or time.monotonic() - self.last_sync >= SYNC_INTERVAL:
+            self.sync()
+
+    def credentials_saved(self):
+        """Write the resources that created credentials, now that the secret backend has been saved."""
+        self.pending.extend(self.unsaved)
+        self.unsaved.clear()
+        self.sync()
+
+    def sync(self):
+        """Write the recorded resources to the journal, and make sure they are on disk."""
+        self.last_sync = time.monotonic()
+        if not self.pending or self.file is None:
+            return
+        self.file.write("".join(f"{line}\n" for line in self.pending))
+        self.pending.clear()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self, completed: bool):
+        """
+        Stop recording reconciled resources.
+
+        Args:
+            completed: whether all resources were reconciled without errors, which removes the journal so the next run
+                starts from the beginning
+        """
+        if self.file is None:
+            return
+        self.sync()
+        self.file.close()
+        self.file = None
+        if completed:
+            logger.debug(f"All resources reconciled, removing journal {self.path}")
+            self.path.unlink(missing_ok=True)
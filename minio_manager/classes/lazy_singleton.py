@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import threading
+from collections.abc import Callable
+from typing import Any
+
+
+class LazySingleton:
+    """
+    LazySingleton creates an object the first time it is used, and passes attribute access on to that object.
+
+    Creation happens once, even when the object is used from multiple threads at the same time: other threads wait for
+    it. If creating the object fails, every later use raises the same error, so a critical error logged while creating
+    the object in the background still stops MinIO Manager once the object is needed.
+
+    A context can use a separate object instead, see lazy_scoped() and lazy_use(). This lets multiple reconcilers, each
+    with their own settings, secret backend and clients, run in one process. Threads do not inherit the context they
+    are started from, so threads using these objects must be started with a copy of it.
+
+    Attributes:
+        lazy_name (str): The name of the object, for logging.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        object.__setattr__(self, "lazy_name", name)
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_error", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+        object.__setattr__(self, "_scoped", contextvars.ContextVar(f"minio_manager.{name}", default=None))
+
+    def lazy_scoped(self, factory: Callable[[], Any] | None = None) -> LazySingleton:
+        """
+        Create a separate LazySingleton, which a context can use instead of this one, see lazy_use().
+
+        Args:
+            factory: creates the separate object, by default the same way this object is created
+        """
+        return LazySingleton(self.lazy_name, factory or self._factory)
+
+    def lazy_use(self, scoped: LazySingleton):
+        """Use the object of the given LazySingleton instead of this one's in the current context."""
+        self._scoped.set(scoped)
+
+    def _current(self) -> LazySingleton:
+        scoped = self._scoped.get()
+        return self if scoped is None else scoped
+
+    @property
+    def lazy_initialized(self) -> bool:
+        """Whether the object has been created successfully."""
+        return self._current()._instance is not None
+
+    def lazy_get(self) -> Any:
+        """Create the object if needed, and return it."""
+        current = self._current()
+        if current is not self:
+            return current.lazy_get()
+        instance = self._instance
+        if instance is not None:
+            return instance
+        with self._lock:
+            if self._instance is None:
+                if self._error is not None:
+                    raise self._error
+                try:
+                    object.__setattr__(self, "_instance", self._factory())
+                except BaseException as e:
+                    # SystemExit included: logger.critical() exits, which should happen in the thread using the object.
+                    object.__setattr__(self, "_error", e)
+                    raise
+            return self._instance
+
+    def lazy_start(self) -> threading.Thread:
+        """Create the object in a background thread, returning the thread."""
+
+        def create():
+            # Errors are raised again when the object is used.
+            with contextlib.suppress(BaseException):
+                self.lazy_get()
+
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(create,), name=f"bootstrap-{self.lazy_name}", daemon=True)
+        thread.start()
+        return thread
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.lazy_get(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self.lazy_get(), name, value)
+
+    def __repr__(self) -> str:
+        current = self._current()
+        state = repr(current._instance) if current.lazy_initialized else "not initialised"
+        return f"<LazySingleton {self.lazy_name}: {state}>"
@@ -1,7 +1,13 @@
+import atexit
+import copy
+import json
 import re
 import sys
 from logging import DEBUG, INFO, Filter, Formatter, Logger, LogRecord, StreamHandler
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue
 
+from minio_manager.classes.lazy_singleton import LazySingleton
 from minio_manager.classes.settings import settings
 from minio_manager.utilities import increment_error_count
 
@@ -25,34 +31,42 @@ COLORS = {
 class MinioManagerFilter(Filter):
     """
     The MinioManagerFilter is a custom logging Filter that masks secret values.
+
+    All secrets are matched by a single pattern, so every message is scanned once. The filter runs on the log writer
+    thread, on messages that have already been formatted.
     """
 
-    wrapper_secret_re = re.compile(r"--secret-key (?P<secret>[\w+/]*)")
-    alias_set_secret_re = re.compile(r"alias set .+ (?P<secret>[\w+/]*)$")
-    env_keepass_password_re = re.compile(r"MINIO_MANAGER_KEEPASS_PASSWORD: (?P<secret>[\w+/]*)$")
-    env_secret_key_re = re.compile(r"MINIO_MANAGER_SECRET_BACKEND_S3_SECRET_KEY: (?P<secret>[\w+/]*)$")
+    secret_re = re.compile(
+        r"(?P<prefix>--secret-key "
+        r"|alias set .+ (?=[\w+/]*$)"
+        r"|MINIO_MANAGER_KEEPASS_PASSWORD: "
+        r"|MINIO_MANAGER_SECRET_BACKEND_S3_SECRET_KEY: "
+        r"|'secret_key': '"
+        r"|\"secret_?[kK]ey\": ?\""
+        r"|secret_key: )"
+        r"[\w+/]+"
+    )
 
     def filter(self, record: LogRecord) -> bool:
-        if not isinstance(record.msg, str):
-            return True
-
-        if "--secret" in record.msg:
-            record.msg = self.mask_secret(record.msg, self.wrapper_secret_re)
-        if "alias set" in record.msg:
-            record.msg = self.mask_secret(record.msg, self.alias_set_secret_re)
-        if "MINIO_MANAGER_KEEPASS_PASSWORD" in record.msg:
-            record.msg = self.mask_secret(record.msg, self.env_keepass_password_re)
-        if "MINIO_MANAGER_SECRET_BACKEND_S3_SECRET_KEY" in record.msg:
-            record.msg = self.mask_secret(record.msg, self.env_secret_key_re)
-
+        if isinstance(record.msg, str):
+            record.msg = self.mask_secrets(record.msg)
         return True
 
-    @staticmethod
-    def mask_secret(message: str, regex: re.Pattern) -> str:
-        result = regex.search(message)
-        if result:
-            message = message.replace(result.group("secret"), "************")
-        return message
+    @classmethod
+    def mask_secrets(cls, message: str) -> str:
+        return cls.secret_re.sub(r"\g<prefix>************", message)
+
+
+class PrefixFilter(Filter):
+    """PrefixFilter prefixes every log message with what it is about, like the cluster or group being reconciled."""
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.prefix = f"[{name}] "
+
+    def filter(self, record: LogRecord) -> bool:
+        record.msg = self.prefix + str(record.msg)
+        return True
 
 
 class MinioManagerFormatter(Formatter):
@@ -63,26 +77,89 @@ class MinioManagerFormatter(Formatter):
     def __init__(self, level: int):
         self.log_level = level
         if level is INFO:
-            log_format = "[{asctime}] [{levelname:^8s}] {message}"
+            log_format = "[{asctime}] [{levelname:^8s}] {color}{message}{reset}"
             super().__init__(fmt=log_format, datefmt="%Y-%m-%d %H:%M:%S", style="{")
         else:
-            log_format = "[{asctime}] [{levelname:^8s}] [{filename:>26s}:{lineno:<4d} - {funcName:<24s} ] {message}"
+            log_format = (
+                "[{asctime}] [{levelname:^8s}] [{filename:>26s}:{lineno:<4d} - {funcName:<24s} ] "
+                "{color}{message}{reset}"
+            )
             super().__init__(fmt=log_format, style="{")
 
     def format(self, record: LogRecord):
-        if isinstance(record.msg, str) and record.levelname in COLORS:
-            record.msg = COLORS[record.levelname] + record.msg + RESET
+        record.color = COLORS.get(record.levelname, "")
+        record.reset = RESET if record.color else ""
 
         # noinspection StrFormat
         return super().format(record)
 
 
+class MinioManagerJsonFormatter(Formatter):
+    """
+    The MinioManagerJsonFormatter formats every log record as a single line of JSON, for log collectors.
+    """
+
+    def __init__(self, level: int):
+        super().__init__()
+        self.log_level = level
+
+    def format(self, record: LogRecord):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S%z"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if self.log_level is not INFO:
+            entry.update(file=record.filename, line=record.lineno, function=record.funcName)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+
+class MinioManagerQueueHandler(QueueHandler):
+    """
+    The MinioManagerQueueHandler hands log records to the log writer thread.
+
+    Only the message is merged with its arguments on the calling thread, so that arguments that change afterwards
+    are logged as they were. Masking, formatting and writing happen on the writer thread, except for exceptions and
+    stacks: their tracebacks are formatted and masked here, because the writer thread only masks messages.
+    """
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = MinioManagerFilter.mask_secrets(self.formatter.formatException(record.exc_info))
+            record.exc_info = None
+        elif record.exc_text:
+            record.exc_text = MinioManagerFilter.mask_secrets(record.exc_text)
+        if record.stack_info:
+            record.stack_info = MinioManagerFilter.mask_secrets(record.stack_info)
+        return record
+
+
+# The loggers whose writer thread is running, stopped at exit so that their pending records are written.
+_running_loggers: set["MinioManagerLogger"] = set()
+
+
+@atexit.register
+def _close_loggers():
+    for running_logger in list(_running_loggers):
+        running_logger.close()
+
+
 class MinioManagerLogger(Logger):
     """
     The MinioManagerLogger is a custom Logger that implements our MinioManagerFilter and MinioManagerFormatter.
+
+    Records are written by a background thread, so logging does not slow down the threads reconciling resources.
     """
 
-    def __init__(self, name: str, level: str):
+    def __init__(self, name: str, level: str, log_format: str = "text"):
         super().__init__(name)
         if level == "INFO":
             self.setLevel(INFO)
@@ -90,11 +167,35 @@ class MinioManagerLogger(Logger):
             self.setLevel(DEBUG)
 
         handler = StreamHandler()
-        formatter = MinioManagerFormatter(self.level)
+        formatter_class = MinioManagerJsonFormatter if log_format == "json" else MinioManagerFormatter
+        formatter = formatter_class(self.level)
         this_filter = MinioManagerFilter()
         handler.setFormatter(formatter)
         handler.addFilter(this_filter)
-        self.addHandler(handler)
+
+        self.handler = handler
+        self.queue = Queue()
+        self.queue_handler = MinioManagerQueueHandler(self.queue)
+        self.queue_handler.setFormatter(formatter)
+        self.listener = QueueListener(self.queue, handler)
+        self.listener.start()
+        self.addHandler(self.queue_handler)
+        _running_loggers.add(self)
+
+    def flush(self):
+        """Wait until the writer thread has written all records logged so far."""
+        if self.listener is not None:
+            self.queue.join()
+
+    def close(self):
+        """Stop the writer thread once it has written all pending records, records logged after are written directly."""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.listener = None
+        _running_loggers.discard(self)
+        self.removeHandler(self.queue_handler)
+        self.addHandler(self.handler)
 
     def error(self, msg, *args, **kwargs):
         super().error(msg, *args, **kwargs)
@@ -102,10 +203,16 @@ class MinioManagerLogger(Logger):
 
     def critical(self, msg, *args, **kwargs):
         super().critical(msg, *args, **kwargs)
+        self.flush()
         sys.exit(1)
 
 
-log_level = settings.log_level
-log_name = "root" if log_level == "DEBUG" else "minio-manager"
-logger = MinioManagerLogger(log_name, log_level)
-logger.debug(f"Configured log level: {log_level}")
+def create_logger() -> MinioManagerLogger:
+    """Create the logger, as configured by the settings."""
+    log_name = "root" if settings.log_level == "DEBUG" else "minio-manager"
+    logger = MinioManagerLogger(log_name, settings.log_level, settings.log_format)
+    logger.debug(f"Configured log level: {settings.log_level}")
+    return logger
+
+
+logger = LazySingleton("logger", create_logger)  # type: MinioManagerLogger
@@ -0,0 +1,158 @@
+"""
+Profile the phases of a run: startup, loading the secret backend, parsing the resources and handling them.
+
+With `profile`, every phase is profiled with cProfile, in the thread that runs the phase and in the threads handling
+resources for it. A pstats file is written for every phase and the functions with the most cumulative time are logged.
+With `profile_memory`, tracemalloc snapshots are taken at the start and end of every phase, and the lines that allocated
+the most memory are logged. Phases can overlap, like loading the secret backend while parsing the resources; memory
+allocated by one of them is then attributed to both.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import cProfile
+import io
+import itertools
+import pstats
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.settings import settings
+
+# The resource being handled, e.g. "bucket 'my-bucket'", logged with slow API calls.
+current_resource: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "minio_manager.current_resource", default=None
+)
+_current_phase: contextvars.ContextVar[Phase | None] = contextvars.ContextVar("minio_manager.phase", default=None)
+# The profiles enabled in each thread, innermost last. Only one profile can be enabled in a thread at a time.
+_active_profiles = threading.local()
+_phase_numbers = itertools.count(1)
+# Memory allocated by profiling itself.
+PROFILER_FILTERS = [tracemalloc.Filter(False, module.__file__) for module in (cProfile, pstats, tracemalloc)]
+
+
+def _enable(profile: cProfile.Profile):
+    stack = _active_profiles.__dict__.setdefault("stack", [])
+    if stack:
+        stack[-1].disable()
+    stack.append(profile)
+    profile.enable()
+
+
+def _disable():
+    _active_profiles.stack.pop().disable()
+
+
+def _resume_outer():
+    stack = _active_profiles.__dict__.get("stack")
+    if stack:
+        stack[-1].enable()
+
+
+class Phase:
+    """
+    Phase collects the profiles of a single phase, one for every thread that did work for it.
+
+    Args:
+        name: the name of the phase, used in log messages and file names
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.number = next(_phase_numbers)
+        self.profiles: dict[int, cProfile.Profile] = {}
+        self.lock = threading.Lock()
+
+    def thread_profile(self) -> cProfile.Profile:
+        """The profile of the current thread."""
+        with self.lock:
+            return self.profiles.setdefault(threading.get_ident(), cProfile.Profile())
+
+    def report_cpu(self, directory: Path):
+        """Write the profiles to a pstats file, and log the functions with the most cumulative time."""
+        stats = None
+        for profile in self.profiles.values():
+            if stats is None:
+                stats = pstats.Stats(profile, stream=io.StringIO())
+            else:
+                stats.add(profile)
+        if stats is None:
+            return
+        file = directory / f"{self.number:02d}-{self.name}.pstats"
+        stats.dump_stats(file)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(settings.profile_top)
+        logger.info(f"CPU profile of {self.name}, written to {file}:\n{stats.stream.getvalue()}")
+
+    def report_memory(self, start: tracemalloc.Snapshot, directory: Path):
+        """Write the memory snapshot at the end of the phase, and log the lines that allocated the most memory."""
+        current, peak = tracemalloc.get_traced_memory()
+        end = tracemalloc.take_snapshot().filter_traces(PROFILER_FILTERS)
+        file = directory / f"{self.number:02d}-{self.name}.tracemalloc"
+        end.dump(str(file))
+        start = start.filter_traces(PROFILER_FILTERS)
+        lines = [str(stat) for stat in end.compare_to(start, "lineno")[: settings.profile_top]]
+        logger.info(
+            f"Memory profile of {self.name}, {current / 2**20:.1f} MiB in use, {peak / 2**20:.1f} MiB at the peak, "
+            f"written to {file}:\n" + "\n".join(lines)
+        )
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Time a phase of the run, and profile it if configured to.
+
+    Args:
+        name: the name of the phase, e.g. "parsing"
+    """
+    start_time = time.perf_counter()
+    if not (settings.profile or settings.profile_memory):
+        yield
+        logger.debug(f"Phase {name} took {time.perf_counter() - start_time:.2f} seconds.")
+        return
+
+    current = Phase(name)
+    token = _current_phase.set(current)
+    snapshot = None
+    if settings.profile_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        snapshot = tracemalloc.take_snapshot()
+    if settings.profile:
+        _enable(current.thread_profile())
+    try:
+        yield
+    finally:
+        if settings.profile:
+            _disable()
+        _current_phase.reset(token)
+        logger.info(f"Phase {name} took {time.perf_counter() - start_time:.2f} seconds.")
+        directory = Path(settings.profile_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        if snapshot is not None:
+            current.report_memory(snapshot, directory)
+        if settings.profile:
+            current.report_cpu(directory)
+            # Only now, as creating the stats disables profiling in the current thread.
+            _resume_outer()
+
+
+def run_profiled(function: Callable[..., Any], *args) -> Any:
+    """Run a function for the current phase in another thread, profiling it as part of the phase."""
+    current = _current_phase.get()
+    if current is None or not settings.profile:
+        return function(*args)
+    _enable(current.thread_profile())
+    try:
+        return function(*args)
+    finally:
+        _disable()
+        _resume_outer()
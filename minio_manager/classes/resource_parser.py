@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import fnmatch
+import hashlib
 import json
 import sys
+from collections.abc import Callable, Collection, Iterator
+from dataclasses import replace
 from pathlib import Path
 
 from minio.commonconfig import Filter
@@ -11,7 +15,52 @@ from minio.versioningconfig import VersioningConfig as VeCo
 from minio_manager.classes.logging_config import logger
 from minio_manager.classes.minio_resources import Bucket, BucketPolicy, IamPolicy, IamPolicyAttachment, ServiceAccount
 from minio_manager.classes.settings import settings
-from minio_manager.utilities import get_error_count, read_yaml
+from minio_manager.utilities import get_error_count, get_thread_error_count, iter_yaml_sections, read_yaml
+
+# Maps each kind of resource to the attribute that uniquely identifies a resource of that kind.
+RESOURCE_KINDS = {
+    "buckets": "name",
+    "bucket_policies": "bucket",
+    "service_accounts": "full_name",
+    "iam_policies": "name",
+    "iam_policy_attachments": "username",
+}
+
+# Logged when a kind of resources is not a list of YAML dictionaries.
+TYPE_ERRORS = {
+    "buckets": "Buckets must be defined as a list of YAML dictionaries!",
+    "bucket_policies": "Bucket policies must be defined as a list of YAML dictionaries!",
+    "service_accounts": "Service accounts must be defined as a list of YAML dictionaries!",
+    "iam_policies": "IAM policies must be defined as a list of YAML dictionaries!",
+    "iam_policy_attachments": "IAM policy attachments must be defined as a list of YAML dictionaries!",
+}
+
+# Exit codes for kinds of resources that stop parsing when they are not a list of YAML dictionaries.
+TYPE_ERROR_EXIT_CODES = {"service_accounts": 141, "iam_policy_attachments": 150}
+
+
+def resource_dependencies(kind: str, resource: object) -> set[tuple[str, str]]:
+    """
+    Determine the (kind, name) keys of the resources a single resource depends on, whether they exist or not.
+
+    - a bucket policy depends on its bucket
+    - a service account with the same name as a bucket depends on that bucket, whose automatically created service
+      account it would otherwise collide with
+    - an IAM policy attachment depends on the IAM policies it attaches
+
+    Args:
+        kind: the kind of the resource, e.g. "buckets"
+        resource: the resource
+
+    Returns: set of (kind, name) keys
+    """
+    if kind == "bucket_policies":
+        return {("buckets", resource.bucket)}
+    if kind == "service_accounts":
+        return {("buckets", resource.full_name)}
+    if kind == "iam_policy_attachments":
+        return {("iam_policies", policy) for policy in resource.policies}
+    return set()
 
 
 class ClusterResources:
@@ -31,16 +80,159 @@ class ClusterResources:
     iam_policies: list[IamPolicy]
     iam_policy_attachments: list[IamPolicyAttachment]
 
-    def parse_buckets(self, buckets: list) -> list[Bucket]:
+    def __init__(self):
+        self.buckets = []
+        self.bucket_policies = []
+        self.service_accounts = []
+        self.iam_policies = []
+        self.iam_policy_attachments = []
+        self.reset_parse_state()
+
+    def reset_parse_state(self):
+        """Forget the names and configurations seen while parsing, which are used to detect duplicates and share
+        configurations between resources."""
+        self._parsed_names: dict[str, set[str]] = {kind: set() for kind in RESOURCE_KINDS}
+        self._lifecycle_configs: dict[str | None, LifecycleConfig | None] = {}
+        self._versioning_configs: dict[str, VeCo] = {}
+        self._policies: dict[str, dict] = {}
+
+    def __len__(self) -> int:
+        return sum(len(getattr(self, kind)) for kind in RESOURCE_KINDS)
+
+    def resource_keys(self) -> Iterator[tuple[str, str]]:
+        """
+        Yield a (kind, name) key for every resource, e.g. ("buckets", "my-bucket").
         """
-        Parse the provided buckets with the following steps:
+        for key, _ in self.items():
+            yield key
 
-        For each provided bucket
+    def items(self) -> Iterator[tuple[tuple[str, str], object]]:
+        """
+        Yield a ((kind, name), resource) tuple for every resource.
+        """
+        for kind, key_attribute in RESOURCE_KINDS.items():
+            for resource in getattr(self, kind):
+                yield (kind, getattr(resource, key_attribute)), resource
 
-            1. check the provided versioning. If versioning is not provided, set the default.
-            2. check if an object lifecycle JSON file is provided, use the default_bucket_lifecycle_policy, or skip OLM
-            3. parse the file and create a LifecycleConfig object for the bucket
-            4. create a Bucket object
+    def subset(self, keys: Collection[tuple[str, str]]) -> ClusterResources:
+        """
+        Create a new ClusterResources object containing only the resources with the given (kind, name) keys.
+
+        Args:
+            keys: the keys of the resources to keep, as yielded by resource_keys()
+
+        Returns: ClusterResources
+        """
+        subset = ClusterResources()
+        for kind, key_attribute in RESOURCE_KINDS.items():
+            resources = [r for r in getattr(self, kind) if (kind, getattr(r, key_attribute)) in keys]
+            setattr(subset, kind, resources)
+        return subset
+
+    def dependencies(self) -> dict[tuple[str, str], set[tuple[str, str]]]:
+        """
+        Determine which resources each resource depends on, see resource_dependencies().
+
+        Returns: dict mapping every (kind, name) key to the keys of the resources it depends on
+        """
+        keys = set(self.resource_keys())
+        dependencies = {key: resource_dependencies(key[0], resource) for key, resource in self.items()}
+        # Dependencies on resources that are not managed here can be ignored.
+        return {key: depends_on & keys for key, depends_on in dependencies.items()}
+
+    def dependency_groups(self) -> list[set[tuple[str, str]]]:
+        """
+        Group the resources that directly or indirectly depend on each other.
+
+        Returns: list of sets of (kind, name) keys
+        """
+        parents = {key: key for key in self.resource_keys()}
+
+        def find(key: tuple[str, str]) -> tuple[str, str]:
+            while parents[key] != key:
+                parents[key] = parents[parents[key]]
+                key = parents[key]
+            return key
+
+        for key, depends_on in self.dependencies().items():
+            for dependency in depends_on:
+                parents[find(key)] = find(dependency)
+
+        groups: dict[tuple[str, str], set[tuple[str, str]]] = {}
+        for key in parents:
+            groups.setdefault(find(key), set()).add(key)
+        return list(groups.values())
+
+    def select(self, selectors: dict[str, list[str]], kinds: Collection[str] = ()) -> ClusterResources:
+        """
+        Create a new ClusterResources object with only the selected resources, and the resources they need.
+
+        - all resources of the given kinds are selected
+        - resources are selected by name with wildcard patterns, e.g. {"buckets": ["tenant-*"]}
+        - selecting a bucket also selects the resources belonging to it: its bucket policy, and the service account with
+          the same name
+        - the resources that selected resources depend on are selected as well, see dependencies()
+
+        Args:
+            selectors: the name patterns of the resources to select, by kind of resource
+            kinds: the kinds of resources to select all resources of
+
+        Returns: ClusterResources
+        """
+        selected = self._match_selectors(selectors, kinds)
+        dependencies = self.dependencies()
+        buckets = {key for key in selected if key[0] == "buckets"}
+        if "buckets" not in kinds and buckets:
+            selected.update(key for key, depends_on in dependencies.items() if depends_on & buckets)
+        pending = list(selected)
+        while pending:
+            for dependency in dependencies[pending.pop()] - selected:
+                selected.add(dependency)
+                pending.append(dependency)
+        return self.subset(selected)
+
+    def _match_selectors(self, selectors: dict[str, list[str]], kinds: Collection[str]) -> set[tuple[str, str]]:
+        """Find the keys of the resources matching the selectors, warning about patterns that match nothing."""
+        selected = set()
+        matched_patterns = set()
+        for key in self.resource_keys():
+            kind, name = key
+            if kind in kinds:
+                selected.add(key)
+            for pattern in selectors.get(kind, []):
+                if fnmatch.fnmatchcase(name, pattern):
+                    selected.add(key)
+                    matched_patterns.add((kind, pattern))
+        for kind, patterns in selectors.items():
+            for pattern in patterns:
+                if (kind, pattern) not in matched_patterns:
+                    logger.warning(f"No {kind.replace('_', ' ')} match '{pattern}'.")
+        return selected
+
+    def shard(self, index: int, count: int) -> ClusterResources:
+        """
+        Create a new ClusterResources object with only the resources assigned to one of `count` shards.
+
+        Resources that depend on each other are always assigned to the same shard. Every group of dependent resources
+        is assigned by a hash of its first key, which is stable across processes and machines, so runners that parse
+        the same resources never overlap.
+
+        Args:
+            index: the 1-based index of the shard
+            count: the total number of shards
+
+        Returns: ClusterResources
+        """
+        keys = set()
+        for group in self.dependency_groups():
+            anchor = "/".join(min(group))
+            if int(hashlib.sha256(anchor.encode()).hexdigest(), 16) % count == index - 1:
+                keys.update(group)
+        return self.subset(keys)
+
+    def parse_buckets(self, buckets: list) -> list[Bucket]:
+        """
+        Parse the provided buckets, see parse_bucket().
 
         Args:
             buckets: list of buckets to parse
@@ -52,52 +244,91 @@ class ClusterResources:
             return []
 
         bucket_objects = []
-
-        default_lifecycle_config = self.parse_bucket_lifecycle_file(settings.default_lifecycle_policy_file)
-        bucket_names = []
-
         try:
-            logger.debug(f"Parsing {len(buckets)} buckets...")
-            if settings.allowed_bucket_prefixes:
-                noun = "prefix" if len(settings.allowed_bucket_prefixes) == 1 else "prefixes"
-                prefixes_str = ", ".join(settings.allowed_bucket_prefixes)
-                logger.info(f"Only allowing buckets with the following {noun}: {prefixes_str}")
+            logger.debug("Parsing %s buckets...", len(buckets))
+            self.log_allowed_bucket_prefixes()
             for bucket in buckets:
-                effective_lifecycle_config = default_lifecycle_config
-                name = bucket["name"]
-                if name in bucket_names:
-                    logger.error(f"Bucket '{name}' defined multiple times.")
-                logger.debug(f"Parsing bucket {name}")
-                allowed_prefixes = settings.allowed_bucket_prefixes
-                if allowed_prefixes and not name.startswith(allowed_prefixes):
-                    logger.error(
-                        f"Bucket '{name}' does not start with one of the required prefixes {allowed_prefixes}!"
-                    )
-
-                bucket_names.append(name)
-                versioning = bucket.get("versioning")
-                try:
-                    versioning_config = VeCo(versioning) if versioning else VeCo(settings.default_bucket_versioning)
-                except ValueError as ve:
-                    logger.error(f"Error parsing versioning setting: {' '.join(ve.args)}")
-                    versioning_config = VeCo(settings.default_bucket_versioning)  # workaround to use error count
-                create_sa = bool(bucket.get("create_service_account", settings.auto_create_service_account))
-                lifecycle_file = bucket.get("object_lifecycle_file")
-                if lifecycle_file:
-                    logger.debug(f"Parsing bucket specific lifecycle file {lifecycle_file} for bucket {name}")
-                    bucket_lifecycle = self.parse_bucket_lifecycle_file(lifecycle_file)
-                    if isinstance(bucket_lifecycle, LifecycleConfig):
-                        effective_lifecycle_config = bucket_lifecycle
-                else:
-                    logger.debug(
-                        f"No bucket specific lifecycle file provided for bucket {name}, using default lifecycle policy."
-                    )
-                bucket_objects.append(Bucket(name, create_sa, versioning_config, effective_lifecycle_config))
+                bucket_objects.append(self.parse_bucket(bucket))
         except TypeError:
-            logger.error("Buckets must be defined as a list of YAML dictionaries!")
+            logger.error(TYPE_ERRORS["buckets"])
 
         return bucket_objects
 
+    def parse_bucket(self, bucket: dict) -> Bucket:
+        """
+        Parse a single bucket with the following steps:
+
+            1. check the provided versioning. If versioning is not provided, set the default.
+            2. check if an object lifecycle JSON file is provided, use the default_bucket_lifecycle_policy, or skip OLM
+            3. parse the file and create a LifecycleConfig object for the bucket
+            4. create a Bucket object
+
+        Buckets share their versioning and lifecycle configurations, so each file or status is only parsed once.
+
+        Args:
+            bucket: the bucket definition
+
+        Returns: Bucket
+        """
+        name = bucket["name"]
+        if name in self._parsed_names["buckets"]:
+            logger.error(f"Bucket '{name}' defined multiple times.")
+        logger.debug("Parsing bucket %s", name)
+        allowed_prefixes = settings.allowed_bucket_prefixes
+        if allowed_prefixes and not name.startswith(allowed_prefixes):
+            logger.error(f"Bucket '{name}' does not start with one of the required prefixes {allowed_prefixes}!")
+
+        self._parsed_names["buckets"].add(name)
+        versioning_config = self.parse_bucket_versioning(bucket.get("versioning"), self._versioning_configs)
+        create_sa = bool(bucket.get("create_service_account", settings.auto_create_service_account))
+        effective_lifecycle_config = self.parse_bucket_lifecycle_file_once(settings.default_lifecycle_policy_file)
+        lifecycle_file = bucket.get("object_lifecycle_file")
+        if lifecycle_file:
+            logger.debug("Using bucket specific lifecycle file %s for bucket %s", lifecycle_file, name)
+            bucket_lifecycle = self.parse_bucket_lifecycle_file_once(lifecycle_file)
+            if isinstance(bucket_lifecycle, LifecycleConfig):
+                effective_lifecycle_config = bucket_lifecycle
+        else:
+            logger.debug(
+                "No bucket specific lifecycle file provided for bucket %s, using default lifecycle policy.", name
+            )
+        return Bucket(name, create_sa, versioning_config, effective_lifecycle_config)
+
+    @staticmethod
+    def log_allowed_bucket_prefixes():
+        if settings.allowed_bucket_prefixes:
+            noun = "prefix" if len(settings.allowed_bucket_prefixes) == 1 else "prefixes"
+            prefixes_str = ", ".join(settings.allowed_bucket_prefixes)
+            logger.info(f"Only allowing buckets with the following {noun}: {prefixes_str}")
+
+    def parse_bucket_lifecycle_file_once(self, lifecycle_file: str | None) -> LifecycleConfig | None:
+        """Parse a bucket lifecycle config file, reusing the result for every bucket using the same file."""
+        if lifecycle_file not in self._lifecycle_configs:
+            self._lifecycle_configs[lifecycle_file] = self.parse_bucket_lifecycle_file(lifecycle_file)
+        return self._lifecycle_configs[lifecycle_file]
+
+    @staticmethod
+    def parse_bucket_versioning(versioning: str | None, versioning_configs: dict[str, VeCo]) -> VeCo:
+        """
+        Parse a bucket versioning status, reusing the VersioningConfig of earlier buckets with the same status.
+
+        Args:
+            versioning: the versioning status, or None to use the default
+            versioning_configs: the VersioningConfig objects parsed so far, by status
+
+        Returns: VersioningConfig object
+        """
+        versioning = versioning or settings.default_bucket_versioning
+        if versioning not in versioning_configs:
+            try:
+                versioning_configs[versioning] = VeCo(versioning)
+            except ValueError as ve:
+                logger.error(f"Error parsing versioning setting: {' '.join(ve.args)}")
+                versioning_configs[versioning] = VeCo(
+                    settings.default_bucket_versioning
+                )  # workaround to use error count
+        return versioning_configs[versioning]
+
     def parse_bucket_lifecycle_file(self, lifecycle_file: str) -> LifecycleConfig | None:
         """
         Parse a bucket lifecycle config file.
@@ -191,16 +422,19 @@ class ClusterResources:
 
         bucket_policy_objects = []
         try:
-            logger.debug(f"Parsing {len(bucket_policies)} bucket policies...")
+            logger.debug("Parsing %s bucket policies...", len(bucket_policies))
             for bucket_policy in bucket_policies:
-                bucket_policy_objects.append(BucketPolicy(bucket_policy["bucket"], bucket_policy["policy_file"]))
+                bucket_policy_objects.append(ClusterResources.parse_bucket_policy(bucket_policy))
         except TypeError:
-            logger.error("Bucket policies must be defined as a list of YAML dictionaries!")
+            logger.error(TYPE_ERRORS["bucket_policies"])
 
         return bucket_policy_objects
 
     @staticmethod
-    def parse_service_accounts(service_accounts: list) -> list[ServiceAccount]:
+    def parse_bucket_policy(bucket_policy: dict) -> BucketPolicy:
+        return BucketPolicy(bucket_policy["bucket"], bucket_policy["policy_file"])
+
+    def parse_service_accounts(self, service_accounts: list) -> list[ServiceAccount]:
         """
         Parse a list of service account definitions into ServiceAccount objects.
 
@@ -213,24 +447,30 @@ class ClusterResources:
             logger.debug("No service accounts configured, skipping.")
             return []
 
-        service_account_objects, service_account_names = [], []
+        service_account_objects = []
 
         try:
-            logger.debug(f"Parsing {len(service_accounts)} service accounts...")
+            logger.debug("Parsing %s service accounts...", len(service_accounts))
             for service_account in service_accounts:
-                name = service_account["name"]
-                if name in service_account_names:
-                    logger.error(f"Service account '{name}' defined multiple times.")
-                service_account_names.append(name)
-                policy_file = service_account.get("policy_file")
-                sa_obj = ServiceAccount(name=name, policy_file=policy_file)
-                service_account_objects.append(sa_obj)
+                service_account_objects.append(self.parse_service_account(service_account))
         except TypeError:
-            logger.error("Service accounts must be defined as a list of YAML dictionaries!")
-            sys.exit(141)
+            logger.error(TYPE_ERRORS["service_accounts"])
+            sys.exit(TYPE_ERROR_EXIT_CODES["service_accounts"])
 
         return service_account_objects
 
+    def parse_service_account(self, service_account: dict) -> ServiceAccount:
+        name = service_account["name"]
+        if name in self._parsed_names["service_accounts"]:
+            logger.error(f"Service account '{name}' defined multiple times.")
+        self._parsed_names["service_accounts"].add(name)
+        account = ServiceAccount(name, policy_file=service_account.get("policy_file"))
+        if account.policy is None:
+            return account
+        # Service accounts with identical policy documents share a single copy of it, which must never be modified.
+        policy = self._policies.setdefault(json.dumps(account.policy, sort_keys=True), account.policy)
+        return replace(account, policy=policy)
+
     @staticmethod
     def parse_iam_attachments(iam_policy_attachments: list):
         """
@@ -247,17 +487,20 @@ class ClusterResources:
 
         iam_policy_attachment_objects = []
         try:
-            logger.debug(f"Parsing {len(iam_policy_attachments)} IAM policy attachments...")
+            logger.debug("Parsing %s IAM policy attachments...", len(iam_policy_attachments))
             for user in iam_policy_attachments:
-                iam_policy_attachments.append(IamPolicyAttachment(user["username"], user["policies"]))
+                iam_policy_attachment_objects.append(ClusterResources.parse_iam_attachment(user))
         except TypeError:
-            logger.error("IAM policy attachments must be defined as a list of YAML dictionaries!")
-            sys.exit(150)
+            logger.error(TYPE_ERRORS["iam_policy_attachments"])
+            sys.exit(TYPE_ERROR_EXIT_CODES["iam_policy_attachments"])
 
         return iam_policy_attachment_objects
 
     @staticmethod
-    def parse_iam_policies(iam_policies: dict):
+    def parse_iam_attachment(user: dict) -> IamPolicyAttachment:
+        return IamPolicyAttachment(user["username"], user["policies"])
+
+    def parse_iam_policies(self, iam_policies: dict):
         """
         Parse a list of IAM policy definitions into IamPolicy objects.
 
@@ -270,20 +513,23 @@ class ClusterResources:
             logger.debug("No IAM policies configured, skipping.")
             return []
 
-        iam_policy_objects, iam_policy_names = [], []
+        iam_policy_objects = []
         try:
-            logger.debug(f"Parsing {len(iam_policies)} IAM policies...")
+            logger.debug("Parsing %s IAM policies...", len(iam_policies))
             for iam_policy in iam_policies:
-                name = iam_policy["name"]
-                if name in iam_policy_names:
-                    logger.error(f"IAM policy '{name}' defined multiple times.")
-                iam_policy_names.append(name)
-                iam_policy_objects.append(IamPolicy(name, iam_policy["policy_file"]))
+                iam_policy_objects.append(self.parse_iam_policy(iam_policy))
         except TypeError:
-            logger.error("IAM policies must be defined as a list of YAML dictionaries!")
+            logger.error(TYPE_ERRORS["iam_policies"])
 
         return iam_policy_objects
 
+    def parse_iam_policy(self, iam_policy: dict) -> IamPolicy:
+        name = iam_policy["name"]
+        if name in self._parsed_names["iam_policies"]:
+            logger.error(f"IAM policy '{name}' defined multiple times.")
+        self._parsed_names["iam_policies"].add(name)
+        return IamPolicy(name, iam_policy["policy_file"])
+
     def parse_resources(self, resources_file: str):
         """
         Parse resources from a YAML file, ensuring they are valid before trying to use them.
@@ -306,6 +552,7 @@ class ClusterResources:
             logger.error("Is the resources file empty?")
             sys.exit(172)
 
+        self.reset_parse_state()
         buckets = resources.get("buckets")
         self.buckets = self.parse_buckets(buckets)
 
@@ -321,15 +568,88 @@ class ClusterResources:
         iam_policy_attachments = resources.get("iam_policy_attachments")
         self.iam_policy_attachments = self.parse_iam_attachments(iam_policy_attachments)
 
-        error_count = get_error_count()
+        self.check_parsed_resources(get_error_count())
+
+    def check_parsed_resources(self, error_count: int):
+        """
+        Exit if errors were found while parsing the resources, or if no resources were configured.
+
+        Args:
+            error_count: the number of errors logged while parsing
+        """
         if error_count > 0:
             noun = "error" if error_count == 1 else "errors"
             logger.error(f"{error_count} {noun} found while parsing resources, you must resolve them first.")
             sys.exit(173)
 
-        if not any([buckets, bucket_policies, service_accounts, iam_policies, iam_policy_attachments]):
+        if not len(self):
             logger.warning("No resources configured.")
             sys.exit(0)
 
+    def stream_resources(self, resources_file: str) -> Iterator[tuple[str, object | None]]:
+        """
+        Parse resources from a YAML file while reading it, yielding every resource as soon as it has been validated.
+
+        Yields (kind, resource) for every valid resource, and (kind, None) once all resources of a kind have been read.
+        Resources with errors are not yielded. Once the whole file has been read, it is checked like parse_resources()
+        does, exiting if any errors were found. Resources are added to this object as well.
+
+        Args:
+            resources_file: string path to the YAML file
+        """
+        logger.info("Loading and parsing resources while applying them...")
+        self.reset_parse_state()
+        self.log_allowed_bucket_prefixes()
+        parsers = {
+            "buckets": self.parse_bucket,
+            "bucket_policies": self.parse_bucket_policy,
+            "service_accounts": self.parse_service_account,
+            "iam_policies": self.parse_iam_policy,
+            "iam_policy_attachments": self.parse_iam_attachment,
+        }
+        # Only count the errors in the thread parsing the resources, not those of reconciling them.
+        errors_before = get_thread_error_count()
+        empty = True
+        try:
+            for kind, items in iter_yaml_sections(resources_file):
+                empty = False
+                if kind in parsers:
+                    yield from self.stream_kind(kind, items, parsers[kind])
+                    yield kind, None
+        except FileNotFoundError:
+            logger.error(f"Resources file {resources_file} not found.")
+            sys.exit(170)
+        except PermissionError:
+            logger.error(f"Incorrect file permissions on {resources_file}.")
+            sys.exit(171)
+        except ValueError as ve:
+            logger.error(str(ve))
+            empty = True
+
+        if empty:
+            logger.error("Is the resources file empty?")
+            sys.exit(172)
+        self.check_parsed_resources(get_thread_error_count() - errors_before)
+
+    def stream_kind(
+        self, kind: str, items: Iterator, parser: Callable[[dict], object]
+    ) -> Iterator[tuple[str, object | None]]:
+        """Parse and validate the streamed resources of one kind, yielding those without errors."""
+        try:
+            for item in items:
+                errors_before = get_thread_error_count()
+                if not isinstance(item, dict):
+                    self.log_type_error(kind)
+                    return
+                resource = parser(item)
+                getattr(self, kind).append(resource)
+                if get_thread_error_count() == errors_before:
+                    yield kind, resource
+        except TypeError:
+            self.log_type_error(kind)
 
-cluster_resources = ClusterResources()
+    @staticmethod
+    def log_type_error(kind: str):
+        logger.error(TYPE_ERRORS[kind])
+        if kind in TYPE_ERROR_EXIT_CODES:
+            sys.exit(TYPE_ERROR_EXIT_CODES[kind])
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import queue
+from collections import defaultdict, deque
+from collections.abc import Callable, Iterable
+
+from minio_manager.classes.journal import Journal
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.profiler import current_resource, run_profiled
+from minio_manager.classes.resource_parser import RESOURCE_KINDS, ClusterResources, resource_dependencies
+from minio_manager.utilities import (
+    ContextThreadPoolExecutor,
+    get_thread_error_count,
+    start_thread,
+)
+
+# Used in log messages.
+RESOURCE_KINDS_SINGULAR = {
+    "buckets": "bucket",
+    "bucket_policies": "bucket policy",
+    "service_accounts": "service account",
+    "iam_policies": "IAM policy",
+    "iam_policy_attachments": "IAM policy attachment",
+}
+
+
+class ResourceScheduler:
+    """
+    ResourceScheduler reconciles resources in the order of their dependencies, instead of one kind at a time.
+
+    Every resource is handled as soon as the resources it depends on have been handled, with at most `concurrency`
+    resources being handled at the same time. When handling a resource fails, the resources that depend on it are
+    skipped, as handling them would fail as well.
+
+    Resources can also be handled while they are still being parsed, see run_stream(). A resource then waits for the
+    resources it depends on until they have been handled, or until all resources of their kind have been parsed
+    without them.
+
+    A resource failed if its handler logged an error or raised an exception. A handler that exits, e.g. by logging a
+    critical message, stops the scheduler once the resources being handled at that moment are done.
+
+    Args:
+        resources: the resources to reconcile, or None when using run_stream()
+        handlers: the function handling a single resource, per kind of resource
+        concurrency: the maximum number of resources to handle at the same time
+        journal: records every resource that was handled without errors
+    """
+
+    def __init__(
+        self,
+        resources: ClusterResources | None,
+        handlers: dict[str, Callable[[object], None]],
+        concurrency: int = 1,
+        journal: Journal | None = None,
+    ):
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.journal = journal
+        self.resources: dict[tuple[str, str], object] = dict(resources.items()) if resources is not None else {}
+        # The resources each waiting resource still waits for, and the resources waiting for each resource.
+        self.waiting: dict[tuple[str, str], set[tuple[str, str]]] = {}
+        self.dependents: dict[tuple[str, str], list[tuple[str, str]]] = defaultdict(list)
+        # Resources that are ready at the same time are handled in the order of the resources file.
+        self.ready: deque[tuple[str, str]] = deque()
+        self.complete_kinds: set[str] = set()
+        self.handled: set[tuple[str, str]] = set()
+        self.failed: set[tuple[str, str]] = set()
+        self.skipped: set[tuple[str, str]] = set()
+        self.streaming = False
+        self.running = 0
+
+    def run(self):
+        """Handle all resources, returning when every resource has been handled or skipped."""
+        self.complete_kinds.update(RESOURCE_KINDS)
+        for key in self.resources:
+            self.schedule(key)
+        self._run(None)
+
+    def run_stream(self, stream: Iterable[tuple[str, object | None]]):
+        """
+        Handle resources while they are being parsed, returning when every resource has been handled or skipped.
+
+        The stream is read on a separate thread. Errors raised by it are raised again once the resources being handled
+        at that moment are done.
+
+        Args:
+            stream: (kind, resource) for every resource, and (kind, None) once all resources of a kind have been
+                parsed, like ClusterResources.stream_resources() yields them
+        """
+        self._run(stream)
+
+    def add(self, kind: str, resource: object):
+        """Add a parsed resource, scheduling it once the resources it depends on have been handled."""
+        key = kind, getattr(resource, RESOURCE_KINDS[kind])
+        self.resources[key] = resource
+        self.schedule(key)
+
+    def schedule(self, key: tuple[str, str]):
+        waiting_for = set()
+        for dependency in resource_dependencies(key[0], self.resources[key]):
+            if dependency in self.failed or dependency in self.skipped:
+                self.skip(key, dependency)
+                return
+            if dependency in self.handled:
+                continue
+            if dependency[0] in self.complete_kinds and dependency not in self.resources:
+                # Dependencies on resources that are not managed here can be ignored.
+                continue
+            waiting_for.add(dependency)
+            self.dependents[dependency].append(key)
+        if waiting_for:
+            self.waiting[key] = waiting_for
+        else:
+            self.ready.append(key)
+
+    def complete_kind(self, kind: str):
+        """Stop waiting for resources of the given kind that have not been added, as all of them have been parsed."""
+        self.complete_kinds.add(kind)
+        for key, waiting_for in list(self.waiting.items()):
+            for dependency in [d for d in waiting_for if d[0] == kind and d not in self.resources]:
+                self.resolve(key, dependency)
+
+    def resolve(self, key: tuple[str, str], dependency: tuple[str, str]):
+        """Stop waiting for a dependency of a resource, scheduling the resource if it does not wait for others."""
+        waiting_for = self.waiting.get(key)
+        if waiting_for is None:
+            return
+        waiting_for.discard(dependency)
+        if not waiting_for:
+            del self.waiting[key]
+            self.ready.append(key)
+
+    def _run(self, stream: Iterable[tuple[str, object | None]] | None):
+        events: queue.SimpleQueue[tuple[str, object, object]] = queue.SimpleQueue()
+        self.streaming = stream is not None
+        if self.streaming:
+            start_thread(run_profiled, self._read_stream, stream, events, name="parse")
+        self.running = 0
+        with ContextThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="reconcile") as executor:
+            while self.streaming or self.ready or self.running:
+                while self.ready and self.running < self.concurrency:
+                    key = self.ready.popleft()
+                    future = executor.submit(run_profiled, self.handle, key)
+                    future.add_done_callback(lambda f, key=key: events.put(("done", key, f)))
+                    self.running += 1
+                if self.streaming or self.running:
+                    self.dispatch(*events.get())
+
+        if self.failed:
+            logger.warning(f"{len(self.failed)} resources failed, skipped {len(self.skipped)} dependent resources.")
+
+    def dispatch(self, event: str, subject, value):
+        """Process an event: a handler finishing, or a resource, a complete kind, the end or an error from the stream."""
+        if event == "done":
+            self.running -= 1
+            # Re-raises SystemExit from the handler, after which the executor waits for the running handlers.
+            self.done(subject, value.result())
+        elif event == "add":
+            self.add(subject, value)
+        elif event == "complete":
+            self.complete_kind(subject)
+        elif event == "close":
+            self.streaming = False
+            for kind in RESOURCE_KINDS:
+                self.complete_kind(kind)
+        else:
+            raise value
+
+    @staticmethod
+    def _read_stream(stream: Iterable[tuple[str, object | None]], events: queue.SimpleQueue):
+        try:
+            for kind, resource in stream:
+                events.put(("add", kind, resource) if resource is not None else ("complete", kind, None))
+            events.put(("close", None, None))
+        except BaseException as e:
+            events.put(("error", None, e))
+
+    def done(self, key: tuple[str, str], succeeded: bool):
+        """Schedule the resources waiting for a handled resource, or skip them if it failed."""
+        if not succeeded:
+            self.skip_dependents(key)
+            return
+        self.handled.add(key)
+        if self.journal is not None:
+            # New credentials are lost if the run is killed before the secret backend is saved, see Journal.
+            resource = self.resources[key]
+            credentials = key[0] == "service_accounts" or getattr(resource, "create_service_account", False)
+            self.journal.record(key, credentials)
+        for dependent in self.dependents.pop(key, []):
+            self.resolve(dependent, key)
+
+    def handle(self, key: tuple[str, str]) -> bool:
+        """
+        Handle a single resource.
+
+        Returns: whether the resource was handled without errors
+        """
+        kind, name = key
+        # Every resource is handled in a copy of the scheduler's context.
+        current_resource.set(f"{RESOURCE_KINDS_SINGULAR[kind]} '{name}'")
+        errors_before = get_thread_error_count()
+        try:
+            self.handlers[kind](self.resources[key])
+        except Exception:
+            # Counted as an error by the logger.
+            logger.exception(f"Unexpected error while handling {RESOURCE_KINDS_SINGULAR[kind]} '{name}'")
+        if get_thread_error_count() == errors_before:
+            return True
+        self.failed.add(key)
+        return False
+
+    def skip_dependents(self, key: tuple[str, str]):
+        """Skip every resource that directly or indirectly depends on the given resource."""
+        pending = list(self.dependents.pop(key, []))
+        while pending:
+            dependent = pending.pop()
+            if dependent in self.skipped:
+                continue
+            self.skip(dependent, key)
+            pending.extend(self.dependents.pop(dependent, []))
+
+    def skip(self, key: tuple[str, str], cause: tuple[str, str]):
+        """Skip a resource, because a resource it depends on failed or was skipped."""
+        self.skipped.add(key)
+        self.waiting.pop(key, None)
+        kind, name = key
+        logger.warning(
+            f"Skipping {RESOURCE_KINDS_SINGULAR[kind]} '{name}', because {RESOURCE_KINDS_SINGULAR[cause[0]]} "
+            f"'{cause[1]}' failed."
+        )
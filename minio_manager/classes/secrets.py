@@ -1,7 +1,12 @@
 # ruff: noqa: A005
 from __future__ import annotations
 
+import os
 import sys
+import threading
+from collections.abc import Iterable
+from dataclasses import replace
+from http import HTTPStatus
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 
@@ -10,10 +15,21 @@ from minio import Minio, S3Error
 from pykeepass import PyKeePass
 from pykeepass.exceptions import CredentialsError
 
+from minio_manager.classes.http_client import http_client
+from minio_manager.classes.lazy_singleton import LazySingleton
 from minio_manager.classes.logging_config import logger
-from minio_manager.classes.minio_resources import ServiceAccount
+from minio_manager.classes.minio_resources import Credentials, ServiceAccount
+from minio_manager.classes.profiler import phase
 from minio_manager.classes.settings import settings
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# How often saving is tried again after another process, like a parallel shard, saved the backend first.
+SAVE_ATTEMPTS = 5
+
 
 class SecretManager:
     """SecretManager is responsible for managing credentials"""
@@ -23,12 +39,21 @@ class SecretManager:
     def __init__(self):
         logger.info("Loading secret backend...")
         self.backend_dirty = False
+        self.added_credentials: list[tuple[ServiceAccount, Credentials]] = []
+        # Credentials prefetched for the current run, by the full name of the service account.
+        self.prefetched: dict[str, Credentials] = {}
+        # Whether every entry of the backend was prefetched, so accounts without prefetched credentials have none.
+        self.prefetched_all = False
+        # Resources are handled concurrently, while the backends are not thread-safe.
+        self.lock = threading.RLock()
         self.backend_type = settings.secret_backend_type
         self.backend_bucket = settings.secret_backend_s3_bucket
         self.backend_secure = settings.s3_endpoint_secure
         self.backend_path = None
         self.keepass_temp_file = None
         self.keepass_group = None
+        # The version of the backend that was loaded, to not overwrite changes made by other processes when saving.
+        self.loaded_version: str | None = None
         if self.backend_type in self.backends_using_s3:
             # We only need to set up the S3 backend if the backend type requires it.
             self.backend_s3 = self.setup_backend_s3()
@@ -40,7 +65,13 @@ class SecretManager:
         access_key = settings.secret_backend_s3_access_key
         secret_key = settings.secret_backend_s3_secret_key
         logger.debug(f"Setting up secret bucket {self.backend_bucket}")
-        s3 = Minio(endpoint=endpoint, access_key=access_key, secret_key=secret_key, secure=self.backend_secure)
+        s3 = Minio(
+            endpoint=endpoint,
+            access_key=access_key,
+            secret_key=secret_key,
+            secure=self.backend_secure,
+            http_client=http_client.lazy_get(),
+        )
         try:
             s3.bucket_exists(self.backend_bucket)
         except S3Error as s3e:
@@ -63,24 +94,69 @@ class SecretManager:
         method = getattr(self, method_name)
         return method()
 
-    def get_credentials(self, account: ServiceAccount, required: bool = False) -> ServiceAccount:
+    def get_credentials(self, account: ServiceAccount, required: bool = False) -> Credentials:
         """Get a password from the configured secret backend.
 
         Args:
             account (ServiceAccount): the details of the password entry
             required (bool): whether the credentials must exist
 
-        Returns: ServiceAccount
+        Returns: Credentials, empty if the backend has no entry for the account
         """
         method_name = f"{self.backend_type}_get_credentials"
         method = getattr(self, method_name)
-        return method(account, required)
+        with self.lock:
+            prefetched = self.prefetched.get(account.full_name)
+            if prefetched and (prefetched.access_key or not required):
+                # Handlers update the credentials they get, which must not change the prefetched credentials.
+                return replace(prefetched)
+            if self.prefetched_all and not prefetched and not required:
+                return Credentials()
+            return method(account, required)
+
+    def get_credentials_many(self, accounts: Iterable[ServiceAccount]) -> dict[str, Credentials]:
+        """Get the passwords of many service accounts from the configured secret backend at once.
+
+        Backends without a more efficient way to do this get the credentials one by one.
+
+        Args:
+            accounts (Iterable[ServiceAccount]): the details of the password entries
+
+        Returns: dict of Credentials by the full name of the service account, empty if the backend has no entry
+        """
+        method = getattr(self, f"{self.backend_type}_get_credentials_many", None)
+        with self.lock:
+            if method:
+                return method(accounts)
+            get_credentials = getattr(self, f"{self.backend_type}_get_credentials")
+            return {account.full_name: get_credentials(account, False) for account in accounts}
+
+    def prefetch(self, accounts: Iterable[ServiceAccount] | None):
+        """Get the credentials of the service accounts that will be handled, so get_credentials does not have to.
+
+        Replaces the credentials prefetched before, so every run starts with the current contents of the backend.
+
+        Args:
+            accounts (Iterable[ServiceAccount] | None): the service accounts that will be handled, or None to get every
+                entry in the backend, when the service accounts are not known yet
+        """
+        if accounts is None:
+            credentials = getattr(self, f"{self.backend_type}_get_all_credentials")()
+        else:
+            credentials = self.get_credentials_many(accounts)
+        with self.lock:
+            self.prefetched = credentials
+            self.prefetched_all = accounts is None
+        logger.debug("Prefetched credentials for %s service accounts", len(credentials))
 
-    def set_password(self, credentials: ServiceAccount):
+    def set_password(self, account: ServiceAccount, credentials: Credentials):
         method_name = f"{self.backend_type}_set_password"
         method = getattr(self, method_name)
-        self.backend_dirty = True
-        return method(credentials)
+        with self.lock:
+            self.backend_dirty = True
+            self.added_credentials.append((account, credentials))
+            self.prefetched[account.full_name] = replace(credentials)
+            return method(account, credentials)
 
     def retrieve_yaml_backend(self) -> dict:
         logger.warning("The YAML backend is insecure and should only be used for testing and development.")
@@ -88,6 +164,7 @@ class SecretManager:
         data_file = Path(self.backend_path)
         try:
             with data_file.open("r") as f:
+                self.loaded_version = self.yaml_version(f.fileno())
                 return yaml.safe_load(f)
         except FileNotFoundError:
             logger.critical(f"Existing YAML backend file '{self.backend_path}' not found;.")
@@ -97,22 +174,64 @@ class SecretManager:
             logger.critical(f"Error parsing {self.backend_path}: {ye}")
             sys.exit(26)
 
-    def yaml_get_credentials(self, account: ServiceAccount, required: bool) -> ServiceAccount:
+    def yaml_get_credentials(self, account: ServiceAccount, required: bool) -> Credentials:
         backend = self.backend  # type: dict
         try:
-            account.access_key = backend[account.full_name]["access_key"]
-            account.secret_key = backend[account.full_name]["secret_key"]
+            return Credentials(backend[account.full_name]["access_key"], backend[account.full_name]["secret_key"])
         except KeyError:
             if required:
                 logger.critical(f"Required entry for {account.full_name} not found or missing access_key/secret_key!")
                 sys.exit(27)
-            return account
-        else:
-            return account
+            return Credentials()
+
+    def yaml_get_credentials_many(self, accounts: Iterable[ServiceAccount]) -> dict[str, Credentials]:
+        backend = self.backend  # type: dict
+        credentials = {}
+        for account in accounts:
+            entry = backend.get(account.full_name) or {}
+            if "access_key" in entry and "secret_key" in entry:
+                credentials[account.full_name] = Credentials(entry["access_key"], entry["secret_key"])
+            else:
+                credentials[account.full_name] = Credentials()
+        return credentials
+
+    def yaml_get_all_credentials(self) -> dict[str, Credentials]:
+        backend = self.backend  # type: dict
+        return {
+            name: Credentials(entry["access_key"], entry["secret_key"])
+            for name, entry in backend.items()
+            if isinstance(entry, dict) and "access_key" in entry and "secret_key" in entry
+        }
+
+    @staticmethod
+    def yaml_version(fd: int) -> str:
+        stat = os.fstat(fd)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
 
-    def yaml_set_password(self, credentials: ServiceAccount):
+    def yaml_save(self) -> bool:
+        """
+        Write the YAML file, unless another process changed it since it was loaded.
+
+        The file is locked while it is checked and written, so processes on the same host can not write it at once.
+
+        Returns: whether the file was written
+        """
+        logger.info(f"Saving modified {self.backend_path}.")
+        with Path(self.backend_path).open("r+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            if self.yaml_version(f.fileno()) != self.loaded_version:
+                return False
+            f.truncate()
+            yaml.safe_dump(self.backend, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
+            f.flush()
+            self.loaded_version = self.yaml_version(f.fileno())
+        logger.info(f"Successfully saved modified {self.backend_path}.")
+        return True
+
+    def yaml_set_password(self, account: ServiceAccount, credentials: Credentials):
         backend = self.backend  # type: dict
-        backend[credentials.full_name] = {"access_key": credentials.access_key, "secret_key": credentials.secret_key}
+        backend[account.full_name] = {"access_key": credentials.access_key, "secret_key": credentials.secret_key}
         self.backend_dirty = True
 
     def retrieve_keepass_backend(self) -> PyKeePass:
@@ -129,6 +248,7 @@ class SecretManager:
         self.keepass_temp_file = tmp_file
         try:
             response = self.backend_s3.get_object(self.backend_bucket, self.backend_path)
+            self.loaded_version = response.headers.get("ETag")
             with tmp_file as f:
                 logger.debug(f"Downloading kdbx file to temp file {tmp_file.name}")
                 f.write(response.data)
@@ -159,7 +279,7 @@ class SecretManager:
         logger.debug("Keepass configured as secret backend")
         return kp
 
-    def keepass_get_credentials(self, account: ServiceAccount, required: bool) -> ServiceAccount:
+    def keepass_get_credentials(self, account: ServiceAccount, required: bool) -> Credentials:
         """Get a password from the configured Keepass database.
 
         Args:
@@ -167,70 +287,152 @@ class SecretManager:
             required (bool): if the entry must exist
 
         Returns:
-            ServiceAccount
+            Credentials
         """
         logger.debug(f"Finding Keepass entry for {account.full_name}")
         entry = self.backend.find_entries(title=account.full_name, group=self.keepass_group, first=True)  # type: Entry
 
         try:
-            account.access_key = entry.username
-            account.secret_key = entry.password
-            logger.debug(f"Found access key {account.access_key}")
+            credentials = Credentials(entry.username, entry.password)
+            logger.debug(f"Found access key {credentials.access_key}")
         except AttributeError as ae:
             if not ae.obj:
                 if required:
                     logger.critical(f"Required entry for {account.full_name} not found!")
                     sys.exit(24)
-                return account
+                return Credentials()
             logger.critical(f"Unhandled exception: {ae}")
         else:
-            return account
+            return credentials
+
+    def keepass_get_credentials_many(self, accounts: Iterable[ServiceAccount]) -> dict[str, Credentials]:
+        """Get the passwords for many service accounts from the configured Keepass database.
+
+        Looking up every entry with find_entries searches the whole database each time, so instead the entries in the
+        group are indexed by title once.
 
-    def keepass_set_password(self, account: ServiceAccount):
+        Args:
+            accounts (Iterable[ServiceAccount]): the names of the password entries
+
+        Returns:
+            dict of Credentials by title
+        """
+        entries = self.keepass_entries_by_title()
+        credentials = {}
+        for account in accounts:
+            entry = entries.get(account.full_name)
+            credentials[account.full_name] = Credentials(entry.username, entry.password) if entry else Credentials()
+        return credentials
+
+    def keepass_get_all_credentials(self) -> dict[str, Credentials]:
+        """Get the passwords of all entries in the configured Keepass database, by title."""
+        return {title: Credentials(e.username, e.password) for title, e in self.keepass_entries_by_title().items()}
+
+    def keepass_entries_by_title(self) -> dict:
+        entries = {}
+        for entry in self.backend.find_entries(group=self.keepass_group):
+            # Like find_entries(first=True), the first entry with a title wins.
+            entries.setdefault(entry.title, entry)
+        return entries
+
+    def keepass_set_password(self, account: ServiceAccount, credentials: Credentials):
         """Set the password for the given credentials.
 
         Args:
-            account (ServiceAccount): the credentials to set
+            account (ServiceAccount): the account the credentials belong to
+            credentials (Credentials): the credentials to set
         """
-        logger.debug(f"Creating Keepass entry '{account.full_name}' with access key '{account.access_key}'")
+        logger.debug(f"Creating Keepass entry '{account.full_name}' with access key '{credentials.access_key}'")
         self.backend.add_entry(
             destination_group=self.keepass_group,
             title=account.full_name,
-            username=account.access_key,
-            password=account.secret_key,
+            username=credentials.access_key,
+            password=credentials.secret_key,
         )
 
-    def cleanup(self):
+    def save(self):
+        """Persist the secret backend if it was modified, so it can be called repeatedly by long-running processes."""
         if not self.backend_dirty:
-            if self.keepass_temp_file:
-                self.keepass_temp_file.close()
-                Path(self.keepass_temp_file.name).unlink(missing_ok=True)
             return
 
-        # If we have dirty back-ends, we want to ensure they are saved before exiting.
-        if self.backend_type == "yaml":
-            logger.info(f"Saving modified {self.backend_path}.")
-            with Path(self.backend_path).open("w") as f:
-                yaml.safe_dump(self.backend, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
-            logger.info(f"Successfully saved modified {self.backend_path}.")
-
-        if self.backend_type == "keepass":
-            # The PyKeePass save() function can take some time. So we want to run it once when the application is
-            # exiting, not every time after creating or updating an entry.
-            # After saving, upload the updated file to the S3 bucket and clean up the temp file.
-            if isinstance(self.backend, PyKeePass):
-                t_filename = self.keepass_temp_file.name  # temp file name
-                s_bucket_name = self.backend_bucket  # bucket name
-                s_filename = self.backend_path  # file name in bucket
-                logger.info(f"Saving modified {s_filename} and uploading back to bucket {s_bucket_name}.")
-                logger.debug(f"Saving temp file {t_filename}")
-                self.backend.save()
-                logger.debug(f"Uploading {t_filename} to bucket {s_bucket_name}")
-                self.backend_s3.fput_object(s_bucket_name, s_filename, t_filename)
-                logger.info(f"Successfully saved modified {s_filename}.")
+        # Other processes, like parallel shards, may save the backend at the same time. Saving fails instead of
+        # overwriting their credentials, after which the latest version is loaded and saved with ours added to it.
+        save = getattr(self, f"{self.backend_type}_save")
+        for _ in range(SAVE_ATTEMPTS):
+            if save():
+                break
+            logger.info(f"{self.backend_path} was changed by another process, saving again with its changes.")
+            self.reload_backend()
+        else:
+            logger.critical(f"Unable to save {self.backend_path}, it kept being changed by other processes.")
+            sys.exit(25)
+
+        self.backend_dirty = False
+        self.added_credentials = []
+
+    def keepass_save(self) -> bool:
+        """
+        Save the KeePass database and upload it to the S3 bucket, unless another process uploaded it since it was
+        downloaded.
+
+        minio-py can not upload objects conditionally, so it is uploaded to a presigned URL with an If-Match header.
+
+        Returns: whether the database was uploaded
+        """
+        # The PyKeePass save() function can take some time. So we want to run it once when the application is
+        # exiting, not every time after creating or updating an entry.
+        t_filename = self.keepass_temp_file.name  # temp file name
+        s_bucket_name = self.backend_bucket  # bucket name
+        s_filename = self.backend_path  # file name in bucket
+        logger.info(f"Saving modified {s_filename} and uploading back to bucket {s_bucket_name}.")
+        logger.debug(f"Saving temp file {t_filename}")
+        self.backend.save()
+        logger.debug(f"Uploading {t_filename} to bucket {s_bucket_name}")
+        url = self.backend_s3.presigned_put_object(s_bucket_name, s_filename)
+        headers = {"If-Match": self.loaded_version} if self.loaded_version else {}
+        response = http_client.request("PUT", url, body=Path(t_filename).read_bytes(), headers=headers)
+        if response.status == HTTPStatus.PRECONDITION_FAILED:
+            return False
+        if response.status != HTTPStatus.OK:
+            logger.critical(f"Unable to upload {s_filename} to {s_bucket_name}: {response.status} {response.data!r}")
+            sys.exit(25)
+        self.loaded_version = response.headers.get("ETag")
+        logger.info(f"Successfully saved modified {s_filename}.")
+        return True
+
+    def reload_backend(self):
+        """
+        Load the latest version of the backend and add the credentials created by this process to it again.
+
+        Saving the backend as it was loaded would drop the credentials other processes, like parallel shards, saved in
+        the meantime.
+        """
+        logger.debug("Reloading secret backend to merge credentials saved by other processes")
+        self.remove_keepass_temp_file()
+        self.backend = self.setup_backend()
+        self.prefetched = {}
+        self.prefetched_all = False
+        for account, credentials in self.added_credentials:
+            if self.get_credentials(account).access_key != credentials.access_key:
+                getattr(self, f"{self.backend_type}_set_password")(account, credentials)
+
+    def remove_keepass_temp_file(self):
+        if self.keepass_temp_file:
             logger.debug(f"Cleaning up {self.keepass_temp_file.name}")
             self.keepass_temp_file.close()
             Path(self.keepass_temp_file.name).unlink(missing_ok=True)
+            self.keepass_temp_file = None
+
+    def cleanup(self):
+        # If we have dirty back-ends, we want to ensure they are saved before exiting.
+        self.save()
+        self.remove_keepass_temp_file()
+
+
+def load_secrets() -> SecretManager:
+    with phase("loading secrets"):
+        return SecretManager()
 
 
-secrets = SecretManager()
+# Loading the backend can take seconds, so it happens on first use, or in the background during startup.
+secrets = LazySingleton("secrets", load_secrets)  # type: SecretManager
@@ -2,9 +2,9 @@ from __future__ import annotations
 
 import json
 import sys
-from typing import Any
+from typing import Any, Literal
 
-from pydantic import ValidationError
+from pydantic import ValidationError, field_validator, model_validator
 from pydantic.fields import Field, FieldInfo
 from pydantic_settings import (
     BaseSettings,
@@ -15,8 +15,22 @@ from pydantic_settings import (
     SettingsConfigDict,
 )
 
+from minio_manager.classes.lazy_singleton import LazySingleton
 
-def parse_bucket_prefixes(value: str) -> str:
+ResourceKind = Literal["buckets", "bucket_policies", "service_accounts", "iam_policies", "iam_policy_attachments"]
+# The kinds of resources, as selectors like `--only bucket=my-bucket` refer to them.
+SELECTOR_KINDS = {
+    "bucket": "buckets",
+    "bucket_policy": "bucket_policies",
+    "service_account": "service_accounts",
+    "iam_policy": "iam_policies",
+    "iam_policy_attachment": "iam_policy_attachments",
+}
+# Settings that can be given as a comma-separated list in environment variables.
+COMMA_SEPARATED_FIELDS = {"allowed_bucket_prefixes", "managed_prefixes", "only", "kind", "groups"}
+
+
+def parse_comma_separated(value: str) -> str:
     value_tuple = tuple(value.split(","))
     # Complex types like list, set, dict, and sub-models are populated from the environment by treating the
     # environment variable's value as a JSON-encoded string.
@@ -27,16 +41,16 @@ def parse_bucket_prefixes(value: str) -> str:
 class CustomEnvSettingsSource(EnvSettingsSource):
     def prepare_field_value(self, field_name: str, field: FieldInfo, value: Any, value_is_complex: bool) -> Any:
         # allow comma-separated list parsing
-        if field_name == "allowed_bucket_prefixes" and value:
-            value = parse_bucket_prefixes(value)
+        if field_name in COMMA_SEPARATED_FIELDS and value:
+            value = parse_comma_separated(value)
         return super().prepare_field_value(field_name, field, value, value_is_complex)
 
 
 class CustomDotEnvSettingsSource(DotEnvSettingsSource):
     def prepare_field_value(self, field_name: str, field: FieldInfo, value: Any, value_is_complex: bool) -> Any:
         # allow comma-separated list parsing
-        if field_name == "allowed_bucket_prefixes" and value:
-            value = parse_bucket_prefixes(value)
+        if field_name in COMMA_SEPARATED_FIELDS and value:
+            value = parse_comma_separated(value)
         return super().prepare_field_value(field_name, field, value, value_is_complex)
 
 
@@ -47,7 +61,6 @@ class Settings(BaseSettings):
     """
 
     model_config = SettingsConfigDict(
-        cli_parse_args=True,
         cli_kebab_case=True,
         env_prefix="MINIO_MANAGER_",
         env_file="config.env",
@@ -56,7 +69,112 @@ class Settings(BaseSettings):
     )
 
     log_level: str = Field(default="INFO", description="The log level to use. Only INFO and DEBUG supported")
+    log_format: Literal["text", "json"] = Field(
+        default="text", description="The log output format, text or json (one JSON object per line)"
+    )
     dry_run: CliImplicitFlag[bool] = Field(default=False, description="Run in dry-run mode, making no changes")
+    concurrency: int = Field(
+        default=8, ge=1, description="The maximum number of resources to reconcile at the same time"
+    )
+    admin_crypto_workers: int = Field(
+        default=0, ge=0, description="Processes encrypting admin API payloads, 0 to encrypt them in the calling thread"
+    )
+    since: str | None = Field(
+        default=None,
+        description="Only reconcile resources changed since this previous resources file or git revision",
+    )
+    shard: str | None = Field(
+        default=None, description="Only reconcile shard i of N, formatted as i/N, to split work over parallel runners"
+    )
+    stream: CliImplicitFlag[bool] = Field(
+        default=False, description="Start reconciling resources while the resources file is still being parsed"
+    )
+    only: tuple[str, ...] = Field(
+        default=(),
+        description="Only reconcile resources matching kind=pattern, e.g. bucket=tenant-*, and what they need",
+    )
+    kind: tuple[ResourceKind, ...] = Field(
+        default=(), description="Only reconcile these kinds of resources, e.g. buckets,iam_policies"
+    )
+    journal_file: str | None = Field(
+        default=None, description="Record reconciled resources in this file, so an interrupted run can be resumed"
+    )
+    resume: CliImplicitFlag[bool] = Field(
+        default=False, description="Skip the unchanged resources the journal file says were already reconciled"
+    )
+    profile: CliImplicitFlag[bool] = Field(
+        default=False, description="Profile every phase of the run with cProfile, writing pstats files to profile_dir"
+    )
+    profile_memory: CliImplicitFlag[bool] = Field(
+        default=False, description="Profile the memory allocated in every phase of the run with tracemalloc"
+    )
+    profile_dir: str = Field(default="profiles", description="The directory to write profiles to")
+    profile_top: int = Field(default=20, ge=1, description="The number of functions or lines to log per phase")
+    slow_call_threshold: float = Field(
+        default=0, ge=0, description="Log API calls taking longer than this many milliseconds, 0 to disable"
+    )
+    call_accounting: CliImplicitFlag[bool] = Field(
+        default=False, description="Count the API calls made for every resource, and log them per kind of resource"
+    )
+    call_accounting_file: str | None = Field(
+        default=None,
+        description="Write the API calls made for every resource to this JSON file, implies call_accounting",
+    )
+    record_file: str | None = Field(
+        default=None, description="Record every API call and its response to this cassette file, with secrets masked"
+    )
+    replay_file: str | None = Field(
+        default=None, description="Answer API calls with the responses recorded in this cassette file, without MinIO"
+    )
+    replay_latency_scale: float = Field(
+        default=1.0, ge=0, description="Multiply the recorded time of replayed API calls by this, 0 to answer at once"
+    )
+    verify_writes: float = Field(
+        default=0, ge=0, le=1, description="The fraction of writes to read back from MinIO and check, 0 to trust them"
+    )
+    capabilities_file: str | None = Field(
+        default=None, description="Remember what the MinIO server supports in this file, to skip detecting it"
+    )
+    capabilities_ttl: int = Field(
+        default=86400, ge=0, description="Seconds to use the capabilities file before detecting them again"
+    )
+    orphans: Literal["ignore", "report", "prune"] = Field(
+        default="ignore", description="What to do with managed resources missing from the resources file"
+    )
+    prune_limit: int = Field(default=10, ge=0, description="Prune nothing if more resources than this are orphaned")
+    managed_prefixes: tuple[str, ...] = Field(
+        default=(), description="Comma-separated name prefixes of the resources that can be orphaned, none if not set"
+    )
+    clusters_file: str | None = Field(
+        default=None, description="Reconcile the resources on all clusters in this file at the same time"
+    )
+    groups: tuple[str, ...] = Field(
+        default=(), description="Reconcile these resources files, or directories with a resources.yaml, in one run"
+    )
+    export_state: str | None = Field(
+        default=None, description="Export the observed state of the cluster to this snapshot file, and exit"
+    )
+    plan_state: str | None = Field(
+        default=None, description="Log the changes to make to the cluster in this snapshot file, without network calls"
+    )
+    daemon: CliImplicitFlag[bool] = Field(
+        default=False, description="Keep running, reconciling resources whenever the resources file changes"
+    )
+    daemon_resync_interval: int = Field(
+        default=3600, description="Seconds between full reconciles in daemon mode, to catch drift"
+    )
+    daemon_poll_interval: float = Field(
+        default=5.0, description="Seconds between file checks in daemon mode when inotify is not available"
+    )
+    daemon_events_address: str | None = Field(
+        default=None, description="Receive MinIO audit log and bucket notification webhooks on this host:port"
+    )
+    daemon_events_token: str | None = Field(
+        default=None, description="The auth_token MinIO must send with webhooks, to ignore webhooks from others"
+    )
+    daemon_events_debounce: float = Field(
+        default=2.0, gt=0, description="Seconds without webhooks before reconciling the resources they changed"
+    )
 
     cluster_name: str = Field(description="The name of the cluster, determines path to credentials in secret backends")
     s3_endpoint: str = Field(description="The endpoint for the S3-compatible storage")
@@ -88,8 +206,112 @@ class Settings(BaseSettings):
     service_account_policy_base_file: str = Field(
         default="", description="The service account policy file to use as a template"
     )
+    controller_policy_file: str | None = Field(
+        default=None, description="The controller user's policy, to check service account policies in dry-run mode"
+    )
+
+    @field_validator("shard")
+    @classmethod
+    def validate_shard(cls, value: str | None) -> str | None:
+        if value is None:
+            return value
+        index, _, count = value.partition("/")
+        if not (index.isdigit() and count.isdigit() and 1 <= int(index) <= int(count)):
+            raise ValueError(f"shard must be formatted as i/N with 1 <= i <= N, got '{value}'")
+        return value
+
+    @model_validator(mode="after")
+    def validate_stream(self) -> Settings:
+        needs_all_resources = {
+            "since": self.since,
+            "shard": self.shard,
+            "only": self.only,
+            "kind": self.kind,
+            "journal_file": self.journal_file,
+        }
+        conflicts = [name for name, value in needs_all_resources.items() if value]
+        if self.stream and conflicts:
+            raise ValueError(f"stream can not be combined with {', '.join(conflicts)}, which need all resources first")
+        return self
+
+    @model_validator(mode="after")
+    def validate_clusters_file(self) -> Settings:
+        conflicts = [name for name in ("daemon", "stream") if getattr(self, name)]
+        if self.clusters_file and conflicts:
+            raise ValueError(f"clusters_file can not be combined with {', '.join(conflicts)}")
+        return self
 
-    _get_on_lifecycle_supported: bool = True
+    @model_validator(mode="after")
+    def validate_groups(self) -> Settings:
+        conflicts = [name for name in ("daemon", "stream", "clusters_file") if getattr(self, name)]
+        if self.groups and conflicts:
+            raise ValueError(f"groups can not be combined with {', '.join(conflicts)}")
+        return self
+
+    @model_validator(mode="after")
+    def validate_snapshot(self) -> Settings:
+        conflicts = [
+            name for name in ("daemon", "stream", "clusters_file", "groups", "plan_state") if getattr(self, name)
+        ]
+        if self.export_state and conflicts:
+            raise ValueError(f"export_state can not be combined with {', '.join(conflicts)}")
+        conflicts = [name for name in ("daemon", "stream", "clusters_file", "groups") if getattr(self, name)]
+        if self.plan_state and conflicts:
+            raise ValueError(f"plan_state can not be combined with {', '.join(conflicts)}")
+        return self
+
+    @model_validator(mode="after")
+    def validate_cassette(self) -> Settings:
+        if self.record_file and self.replay_file:
+            raise ValueError("record_file can not be combined with replay_file")
+        if (self.record_file or self.replay_file) and self.clusters_file:
+            raise ValueError("record_file and replay_file can not be combined with clusters_file")
+        return self
+
+    @model_validator(mode="after")
+    def validate_resume(self) -> Settings:
+        if self.resume and not self.journal_file:
+            raise ValueError("resume needs journal_file, the journal of the run to resume")
+        return self
+
+    @field_validator("daemon_events_address")
+    @classmethod
+    def validate_daemon_events_address(cls, value: str | None) -> str | None:
+        if value is None:
+            return value
+        _, separator, port = value.rpartition(":")
+        if not separator or not port.isdigit():
+            raise ValueError(f"daemon_events_address must be formatted as host:port, got '{value}'")
+        return value
+
+    @field_validator("only")
+    @classmethod
+    def validate_only(cls, value: tuple[str, ...]) -> tuple[str, ...]:
+        for selector in value:
+            kind, _, pattern = selector.partition("=")
+            if kind not in SELECTOR_KINDS or not pattern:
+                kinds = ", ".join(SELECTOR_KINDS)
+                raise ValueError(
+                    f"selectors must be formatted as kind=pattern with kind one of {kinds}, got '{selector}'"
+                )
+        return value
+
+    @property
+    def selectors(self) -> dict[str, list[str]]:
+        """The name patterns of the resources to reconcile given with `only`, by kind of resource, e.g. "buckets"."""
+        selectors: dict[str, list[str]] = {}
+        for selector in self.only:
+            kind, _, pattern = selector.partition("=")
+            selectors.setdefault(SELECTOR_KINDS[kind], []).append(pattern)
+        return selectors
+
+    @property
+    def shard_index_count(self) -> tuple[int, int] | None:
+        """The shard to reconcile as a (index, count) tuple, with a 1-based index."""
+        if not self.shard:
+            return None
+        index, count = self.shard.split("/")
+        return int(index), int(count)
 
     @classmethod
     def settings_customise_sources(
@@ -100,15 +322,22 @@ class Settings(BaseSettings):
         dotenv_settings: PydanticBaseSettingsSource,
         file_secret_settings: PydanticBaseSettingsSource,
     ) -> tuple[PydanticBaseSettingsSource, ...]:
+        # Settings given explicitly, e.g. to a Reconciler, take precedence. Command line arguments come before all.
         return (
+            init_settings,
             CustomEnvSettingsSource(settings_cls),
             CustomDotEnvSettingsSource(settings_cls),
-            init_settings,
         )
 
 
-try:
-    settings = Settings()
-except ValidationError as e:
-    print(f"Error loading settings: {e}")
-    sys.exit(1)
+def load_settings() -> Settings:
+    """Load the settings from the command line arguments, the environment variables and the dotenv file."""
+    try:
+        return Settings(_cli_parse_args=True)
+    except ValidationError as e:
+        print(f"Error loading settings: {e}")
+        sys.exit(1)
+
+
+# Loaded on first use, so that importing MinIO Manager does not parse the command line arguments.
+settings = LazySingleton("settings", load_settings)  # type: Settings
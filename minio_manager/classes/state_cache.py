@@ -0,0 +1,118 @@
+"""
+Remember the state of resources in MinIO observed during a run, so handlers do not read back what they just wrote.
+
+Handlers read the current state of a resource through the cache, and record what they successfully wrote to it. A
+read after a write, like comparing a policy after creating it, then uses the written state instead of another API call.
+States read once are also reused, like the service account read to check that it exists and then to compare its
+policy.
+
+Successful writes are trusted. With `verify_writes`, that fraction of writes is read back from MinIO and compared to
+what was written, logging an error if they differ.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import random
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.settings import settings
+from minio_manager.utilities import compare_objects
+
+# The state of a resource that was not observed yet.
+UNKNOWN = object()
+
+
+class StateCache:
+    """
+    StateCache holds the observed state of resources, by (kind, name) key, e.g. ("bucket_policy", "my-bucket").
+
+    The state of a resource is only read and written by the thread handling it, but different resources are handled by
+    different threads at the same time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.states: dict[tuple[str, str], Any] = {}
+
+    def read(self, key: tuple[str, str], read: Callable[[], Any]) -> Any:
+        """
+        Get the observed state of a resource, reading it from MinIO if it was not observed yet.
+
+        Args:
+            key: the (kind, name) key of the resource
+            read: reads the state from MinIO; errors it raises are passed on and not cached
+        """
+        with self.lock:
+            if key in self.states:
+                return self.states[key]
+        state = read()
+        with self.lock:
+            self.states[key] = state
+        return state
+
+    def get(self, key: tuple[str, str]) -> Any:
+        """The observed state of a resource, or UNKNOWN if it was not observed yet."""
+        with self.lock:
+            return self.states.get(key, UNKNOWN)
+
+    def set(self, key: tuple[str, str], state: Any):
+        """Record the state of a resource that is known without reading it, e.g. of a bucket that was just created."""
+        with self.lock:
+            self.states[key] = state
+
+    def written(self, key: tuple[str, str], state: Any, read: Callable[[], Any]):
+        """
+        Record the state that was successfully written to a resource, verifying a sample of writes.
+
+        Args:
+            key: the (kind, name) key of the resource
+            state: the state that was written
+            read: reads the state from MinIO, to verify the write
+        """
+        if settings.verify_writes and random.random() < settings.verify_writes:  # noqa: S311, not for cryptography
+            observed = read()
+            if compare_objects(observed, state):
+                kind, name = key
+                logger.error(f"The {kind.replace('_', ' ')} of '{name}' in MinIO does not match what was written.")
+            state = observed
+        self.set(key, state)
+
+    def forget(self, key: tuple[str, str]):
+        """Forget the observed state of a resource, e.g. when a write failed and its state is unknown."""
+        with self.lock:
+            self.states.pop(key, None)
+
+
+_state_cache: contextvars.ContextVar[StateCache | None] = contextvars.ContextVar(
+    "minio_manager.state_cache", default=None
+)
+
+
+@contextmanager
+def state_cache() -> Iterator[StateCache]:
+    """
+    Use one state cache for everything reconciled inside the block.
+
+    A cache that is already in use, e.g. by a batch of groups, is used instead of a new one. Every reconcile of the
+    daemon uses a new cache, so that changes made outside MinIO Manager in between are seen.
+    """
+    cache = _state_cache.get()
+    if cache is not None:
+        yield cache
+        return
+    cache = StateCache()
+    token = _state_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _state_cache.reset(token)
+
+
+def observed_state() -> StateCache:
+    """The state cache in use, or an empty one that is not kept if there is none."""
+    return _state_cache.get() or StateCache()
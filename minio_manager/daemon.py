@@ -0,0 +1,194 @@
+import math
+import signal
+import sys
+import time
+
+import yaml
+
+from minio_manager.classes.capabilities import capabilities
+from minio_manager.classes.controller_user import controller_user
+from minio_manager.classes.event_receiver import DriftIndex, EventReceiver
+from minio_manager.classes.file_watcher import FileWatcher
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.classes.secrets import secrets
+from minio_manager.classes.settings import settings
+from minio_manager.resource_diff import changed_resources, fingerprint_resources, referenced_files
+from minio_manager.resource_handler import handle_resources
+from minio_manager.utilities import get_error_count, read_yaml, reset_error_count
+
+
+class Daemon:
+    """
+    Daemon keeps MinIO Manager running, reconciling only the resources whose definitions changed.
+
+    The clients, the secret backend and the controller user policy are set up once and stay warm between reconciles.
+    The resources file and every file it refers to are watched; when one of them changes, the resources are parsed
+    again and only resources with a different fingerprint are reconciled. Every `daemon_resync_interval` seconds all
+    resources are reconciled, to catch drift made outside MinIO Manager.
+
+    With `daemon_events_address`, MinIO reports changes through webhooks, see EventReceiver, and the resources changed
+    outside MinIO Manager are reconciled right away.
+    """
+
+    def __init__(self):
+        self.resources_file = settings.cluster_resources_file
+        self.watcher = FileWatcher(settings.daemon_poll_interval)
+        self.fingerprints: dict[tuple[str, str], str] = {}
+        # When the last full reconcile was attempted, and whether it still has to be done because parsing failed.
+        self.last_full_reconcile = -math.inf
+        self.full_pending = False
+        self.drift_index: DriftIndex | None = None
+        self.events = None
+        if settings.daemon_events_address:
+            self.events = EventReceiver(
+                settings.daemon_events_address, settings.daemon_events_token, controller_user.access_key
+            )
+
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        logger.info(
+            f"Running as daemon, watching {self.resources_file} and reconciling all resources every "
+            f"{settings.daemon_resync_interval} seconds."
+        )
+        try:
+            while True:
+                full = (
+                    self.full_pending or time.monotonic() - self.last_full_reconcile >= settings.daemon_resync_interval
+                )
+                self.reconcile(full=full)
+                timeout = self.last_full_reconcile + settings.daemon_resync_interval - time.monotonic()
+                changed_files = self.wait(timeout)
+                if changed_files:
+                    logger.info(f"Detected changes to {', '.join(str(f) for f in sorted(changed_files))}")
+        finally:
+            self.watcher.close()
+            if self.events is not None:
+                self.events.close()
+
+    def wait(self, timeout: float) -> set:
+        """
+        Wait until one of the watched files changes, or the timeout expires, reconciling drift reported in between.
+
+        Args:
+            timeout: the maximum number of seconds to wait
+
+        Returns: the files that changed, empty if the timeout expired
+        """
+        if self.events is None:
+            return self.watcher.wait(timeout)
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            changed_files = self.watcher.wait(min(remaining, settings.daemon_events_debounce))
+            if changed_files:
+                return changed_files
+            targets = self.events.take(settings.daemon_events_debounce)
+            if targets and self.drift_index is not None:
+                self.reconcile_drift(targets)
+        return set()
+
+    def reconcile_drift(self, targets: set[tuple[str, str]]):
+        """Reconcile the resources declaring the targets changed outside MinIO Manager, see EventReceiver."""
+        keys = self.drift_index.keys(targets)
+        if not keys:
+            logger.debug("Ignoring changes to undeclared resources: %s", sorted(targets))
+            return
+        logger.info(f"Reconciling {len(keys)} resources changed outside MinIO Manager...")
+        reset_error_count()
+        try:
+            handle_resources(self.drift_index.resources.subset(keys))
+        except Exception:
+            logger.exception("Unexpected error while reconciling resources")
+        finally:
+            self.save()
+        if get_error_count():
+            logger.warning(
+                "Reconciling resources changed outside MinIO Manager failed, the next full reconcile will retry."
+            )
+
+    @staticmethod
+    def save():
+        """Save the credentials of new service accounts and the detected capabilities after every reconcile."""
+        secrets.save()
+        if capabilities.lazy_initialized:
+            capabilities.save()
+
+    def parse(self) -> tuple[dict, ClusterResources] | None:
+        """
+        Read and parse the resources file, and watch it and the files it refers to for changes.
+
+        Returns: the raw and parsed resources, or None if the resources file can not be read or is invalid
+        """
+        try:
+            raw_resources = read_yaml(self.resources_file)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            logger.error(f"Unable to read {self.resources_file}: {e}")
+            logger.warning("Not reconciling until the resources file is fixed.")
+            self.watcher.watch({self.resources_file, *self.watcher.files})
+            return None
+        self.watcher.watch({self.resources_file, *referenced_files(raw_resources)})
+
+        resources = ClusterResources()
+        try:
+            resources.parse_resources(self.resources_file)
+        except SystemExit:
+            # Parsing exits on invalid resources, which must not stop the daemon.
+            logger.warning("Not reconciling until the resources are fixed.")
+            return None
+        return raw_resources, resources
+
+    def reconcile(self, full: bool):
+        """
+        Parse the resources and reconcile them.
+
+        Args:
+            full: reconcile all resources, instead of only those that changed since the previous reconcile
+        """
+        reset_error_count()
+        if full:
+            # Recorded before parsing, so a broken resources file is parsed again once it changes, or after the resync
+            # interval, instead of right away.
+            self.last_full_reconcile = time.monotonic()
+            self.full_pending = True
+        parsed = self.parse()
+        if parsed is None:
+            return
+        raw_resources, resources = parsed
+
+        all_resources = resources
+        if settings.shard_index_count:
+            resources = resources.shard(*settings.shard_index_count)
+        if settings.only or settings.kind:
+            resources = resources.select(settings.selectors, settings.kind)
+        self.drift_index = DriftIndex(resources)
+        fingerprints = fingerprint_resources(raw_resources)
+        if full:
+            logger.info(f"Reconciling all {len(resources)} resources...")
+            self.full_pending = False
+        else:
+            changed = changed_resources(self.fingerprints, fingerprints)
+            if not changed:
+                logger.info("No resources changed.")
+                self.fingerprints = fingerprints
+                return
+            resources = resources.subset(changed)
+            logger.info(f"Reconciling {len(resources)} changed resources...")
+
+        try:
+            handle_resources(resources)
+            if full and settings.orphans != "ignore":
+                from minio_manager.orphan_handler import handle_orphans
+
+                handle_orphans(all_resources)
+        except Exception:
+            logger.exception("Unexpected error while reconciling resources")
+        finally:
+            self.save()
+
+        self.fingerprints = fingerprints
+        error_count = get_error_count()
+        if error_count:
+            noun = "error" if error_count == 1 else "errors"
+            logger.warning(f"Reconcile finished with {error_count} {noun}, the next full reconcile will retry.")
+        else:
+            logger.info("Reconcile finished.")
@@ -0,0 +1,164 @@
+"""
+Reconcile the same resources on multiple clusters at the same time.
+
+The clusters file is a YAML list of clusters, each given as the settings that differ from the main settings, e.g.:
+
+    - cluster_name: cluster-a
+      s3_endpoint: minio-a.example.com
+      minio_controller_user: minio-manager
+    - cluster_name: cluster-b
+      s3_endpoint: minio-b.example.com
+      secret_backend_s3_access_key: ...
+
+The resources are parsed once, after which a worker process is forked for every cluster. Every worker reconciles the
+resources with a Reconciler using the settings of its cluster, so the secret backend is loaded from that cluster, and
+KeePass entries are looked up in the group of its `cluster_name`. Settings that affect parsing the resources are taken
+from the main settings.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import sys
+import time
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from minio_manager.classes.errors import ReconcileError
+from minio_manager.classes.logging_config import MinioManagerLogger, PrefixFilter, logger
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.classes.settings import Settings, settings
+from minio_manager.utilities import read_yaml
+
+
+def read_clusters(clusters_file: str) -> list[Settings]:
+    """
+    Read the clusters file, and create the settings of every cluster in it.
+
+    Args:
+        clusters_file: the path to the clusters file
+
+    Returns: list of Settings, one per cluster
+    """
+    try:
+        targets = read_yaml(clusters_file)
+    except (OSError, ValueError) as e:
+        logger.critical(f"Unable to read clusters file {clusters_file}: {e}")
+        sys.exit(190)
+    if not isinstance(targets, list) or not all(isinstance(target, dict) for target in targets) or not targets:
+        logger.critical(f"Clusters file {clusters_file} must be a list of clusters, each a mapping of settings.")
+        sys.exit(191)
+
+    base = settings.model_dump(exclude={"clusters_file"})
+    clusters = []
+    for number, target in enumerate(targets, start=1):
+        unknown = target.keys() - Settings.model_fields.keys()
+        if unknown or "cluster_name" not in target:
+            logger.critical(
+                f"Cluster {number} in {clusters_file} must have a cluster_name, and only known settings, "
+                f"got {', '.join(sorted(unknown)) or 'no cluster_name'}."
+            )
+            sys.exit(192)
+        name = target["cluster_name"]
+        # Every cluster needs its own journal and profiles, unless they are configured explicitly.
+        derived = {}
+        if settings.journal_file and "journal_file" not in target:
+            journal_file = Path(settings.journal_file)
+            derived["journal_file"] = str(journal_file.with_name(f"{journal_file.stem}-{name}{journal_file.suffix}"))
+        if "profile_dir" not in target:
+            derived["profile_dir"] = str(Path(settings.profile_dir) / name)
+        try:
+            clusters.append(Settings.model_validate({**base, **derived, **target}))
+        except ValidationError as e:
+            logger.critical(f"Invalid settings for cluster '{name}' in {clusters_file}: {e}")
+            sys.exit(193)
+
+    names = [cluster.cluster_name for cluster in clusters]
+    if len(set(names)) != len(names):
+        logger.critical(f"Cluster names in {clusters_file} must be unique.")
+        sys.exit(194)
+    return clusters
+
+
+def reconcile_cluster(cluster_settings: Settings, resources: ClusterResources, connection: Connection):
+    """
+    Reconcile the resources on a single cluster, in a worker process.
+
+    The number of errors is sent over the connection, and the worker exits with the exit code MinIO Manager would have
+    exited with when reconciling only this cluster.
+    """
+    from minio_manager.reconciler import Reconciler
+
+    log_name = "root" if cluster_settings.log_level == "DEBUG" else "minio-manager"
+    cluster_logger = MinioManagerLogger(log_name, cluster_settings.log_level, cluster_settings.log_format)
+    cluster_logger.handler.addFilter(PrefixFilter(cluster_settings.cluster_name))
+    reconciler = Reconciler(cluster_settings, logger=cluster_logger)
+    error_count = None
+    try:
+        error_count = reconciler.reconcile(resources)
+        exit_code = 1 if error_count else 0
+    except ReconcileError as e:
+        exit_code = e.exit_code
+    except Exception:
+        cluster_logger.exception("Unexpected error while reconciling")
+        exit_code = 1
+    finally:
+        reconciler.close()
+        cluster_logger.close()
+    connection.send(error_count)
+    sys.exit(exit_code)
+
+
+def reconcile_clusters(clusters_file: str) -> int:
+    """
+    Reconcile the resources on every cluster in the clusters file at the same time.
+
+    Args:
+        clusters_file: the path to the clusters file
+
+    Returns: the exit code of the first cluster in the clusters file that failed, or 0 if none failed
+    """
+    clusters = read_clusters(clusters_file)
+    cluster_resources = ClusterResources()
+    cluster_resources.parse_resources(settings.cluster_resources_file)
+    logger.info(f"Reconciling {len(cluster_resources)} resources on {len(clusters)} clusters...")
+    # Make sure no log records are being written while forking.
+    logger.flush()
+
+    context = multiprocessing.get_context("fork")
+    start = time.perf_counter()
+    workers = {}
+    for cluster_settings in clusters:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=reconcile_cluster,
+            args=(cluster_settings, cluster_resources, sender),
+            name=f"cluster-{cluster_settings.cluster_name}",
+        )
+        process.start()
+        sender.close()
+        workers[process.sentinel] = cluster_settings.cluster_name, process, receiver
+
+    results: dict[str, tuple[int, int | None, float]] = {}
+    while workers:
+        for sentinel in wait(list(workers)):
+            name, process, receiver = workers.pop(sentinel)
+            process.join()
+            try:
+                error_count = receiver.recv()
+            except EOFError:
+                # The worker died before it could send the number of errors.
+                error_count = None
+            results[name] = process.exitcode, error_count, time.perf_counter() - start
+            logger.info(f"Cluster '{name}' finished with exit code {process.exitcode}.")
+
+    for cluster_settings in clusters:
+        exit_code, error_count, seconds = results[cluster_settings.cluster_name]
+        errors = "unknown" if error_count is None else error_count
+        log = logger.info if exit_code == 0 else logger.warning
+        log(
+            f"Cluster '{cluster_settings.cluster_name}': exit code {exit_code}, {errors} errors, {seconds:.2f} seconds."
+        )
+    return next((results[c.cluster_name][0] for c in clusters if results[c.cluster_name][0] != 0), 0)
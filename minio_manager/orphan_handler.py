@@ -0,0 +1,174 @@
+"""
+Find, report and prune orphaned resources: resources managed by MinIO Manager that are no longer in the resources file.
+
+Buckets, the controller user's service accounts and IAM policies are each listed once, and compared to the declared
+resources by name. Only resources with a name matching `managed_prefixes` are considered, as several resources files
+may be applied to the same cluster by the same controller user; nothing is orphaned if it is not set. Of those, only
+resources MinIO Manager could have created are considered:
+
+- buckets matching `allowed_bucket_prefixes` (if set), except the secret backend bucket
+- service accounts of the controller user with a description in the "{full_name} - {description}" format MinIO
+  Manager uses, except the controller user's own access key
+- IAM policies, except the policies built into MinIO and the policies attached to the controller user
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Iterator
+
+from minio import S3Error
+from minio.error import MinioAdminException
+
+from minio_manager.classes.client_manager import client_manager
+from minio_manager.classes.controller_user import controller_user
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.profiler import current_resource, run_profiled
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.classes.resource_scheduler import RESOURCE_KINDS_SINGULAR
+from minio_manager.classes.settings import settings
+from minio_manager.utilities import ContextThreadPoolExecutor
+
+BUILTIN_POLICIES = frozenset({"consoleAdmin", "diagnostics", "readonly", "readwrite", "writeonly"})
+
+
+def list_buckets() -> Iterator[str]:
+    """Yield the names of the buckets MinIO Manager may manage."""
+    for bucket in client_manager.s3.list_buckets():
+        if bucket.name == settings.secret_backend_s3_bucket:
+            continue
+        if settings.allowed_bucket_prefixes and not bucket.name.startswith(settings.allowed_bucket_prefixes):
+            continue
+        if is_managed(bucket.name):
+            yield bucket.name
+
+
+def list_service_accounts() -> Iterator[tuple[str, str]]:
+    """Yield the full name and access key of the controller user's service accounts created by MinIO Manager."""
+    sa_list = json.loads(client_manager.admin.list_service_account(settings.minio_controller_user))  # type: dict
+    for sa in sa_list.get("accounts") or []:
+        access_key = sa["accessKey"]
+        if access_key == controller_user.access_key:
+            continue
+        # Older MinIO versions only list the access keys.
+        info = sa if "name" in sa else json.loads(client_manager.admin.get_service_account(access_key))
+        name, description = info.get("name") or "", info.get("description") or ""
+        full_name, separator, _ = description.partition(" - ")
+        if name and separator and full_name.startswith(name) and is_managed(full_name):
+            yield full_name, access_key
+
+
+def is_managed(name: str) -> bool:
+    """Whether the resource with the given name is managed by this resources file, see managed_prefixes."""
+    prefixes = settings.managed_prefixes
+    return bool(prefixes) and name.startswith(prefixes)
+
+
+def is_managed_iam_policy(name: str) -> bool:
+    """Whether MinIO Manager may manage the IAM policy with the given name."""
+    return is_managed(name) and name not in BUILTIN_POLICIES
+
+
+def controller_user_policies() -> set[str]:
+    """The names of the IAM policies attached to the controller user."""
+    info = json.loads(client_manager.admin.user_info(settings.minio_controller_user))
+    return set(filter(None, (info.get("policyName") or "").split(",")))
+
+
+def list_iam_policies() -> Iterator[str]:
+    """Yield the names of the IAM policies MinIO Manager may manage, except the ones attached to the controller user."""
+    names = [name for name in json.loads(client_manager.admin.policy_list()) if is_managed_iam_policy(name)]
+    if not names:
+        return
+    try:
+        attached = controller_user_policies()
+    except MinioAdminException as mae:
+        logger.warning(f"Unable to get the policies of the controller user, skipping orphaned IAM policies: {mae}")
+        return
+    for name in names:
+        if name not in attached:
+            yield name
+
+
+def find_orphans(resources: ClusterResources) -> dict[str, dict[str, str]]:
+    """
+    Find the resources MinIO Manager manages in MinIO that are not declared in the given resources.
+
+    Args:
+        resources: all declared resources
+
+    Returns: dict of the orphaned resources by kind, mapping their names to what identifies them in MinIO
+    """
+    if not settings.managed_prefixes:
+        return {"buckets": {}, "service_accounts": {}, "iam_policies": {}}
+    declared_accounts = {account.full_name for account in resources.service_accounts}
+    declared_accounts.update(bucket.name for bucket in resources.buckets if bucket.create_service_account)
+
+    buckets = set(list_buckets()) - {bucket.name for bucket in resources.buckets}
+    service_accounts = dict(list_service_accounts())
+    iam_policies = set(list_iam_policies()) - {policy.name for policy in resources.iam_policies}
+    return {
+        "buckets": {name: name for name in sorted(buckets)},
+        "service_accounts": {
+            name: service_accounts[name] for name in sorted(service_accounts.keys() - declared_accounts)
+        },
+        "iam_policies": {name: name for name in sorted(iam_policies)},
+    }
+
+
+def delete_orphan(kind: str, name: str, identifier: str):
+    """Delete a single orphaned resource, logging an error if that fails."""
+    current_resource.set(f"orphaned {RESOURCE_KINDS_SINGULAR[kind]} '{name}'")
+    try:
+        if kind == "buckets":
+            # Buckets that still contain objects can not be removed, which protects their data.
+            client_manager.s3.remove_bucket(identifier)
+        elif kind == "service_accounts":
+            client_manager.admin.delete_service_account(identifier)
+        else:
+            client_manager.admin.policy_remove(identifier)
+    except (S3Error, MinioAdminException) as e:
+        logger.error(f"Unable to prune {RESOURCE_KINDS_SINGULAR[kind]} '{name}': {e}")
+        return
+    logger.info(f"Pruned {RESOURCE_KINDS_SINGULAR[kind]} '{name}'")
+
+
+def handle_orphans(resources: ClusterResources):
+    """
+    Report the orphaned resources, and prune them if configured to.
+
+    Nothing is pruned when more than `prune_limit` resources are orphaned, as that usually means the wrong or an
+    incomplete resources file was used.
+
+    Args:
+        resources: all declared resources, not just the ones being reconciled
+    """
+    shard = settings.shard_index_count
+    if shard and shard[0] != 1:
+        logger.debug("Orphaned resources are handled by shard 1.")
+        return
+    if not settings.managed_prefixes:
+        logger.warning("Not looking for orphaned resources, MINIO_MANAGER_MANAGED_PREFIXES is not set.")
+        return
+
+    logger.info("Looking for orphaned resources...")
+    orphans = find_orphans(resources)
+    items = [(kind, name, identifier) for kind, names in orphans.items() for name, identifier in names.items()]
+    if not items:
+        logger.info("No orphaned resources found.")
+        return
+    for kind, name, _ in items:
+        logger.warning(f"Orphaned {RESOURCE_KINDS_SINGULAR[kind]} '{name}' is not in the resources file.")
+    if settings.orphans != "prune":
+        logger.info(f"Found {len(items)} orphaned resources, use MINIO_MANAGER_ORPHANS=prune to remove them.")
+        return
+    if len(items) > settings.prune_limit:
+        logger.error(
+            f"Found {len(items)} orphaned resources, more than the prune limit of {settings.prune_limit}. Not pruning "
+            "anything; check the resources file, or raise MINIO_MANAGER_PRUNE_LIMIT."
+        )
+        return
+
+    logger.info(f"Pruning {len(items)} orphaned resources...")
+    with ContextThreadPoolExecutor(max_workers=settings.concurrency, thread_name_prefix="prune") as executor:
+        list(executor.map(lambda item: run_profiled(delete_orphan, *item), items))
@@ -0,0 +1,190 @@
+"""
+Plan the changes reconciling the resources would make, against a snapshot of the cluster instead of MinIO itself.
+
+The plan compares the resources to the snapshot like the handlers compare them to MinIO, without any network calls or
+access to the secret backend, so it can run in CI for every change to the resources file. See snapshot.py for
+exporting a snapshot. The plan is only as recent as the snapshot, and differs from a real run in a few ways:
+
+- service accounts are found by their name and description, as their access keys are in the secret backend
+- policies of service accounts with more permissions than the controller user are planned as the base policy, as
+  MinIO would reject them
+- lifecycle configurations that could not be exported are always planned to be updated, like the handler does
+"""
+
+from __future__ import annotations
+
+import time
+
+from minio.versioningconfig import OFF
+
+from minio_manager.app import select_resources
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.minio_resources import Bucket, BucketPolicy, IamPolicy, IamPolicyAttachment, ServiceAccount
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.classes.settings import settings
+from minio_manager.orphan_handler import is_managed, is_managed_iam_policy
+from minio_manager.policy_evaluator import is_policy_subset
+from minio_manager.snapshot import lifecycle_from_xml, read_snapshot
+from minio_manager.utilities import compare_objects, read_json
+
+
+class Plan:
+    """
+    Plan holds the changes to make to the cluster, as one line per change, and the snapshot they were planned against.
+
+    Args:
+        snapshot: the snapshot, as read by read_snapshot()
+    """
+
+    def __init__(self, snapshot: dict):
+        self.snapshot = snapshot
+        self.changes: list[str] = []
+        self.counts = {"create": 0, "update": 0, "orphaned": 0}
+        # Service accounts by full name, see ServiceAccountIndex.find(), and those created by MinIO Manager.
+        self.service_accounts: dict[str, dict] = {}
+        self.managed_accounts: set[str] = set()
+        for account in snapshot["service_accounts"].values():
+            full_name, separator, _ = account["description"].partition(" - ")
+            if account["name"] and separator and full_name.startswith(account["name"]):
+                self.service_accounts.setdefault(full_name, account)
+                self.managed_accounts.add(full_name)
+            elif account["name"]:
+                self.service_accounts.setdefault(account["name"], account)
+
+    def add(self, action: str, kind: str, name: str, detail: str = ""):
+        symbol = {"create": "+", "update": "~", "orphaned": "-"}[action]
+        self.counts[action] += 1
+        self.changes.append(f"{symbol} {action} {kind} '{name}'{f': {detail}' if detail else ''}")
+
+    def plan_bucket(self, bucket: Bucket):
+        current = self.snapshot["buckets"].get(bucket.name)
+        if current is None:
+            self.add("create", "bucket", bucket.name)
+            # Like handle_bucket() records for a new bucket.
+            current = {"versioning": OFF, "lifecycle": None, "policy": None}
+        if bucket.versioning and current["versioning"] != bucket.versioning.status:
+            self.add(
+                "update", "bucket versioning", bucket.name, f"{current['versioning']} -> {bucket.versioning.status}"
+            )
+        if bucket.lifecycle_config:
+            if "lifecycle" not in current:
+                self.add("update", "bucket lifecycle", bucket.name, "the current configuration is unknown")
+            elif compare_objects(lifecycle_from_xml(current["lifecycle"]), bucket.lifecycle_config):
+                action = "update" if current["lifecycle"] else "create"
+                self.add(action, "bucket lifecycle", bucket.name)
+        if bucket.create_service_account:
+            self.plan_service_account(ServiceAccount(bucket.name).with_base_policy())
+
+    def plan_bucket_policy(self, bucket_policy: BucketPolicy):
+        bucket = self.snapshot["buckets"].get(bucket_policy.bucket) or {}
+        self.plan_policy("bucket policy", bucket_policy.bucket, bucket.get("policy"), bucket_policy.policy_file)
+
+    def plan_iam_policy(self, iam_policy: IamPolicy):
+        current = self.snapshot["iam_policies"].get(iam_policy.name)
+        self.plan_policy("IAM policy", iam_policy.name, current, iam_policy.policy_file)
+
+    def plan_policy(self, kind: str, name: str, current: dict | None, policy_file: str):
+        desired = read_json(policy_file)
+        if current is None:
+            self.add("create", kind, name)
+        elif compare_objects(current, desired):
+            self.add("update", kind, name)
+
+    def plan_service_account(self, account: ServiceAccount):
+        if account.policy and is_policy_subset(account.policy, self.snapshot["controller_policy"]) is False:
+            # See limit_to_controller_policy().
+            self.add("update", "service account policy", account.full_name, "more permissions than the controller user")
+            account = account.with_base_policy()
+        current = self.service_accounts.get(account.full_name)
+        if current is None:
+            self.add("create", "service account", account.full_name)
+        elif account.policy and compare_objects(current["policy"], account.policy):
+            self.add("update", "service account policy", account.full_name)
+
+    def plan_iam_policy_attachment(self, attachment: IamPolicyAttachment):
+        users = self.snapshot.get("users")
+        if users is None:
+            self.add("update", "IAM policy attachment", attachment.username, "the current attachments are unknown")
+            return
+        missing = sorted(set(attachment.policies) - set(users.get(attachment.username, ())))
+        if missing:
+            self.add("update", "IAM policy attachment", attachment.username, f"attach {', '.join(missing)}")
+
+    def orphaned_iam_policies(self, resources: ClusterResources) -> set[str]:
+        """The orphaned IAM policies, see orphan_handler.list_iam_policies()."""
+        users = self.snapshot.get("users")
+        if users is None:
+            # The policies attached to the controller user are unknown, so none can be orphaned.
+            return set()
+        managed = {name for name in self.snapshot["iam_policies"] if is_managed_iam_policy(name)}
+        return managed - set(users.get(settings.minio_controller_user, ())) - {p.name for p in resources.iam_policies}
+
+    def plan_orphans(self, resources: ClusterResources):
+        """
+        Plan the orphaned resources, see find_orphans().
+
+        Args:
+            resources: all declared resources, not just the selected ones
+        """
+        if not settings.managed_prefixes:
+            logger.warning("Not planning orphaned resources, MINIO_MANAGER_MANAGED_PREFIXES is not set.")
+            return
+        buckets = {
+            name
+            for name in self.snapshot["buckets"]
+            if name != settings.secret_backend_s3_bucket
+            and (not settings.allowed_bucket_prefixes or name.startswith(settings.allowed_bucket_prefixes))
+            and is_managed(name)
+        }
+        declared_accounts = {account.full_name for account in resources.service_accounts}
+        declared_accounts.update(bucket.name for bucket in resources.buckets if bucket.create_service_account)
+        orphans = {
+            "bucket": buckets - {bucket.name for bucket in resources.buckets},
+            "service account": {name for name in self.managed_accounts if is_managed(name)} - declared_accounts,
+            "IAM policy": self.orphaned_iam_policies(resources),
+        }
+        for kind, names in orphans.items():
+            for name in sorted(names):
+                self.add("orphaned", kind, name, "pruned" if settings.orphans == "prune" else "reported")
+
+
+def plan_resources(resources: ClusterResources, snapshot: dict) -> Plan:
+    """Plan the changes reconciling the resources would make to the cluster in the snapshot."""
+    plan = Plan(snapshot)
+    for bucket in resources.buckets:
+        plan.plan_bucket(bucket)
+    for bucket_policy in resources.bucket_policies:
+        plan.plan_bucket_policy(bucket_policy)
+    for account in resources.service_accounts:
+        plan.plan_service_account(account)
+    for iam_policy in resources.iam_policies:
+        plan.plan_iam_policy(iam_policy)
+    for attachment in resources.iam_policy_attachments:
+        plan.plan_iam_policy_attachment(attachment)
+    return plan
+
+
+def plan(snapshot_file: str):
+    """Log the changes reconciling the resources file would make to the cluster in the snapshot file."""
+    start = time.perf_counter()
+    snapshot = read_snapshot(snapshot_file)
+    if snapshot["endpoint"] != settings.s3_endpoint:
+        logger.warning(
+            f"Snapshot file {snapshot_file} is of cluster '{snapshot['endpoint']}', not '{settings.s3_endpoint}'."
+        )
+    age = time.time() - snapshot["exported_at"]
+    logger.info(f"Planning against the snapshot of cluster '{snapshot['endpoint']}' from {age / 60:.0f} minutes ago.")
+
+    cluster_resources = ClusterResources()
+    cluster_resources.parse_resources(settings.cluster_resources_file)
+    resources = select_resources(cluster_resources)
+    result = plan_resources(resources, snapshot)
+    if settings.orphans != "ignore":
+        result.plan_orphans(cluster_resources)
+    for change in result.changes:
+        logger.info(change)
+    counts = result.counts
+    logger.info(
+        f"Plan: {counts['create']} to create, {counts['update']} to update, {counts['orphaned']} orphaned, for "
+        f"{len(resources)} resources in {(time.perf_counter() - start) * 1000:.0f} milliseconds."
+    )
@@ -0,0 +1,216 @@
+"""
+Evaluate IAM policies locally, to find out whether one policy grants nothing more than another.
+
+MinIO limits a service account to the policy of its parent user: a service account policy granting more than the
+parent's policy is replaced by the parent's policy. Checking this locally saves applying a policy just to find out it
+was not accepted.
+
+Only the parts of the policy language that MinIO Manager policies use are understood: Allow and Deny statements with
+Action, Resource and Condition. Wildcards (* and ?) are supported in actions, resources and condition values. Anything
+else makes the outcome unknown, in which case the caller has to ask MinIO.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import cache
+from typing import TYPE_CHECKING
+
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.minio_resources import ServiceAccount
+
+if TYPE_CHECKING:
+    from minio_manager.classes.resource_parser import ClusterResources
+
+# Condition operators whose values are wildcard patterns, instead of values that must match exactly.
+PATTERN_CONDITION_OPERATORS = {"StringLike", "StringNotLike", "ArnLike", "ArnNotLike"}
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+@cache
+def _compile_pattern(pattern: str) -> re.Pattern:
+    """Compile a policy wildcard pattern to a regular expression."""
+    parts = (".*" if c == "*" else "." if c == "?" else re.escape(c) for c in pattern)
+    return re.compile("".join(parts), re.DOTALL)
+
+
+@cache
+def pattern_covers(pattern: str, subpattern: str) -> bool:
+    """
+    Whether every string matched by `subpattern` is also matched by `pattern`.
+
+    Wildcards in the subpattern can only be covered by wildcards in the pattern: "s3:*" covers "s3:Get*", but "s3:Get?"
+    does not cover "s3:Get*".
+
+    Args:
+        pattern: the wildcard pattern that should cover the subpattern
+        subpattern: the wildcard pattern that should be covered
+
+    Returns: bool
+    """
+    if "*" not in subpattern and "?" not in subpattern:
+        return _compile_pattern(pattern).fullmatch(subpattern) is not None
+
+    # Dynamic programming over (position in subpattern, position in pattern): covered[i][j] is whether
+    # subpattern[i:] is covered by pattern[j:].
+    n, m = len(subpattern), len(pattern)
+    covered = [[False] * (m + 1) for _ in range(n + 1)]
+    covered[n][m] = True
+    for j in range(m - 1, -1, -1):
+        covered[n][j] = pattern[j] == "*" and covered[n][j + 1]
+    for i in range(n - 1, -1, -1):
+        for j in range(m - 1, -1, -1):
+            if pattern[j] == "*":
+                covered[i][j] = covered[i][j + 1] or covered[i + 1][j]
+            elif subpattern[i] == "*":
+                covered[i][j] = False
+            elif subpattern[i] == "?":
+                covered[i][j] = pattern[j] == "?" and covered[i + 1][j + 1]
+            else:
+                covered[i][j] = pattern[j] in ("?", subpattern[i]) and covered[i + 1][j + 1]
+    return covered[0][0]
+
+
+def _actions(statement: dict) -> list[str]:
+    # Actions are case-insensitive.
+    return [action.lower() for action in _as_list(statement.get("Action"))]
+
+
+def _resources(statement: dict) -> list[str]:
+    # Statements with only admin actions have no resources, they apply to everything.
+    return _as_list(statement.get("Resource")) or ["*"]
+
+
+def _conditions(statement: dict) -> dict[tuple[str, str], list[str]]:
+    return {
+        (operator, key): [str(value) for value in _as_list(values)]
+        for operator, conditions in (statement.get("Condition") or {}).items()
+        for key, values in conditions.items()
+    }
+
+
+def _base_operator(operator: str) -> str:
+    """The condition operator without a ForAllValues/ForAnyValue prefix or IfExists suffix, e.g. "StringNotLike"."""
+    return operator.rpartition(":")[2].removesuffix("IfExists")
+
+
+def _values_cover(operator: str, values: list[str], subvalues: list[str]) -> bool:
+    """Whether a condition with `values` holds whenever the same condition with `subvalues` holds."""
+    base_operator = _base_operator(operator)
+    if "Not" in base_operator:
+        # Negated operators, like StringNotEquals and NotIpAddress, hold for everything except their values. They
+        # cover a condition that excludes at least as much: every value of `values` must be in `subvalues`.
+        values, subvalues = subvalues, values
+    for subvalue in subvalues:
+        if base_operator in PATTERN_CONDITION_OPERATORS:
+            if not any(pattern_covers(value, subvalue) for value in values):
+                return False
+        elif subvalue not in values:
+            return False
+    return True
+
+
+def _conditions_cover(conditions: dict[tuple[str, str], list[str]], subconditions: dict) -> bool:
+    """Whether a statement with `conditions` applies whenever a statement with `subconditions` applies."""
+    for (operator, key), values in conditions.items():
+        subvalues = subconditions.get((operator, key))
+        if subvalues is None or not _values_cover(operator, values, subvalues):
+            return False
+    return True
+
+
+def _is_understood(statement: dict) -> bool:
+    keys = set(statement) - {"Sid"}
+    return statement.get("Effect") in ("Allow", "Deny") and keys <= {"Effect", "Action", "Resource", "Condition"}
+
+
+def is_policy_subset(policy: dict, superset_policy: dict) -> bool | None:
+    """
+    Determine whether a policy grants nothing more than another policy.
+
+    Args:
+        policy: the policy to check, e.g. the desired policy of a service account
+        superset_policy: the policy that should cover it, e.g. the policy of the controller user
+
+    Returns: True if it does, False if it grants more, None if that can not be determined locally
+    """
+    statements = _as_list(policy.get("Statement"))
+    superset_statements = _as_list(superset_policy.get("Statement"))
+    if not all(isinstance(s, dict) and _is_understood(s) for s in statements + superset_statements):
+        return None
+
+    allows = [s for s in superset_statements if s["Effect"] == "Allow"]
+    denies = [s for s in superset_statements if s["Effect"] == "Deny"]
+    result: bool | None = True
+    for statement in statements:
+        if statement["Effect"] == "Deny":
+            # Denying more than the superset policy does never grants anything.
+            continue
+        conditions = _conditions(statement)
+        for action in _actions(statement):
+            for resource in _resources(statement):
+                if denies and _is_denied(action, resource, denies):
+                    # A superset policy denying part of what is allowed may or may not apply, depending on conditions.
+                    result = None
+                    continue
+                matches = [
+                    s
+                    for s in allows
+                    if any(pattern_covers(a, action) for a in _actions(s))
+                    and any(pattern_covers(r, resource) for r in _resources(s))
+                ]
+                if not matches:
+                    return False
+                if not any(_conditions_cover(_conditions(s), conditions) for s in matches):
+                    # Covered only under conditions that may or may not hold.
+                    result = None
+    return result
+
+
+def _is_denied(action: str, resource: str, denies: list[dict]) -> bool:
+    """Whether any deny statement may apply to the action and resource, which are both patterns."""
+    return any(
+        any(_patterns_overlap(a, action) for a in _actions(s))
+        and any(_patterns_overlap(r, resource) for r in _resources(s))
+        for s in denies
+    )
+
+
+def _patterns_overlap(pattern: str, other: str) -> bool:
+    # Conservative: patterns overlap unless their literal prefixes differ.
+    prefix = re.split(r"[*?]", pattern, maxsplit=1)[0]
+    other_prefix = re.split(r"[*?]", other, maxsplit=1)[0]
+    return prefix.startswith(other_prefix) or other_prefix.startswith(prefix)
+
+
+def check_service_account_policies(resources: ClusterResources, controller_policy: dict) -> int:
+    """
+    Report the service accounts whose policy has more permissions than the controller user's policy, without MinIO.
+
+    Args:
+        resources: the resources to check, including the service accounts automatically created for buckets
+        controller_policy: the policy of the controller user
+
+    Returns: the number of service accounts with too many permissions
+    """
+    accounts = list(resources.service_accounts)
+    accounts += [ServiceAccount(b.name).with_base_policy() for b in resources.buckets if b.create_service_account]
+    over_privileged = 0
+    for account in accounts:
+        if not account.policy:
+            continue
+        is_subset = is_policy_subset(account.policy, controller_policy)
+        if is_subset is False:
+            over_privileged += 1
+            logger.warning(
+                f"Policy for service account '{account.full_name}' has more permissions than the controller user's "
+                "policy, the base policy for service accounts would be applied instead."
+            )
+        elif is_subset is None:
+            logger.info(f"Unable to check the policy for service account '{account.full_name}' without MinIO.")
+    return over_privileged
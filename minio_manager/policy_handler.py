@@ -3,10 +3,22 @@ import json
 from minio import S3Error
 from minio.error import MinioAdminException
 
+from minio_manager.classes.capabilities import capabilities
 from minio_manager.classes.client_manager import client_manager
 from minio_manager.classes.logging_config import logger
 from minio_manager.classes.minio_resources import BucketPolicy, IamPolicy, IamPolicyAttachment
-from minio_manager.utilities import compare_objects, increment_error_count, read_json
+from minio_manager.classes.state_cache import observed_state
+from minio_manager.utilities import compare_objects, read_json
+
+
+def read_bucket_policy(bucket: str) -> dict | None:
+    """The current policy of a bucket, or None if it has none."""
+    try:
+        return json.loads(client_manager.s3.get_bucket_policy(bucket))
+    except S3Error as s3e:
+        if s3e.code == "NoSuchBucketPolicy":
+            return None
+        raise
 
 
 def handle_bucket_policy(bucket_policy: BucketPolicy):
@@ -19,35 +31,67 @@ def handle_bucket_policy(bucket_policy: BucketPolicy):
     Args:
         bucket_policy: BucketPolicy
     """
-    current_policy = {}
     desired_policy = read_json(bucket_policy.policy_file)
     desired_policy_json = json.dumps(desired_policy)
+    key = ("bucket_policy", bucket_policy.bucket)
+    state = observed_state()
 
     try:
-        current_policy_str = client_manager.s3.get_bucket_policy(bucket_policy.bucket)
-        current_policy = json.loads(current_policy_str)
+        current_policy = state.read(key, lambda: read_bucket_policy(bucket_policy.bucket))
     except S3Error as s3e:
-        if s3e.code == "NoSuchBucketPolicy":
-            logger.info(f"Creating bucket policy for {bucket_policy.bucket}")
-            try:
-                client_manager.s3.set_bucket_policy(bucket_policy.bucket, desired_policy_json)
-                current_policy = client_manager.s3.get_bucket_policy(bucket_policy.bucket)
-            except S3Error as sbe:
-                if sbe.code == "MalformedPolicy":
-                    logger.error(
-                        "Unable to apply policy: do the resources in the policy file match the bucket name? Is it valid JSON?"
-                    )
-                    return
-
-    policies_diff = compare_objects(current_policy, desired_policy)
-    if not policies_diff:
+        logger.error(f"Failed to get bucket policy for '{bucket_policy.bucket}': {s3e.code}")
+        return
+
+    if current_policy is None:
+        logger.info(f"Creating bucket policy for {bucket_policy.bucket}")
+    elif not compare_objects(current_policy, desired_policy):
         return
+    else:
+        logger.info(f"Desired bucket policy for '{bucket_policy.bucket}' does not match current policy. Updating.")
 
-    logger.info(f"Desired bucket policy for '{bucket_policy.bucket}' does not match current policy. Updating.")
     try:
         client_manager.s3.set_bucket_policy(bucket_policy.bucket, desired_policy_json)
     except S3Error as s3e:
-        logger.error(f"Failed to update bucket policy: {s3e.code}")
+        state.forget(key)
+        if s3e.code == "MalformedPolicy":
+            logger.error(
+                "Unable to apply policy: do the resources in the policy file match the bucket name? Is it valid JSON?"
+            )
+        else:
+            logger.error(f"Failed to update bucket policy: {s3e.code}")
+        return
+    state.written(key, desired_policy, lambda: read_bucket_policy(bucket_policy.bucket))
+
+
+def read_iam_policy(name: str) -> dict | None:
+    """The current IAM policy with the given name, or None if it does not exist."""
+    try:
+        return json.loads(client_manager.admin.policy_info(name))
+    except MinioAdminException as mae:
+        # noinspection PyProtectedMember
+        mae_obj = json.loads(mae._body)
+        if mae_obj["Code"] == "XMinioAdminNoSuchPolicy":
+            return None
+        raise
+
+
+def prefetch_iam_policies(iam_policies: list[IamPolicy]):
+    """Get the documents of all IAM policies with a single call, instead of one call per policy, if MinIO lists them."""
+    if len(iam_policies) < 2 or capabilities.get("bulk_policy_list") is False:
+        return
+    try:
+        listed = json.loads(client_manager.admin.policy_list())
+    except MinioAdminException as mae:
+        logger.debug("Unable to list IAM policies, getting them one by one: %s", mae)
+        return
+    documents = isinstance(listed, dict) and all(isinstance(policy, dict) for policy in listed.values())
+    capabilities.set("bulk_policy_list", documents)
+    if not documents:
+        return
+    state = observed_state()
+    for iam_policy in iam_policies:
+        # All policies are listed, so policies that are not do not exist.
+        state.set(("iam_policy", iam_policy.name), listed.get(iam_policy.name))
 
 
 def handle_iam_policy(iam_policy: IamPolicy):
@@ -59,28 +103,26 @@ def handle_iam_policy(iam_policy: IamPolicy):
     Args:
         iam_policy: IamPolicy
     """
-    current_policy = None
     desired_policy = read_json(iam_policy.policy_file)
+    key = ("iam_policy", iam_policy.name)
+    state = observed_state()
 
     try:
-        current_policy_str = client_manager.s3.policy_info(iam_policy.name)
-        current_policy = json.loads(current_policy_str)
-    except MinioAdminException as mae:
-        # noinspection PyProtectedMember
-        mae_obj = json.loads(mae._body)
-        if mae_obj["Code"] == "XMinioAdminNoSuchPolicy":
-            logger.info(f"IAM policy {iam_policy.name} does not exist, creating.")
-            client_manager.admin.policy_add(iam_policy.name, iam_policy.policy_file)
-            current_policy = client_manager.admin.policy_info(iam_policy.name)
-        else:
-            logger.exception("An unknown exception occurred")
-            increment_error_count()
+        current_policy = state.read(key, lambda: read_iam_policy(iam_policy.name))
+    except MinioAdminException:
+        logger.exception(f"Failed to get IAM policy '{iam_policy.name}'")
+        return
 
-    if not compare_objects(current_policy, desired_policy):
+    if current_policy is None:
+        logger.info(f"IAM policy {iam_policy.name} does not exist, creating.")
+    elif not compare_objects(current_policy, desired_policy):
         return
+    else:
+        logger.info(f"Desired IAM policy '{iam_policy.name}' does not match current policy. Updating IAM policy.")
 
-    logger.info(f"Desired IAM policy '{iam_policy.name}' does not match current policy. Updating IAM policy.")
+    state.forget(key)
     client_manager.admin.policy_add(iam_policy.name, iam_policy.policy_file)
+    state.written(key, desired_policy, lambda: read_iam_policy(iam_policy.name))
 
 
 def handle_iam_policy_attachments(user: IamPolicyAttachment):
@@ -90,9 +132,9 @@ def handle_iam_policy_attachments(user: IamPolicyAttachment):
     Args:
         user: IamPolicyAttachment
     """
-    logger.debug(f"Handling user policy attachments for '{user.username}'")
+    logger.debug("Handling user policy attachments for '%s'", user.username)
     for policy_name in user.policies:
-        logger.debug(f"Attaching policy '{policy_name}' to access key '{user.username}'")
+        logger.debug("Attaching policy '%s' to access key '%s'", policy_name, user.username)
         client_manager.admin.policy_set(policy_name, user.username)
 
     # TODO: don't set the attachments if they're already attached
@@ -0,0 +1,122 @@
+"""
+Reconcile resources from another Python process, e.g. a service that provisions resources on request.
+
+Example:
+    settings = Settings(cluster_name="my-cluster", s3_endpoint="minio.example.com", ..., _env_file=None)
+    with Reconciler(settings) as reconciler:
+        error_count = reconciler.reconcile(resources)
+"""
+
+from __future__ import annotations
+
+import contextvars
+import threading
+
+from minio_manager import app
+from minio_manager.classes.capabilities import capabilities
+from minio_manager.classes.client_manager import ClientManager
+from minio_manager.classes.client_manager import client_manager as default_client_manager
+from minio_manager.classes.controller_user import controller_user
+from minio_manager.classes.errors import ReconcileError
+from minio_manager.classes.http_client import http_client
+from minio_manager.classes.lazy_singleton import LazySingleton
+from minio_manager.classes.logging_config import MinioManagerLogger
+from minio_manager.classes.logging_config import logger as default_logger
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.classes.secrets import SecretManager
+from minio_manager.classes.secrets import secrets as default_secrets
+from minio_manager.classes.settings import Settings
+from minio_manager.classes.settings import settings as default_settings
+from minio_manager.utilities import error_counter, get_error_count
+
+
+class Reconciler:
+    """
+    Reconciler reconciles resources with its own settings, logger, secret backend and clients.
+
+    MinIO Manager's modules share objects like `settings`, `secrets` and `client_manager`. While a Reconciler
+    reconciles, these refer to its own objects, so multiple reconcilers can be used in one process, also at the same
+    time from different threads. The logger, secret backend and clients are created on first use and reused by the
+    next reconciles, so the secret backend is only loaded once. A single reconciler reconciles one call at a time.
+
+    Critical errors, which make the command line exit, raise a ReconcileError instead.
+
+    Args:
+        settings: the settings to use; command line arguments are not used
+        secret_manager: the secret backend to use, loaded according to the settings if not given
+        logger: the logger to use, created according to the settings if not given
+        clients: the MinIO clients to use, created according to the settings if not given
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        secret_manager: SecretManager | None = None,
+        logger: MinioManagerLogger | None = None,
+        clients: ClientManager | None = None,
+    ):
+        self.settings = settings
+        self.owns_logger = logger is None
+        self.objects: dict[LazySingleton, LazySingleton] = {
+            default_settings: default_settings.lazy_scoped(lambda: settings),
+            default_logger: default_logger.lazy_scoped(None if logger is None else lambda: logger),
+            default_secrets: default_secrets.lazy_scoped(None if secret_manager is None else lambda: secret_manager),
+            http_client: http_client.lazy_scoped(),
+            controller_user: controller_user.lazy_scoped(),
+            default_client_manager: default_client_manager.lazy_scoped(None if clients is None else lambda: clients),
+            capabilities: capabilities.lazy_scoped(),
+        }
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> Reconciler:
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _use_objects(self):
+        for singleton, scoped in self.objects.items():
+            singleton.lazy_use(scoped)
+        error_counter.lazy_use(error_counter.lazy_scoped())
+
+    def reconcile(self, resources: ClusterResources | None = None) -> int:
+        """
+        Reconcile resources like running MinIO Manager from the command line does, as configured by the settings.
+
+        Args:
+            resources: the resources to reconcile, parsed from the settings' cluster resources file if not given
+
+        Returns: the number of errors logged while reconciling
+
+        Raises:
+            ReconcileError: if reconciling stopped because of a critical error
+        """
+        with self.lock:
+            return contextvars.copy_context().run(self._reconcile, resources)
+
+    def _reconcile(self, resources: ClusterResources | None) -> int:
+        self._use_objects()
+        try:
+            app.reconcile(resources)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+            raise ReconcileError("Reconciling stopped", exit_code) from e
+        finally:
+            if default_secrets.lazy_initialized:
+                # Credentials of new service accounts must be saved, the backend stays loaded for the next reconcile.
+                default_secrets.save()
+            if default_logger.lazy_initialized:
+                default_logger.flush()
+        return get_error_count()
+
+    def close(self):
+        """Remove the local copy of the secret backend, and stop the logger if the reconciler created it."""
+        with self.lock:
+            contextvars.copy_context().run(self._close)
+
+    def _close(self):
+        self._use_objects()
+        if default_secrets.lazy_initialized:
+            default_secrets.cleanup()
+        if self.owns_logger and default_logger.lazy_initialized:
+            default_logger.close()
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import subprocess
+import sys
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+
+import yaml
+
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.resource_parser import RESOURCE_KINDS
+from minio_manager.classes.settings import settings
+from minio_manager.utilities import read_yaml
+
+# The key in the resources file that identifies each resource, per kind of resource.
+RAW_RESOURCE_KEYS = {
+    "buckets": "name",
+    "bucket_policies": "bucket",
+    "service_accounts": "name",
+    "iam_policies": "name",
+    "iam_policy_attachments": "username",
+}
+# The keys in the resources file that refer to other files, per kind of resource.
+REFERENCED_FILE_KEYS = {
+    "buckets": ("object_lifecycle_file",),
+    "bucket_policies": ("policy_file",),
+    "service_accounts": ("policy_file",),
+    "iam_policies": ("policy_file",),
+    "iam_policy_attachments": (),
+}
+
+
+def read_file_bytes(file: str) -> bytes | None:
+    try:
+        return Path(file).read_bytes()
+    except OSError:
+        return None
+
+
+def iter_raw_resources(resources: dict):
+    """
+    Yield (kind, name, definition) for every well-formed resource definition in a loaded resources file.
+
+    Malformed definitions are skipped, parsing the resources reports them.
+    """
+    if not isinstance(resources, dict):
+        return
+    for kind in RESOURCE_KINDS:
+        definitions = resources.get(kind)
+        if not isinstance(definitions, list):
+            continue
+        for definition in definitions:
+            if isinstance(definition, dict) and RAW_RESOURCE_KEYS[kind] in definition:
+                yield kind, str(definition[RAW_RESOURCE_KEYS[kind]]), definition
+
+
+def referenced_files(resources: dict) -> set[str]:
+    """
+    Get the files a loaded resources file refers to, including the files configured in the settings.
+
+    Args:
+        resources: the loaded resources file
+
+    Returns: set of file paths
+    """
+    files = {settings.default_lifecycle_policy_file, settings.service_account_policy_base_file}
+    for kind, _, definition in iter_raw_resources(resources):
+        files.update(definition.get(key) for key in REFERENCED_FILE_KEYS[kind])
+    return {file for file in files if file}
+
+
+def fingerprint_resources(
+    resources: dict, read_file: Callable[[str], bytes | None] = read_file_bytes
+) -> dict[tuple[str, str], str]:
+    """
+    Calculate a fingerprint of the desired state of every resource in a loaded resources file.
+
+    A fingerprint covers the resource definition and the contents of every file it refers to, so a change to a policy
+    or lifecycle file changes the fingerprints of all resources using it.
+
+    Args:
+        resources: the loaded resources file
+        read_file: function returning the contents of a referenced file, or None if it does not exist
+
+    Returns: dict mapping (kind, name) keys, like ClusterResources.resource_keys(), to fingerprints
+    """
+    file_hashes: dict[str, str] = {}
+
+    def hash_file(file: str | None) -> str:
+        if not file:
+            return ""
+        if file not in file_hashes:
+            content = read_file(file)
+            file_hashes[file] = hashlib.sha256(content).hexdigest() if content is not None else "missing"
+        return file_hashes[file]
+
+    fingerprints = {}
+    for kind, name, definition in iter_raw_resources(resources):
+        digest = hashlib.sha256(json.dumps(definition, sort_keys=True, default=str).encode())
+        for key in REFERENCED_FILE_KEYS[kind]:
+            digest.update(hash_file(definition.get(key)).encode())
+        if kind == "buckets":
+            # Buckets without their own lifecycle file use the default, and their service account uses the base policy
+            digest.update(hash_file(settings.default_lifecycle_policy_file).encode())
+            digest.update(hash_file(settings.service_account_policy_base_file).encode())
+        fingerprints[(kind, name)] = digest.hexdigest()
+    return fingerprints
+
+
+def changed_resources(old: dict[tuple[str, str], str], new: dict[tuple[str, str], str]) -> set[tuple[str, str]]:
+    """
+    Get the keys of the resources that were added or modified between two sets of fingerprints.
+    """
+    return {key for key, fingerprint in new.items() if old.get(key) != fingerprint}
+
+
+def _git(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], capture_output=True, check=False)  # noqa: S603, S607
+
+
+@contextmanager
+def git_revision_reader(revision: str) -> Iterator[Callable[[str], bytes | None]]:
+    """
+    Create a function that reads files as they were in the given git revision, until the block exits.
+
+    Files outside the git work tree can not be read from the revision, so their current contents are returned.
+
+    Args:
+        revision: any git revision, e.g. a commit hash, branch name or "HEAD~1"
+
+    Yields: function returning the contents of a file, or None if it did not exist in the revision
+    """
+    toplevel = _git("rev-parse", "--show-toplevel")
+    if toplevel.returncode != 0:
+        logger.critical(f"'{revision}' is not a file, and the current directory is not in a git repository.")
+        sys.exit(180)
+    if _git("rev-parse", "--verify", "--quiet", f"{revision}^{{commit}}").returncode != 0:
+        logger.critical(f"'{revision}' is neither a file nor a valid git revision.")
+        sys.exit(181)
+    work_tree = Path(toplevel.stdout.decode().strip()).resolve()
+    # A single long-running cat-file process avoids starting git for each of possibly thousands of policy files.
+    cat_file = subprocess.Popen(
+        ["git", "cat-file", "--batch"], stdin=subprocess.PIPE, stdout=subprocess.PIPE  # noqa: S607
+    )
+
+    @cache
+    def read_file(file: str) -> bytes | None:
+        try:
+            path = Path(file).resolve().relative_to(work_tree)
+        except ValueError:
+            return read_file_bytes(file)
+        cat_file.stdin.write(f"{revision}:{path.as_posix()}\n".encode())
+        cat_file.stdin.flush()
+        header = cat_file.stdout.readline().split()
+        if len(header) != 3 or header[1] != b"blob":
+            return None
+        content = cat_file.stdout.read(int(header[2]))
+        cat_file.stdout.read(1)  # trailing newline
+        return content
+
+    try:
+        yield read_file
+    finally:
+        cat_file.stdin.close()
+        cat_file.stdout.close()
+        cat_file.wait()
+
+
+def changed_since(since: str, resources_file: str) -> set[tuple[str, str]]:
+    """
+    Determine which resources were added or modified compared to a previous revision of the resources.
+
+    Args:
+        since: a previous resources file, or a git revision of the current resources file
+        resources_file: the current resources file
+
+    Returns: the (kind, name) keys of the added and modified resources
+    """
+    if Path(since).is_file():
+        # The referenced files of a plain file can only be read as they are now, so only definitions are compared.
+        logger.debug(f"Comparing resources to previous resources file {since}")
+        previous = fingerprint_resources(read_yaml(since) or {})
+    else:
+        logger.debug(f"Comparing resources to git revision {since}")
+        with git_revision_reader(since) as read_previous_file:
+            previous_content = read_previous_file(resources_file)
+            previous_resources = yaml.safe_load(previous_content) if previous_content else {}
+            if previous_content is None:
+                logger.warning(f"{resources_file} did not exist in revision '{since}', all resources are new.")
+            previous = fingerprint_resources(previous_resources or {}, read_previous_file)
+    current = fingerprint_resources(read_yaml(resources_file))
+    return changed_resources(previous, current)
@@ -1,36 +1,67 @@
-from minio_manager.bucket_handler import handle_bucket
+from collections.abc import Iterator
+
+from minio_manager.bucket_handler import handle_bucket, prefetch_buckets
+from minio_manager.classes.client_manager import client_manager
+from minio_manager.classes.journal import Journal
 from minio_manager.classes.logging_config import logger
-from minio_manager.classes.resource_parser import ClusterResources
-from minio_manager.policy_handler import handle_bucket_policy, handle_iam_policy, handle_iam_policy_attachments
-from minio_manager.service_account_handler import handle_service_account
+from minio_manager.classes.minio_resources import ServiceAccount
+from minio_manager.classes.profiler import phase
+from minio_manager.classes.resource_parser import RESOURCE_KINDS, ClusterResources
+from minio_manager.classes.resource_scheduler import ResourceScheduler
+from minio_manager.classes.secrets import secrets
+from minio_manager.classes.settings import settings
+from minio_manager.classes.state_cache import state_cache
+from minio_manager.policy_handler import (
+    handle_bucket_policy,
+    handle_iam_policy,
+    handle_iam_policy_attachments,
+    prefetch_iam_policies,
+)
+from minio_manager.service_account_handler import handle_service_account, service_account_index
+
+HANDLERS = {
+    "buckets": handle_bucket,
+    "bucket_policies": handle_bucket_policy,
+    "service_accounts": handle_service_account,
+    "iam_policies": handle_iam_policy,
+    "iam_policy_attachments": handle_iam_policy_attachments,
+}
+
 
+def handle_resources(resources: ClusterResources, journal: Journal | None = None):
+    """Handle the provided bucket, bucket policies, service accounts, IAM policies, and user policy attachments.
 
-def handle_resources(resources: ClusterResources):
-    """Handle the provided bucket, bucket policies, IAM policies, and user policy attachments, in that order.
+    Resources are handled concurrently, each resource as soon as the resources it depends on have been handled. See
+    ClusterResources.dependencies() for the dependencies between resources.
 
     Args:
         resources: ClusterResources object with all resources
+        journal: records the resources that were handled without errors
+    """
+    counts = [f"{len(getattr(resources, kind))} {kind.replace('_', ' ')}" for kind in RESOURCE_KINDS]
+    logger.info(f"Handling {', '.join(counts)}...")
+    bucket_accounts = [ServiceAccount(bucket.name) for bucket in resources.buckets if bucket.create_service_account]
+    with phase("handling"), service_account_index(), state_cache():
+        secrets.prefetch(resources.service_accounts + bucket_accounts)
+        if settings.concurrency > 1:
+            # Initialise the admin client before the handlers start using it from multiple threads.
+            _ = client_manager.admin
+        prefetch_buckets(resources.buckets)
+        prefetch_iam_policies(resources.iam_policies)
+        ResourceScheduler(resources, HANDLERS, settings.concurrency, journal).run()
+
+
+def handle_resource_stream(stream: Iterator[tuple[str, object | None]]):
+    """Handle resources while they are being parsed, see ClusterResources.stream_resources().
+
+    The service accounts are not known until the whole resources file has been parsed, so the credentials of all
+    entries in the secret backend are prefetched instead.
+
+    Args:
+        stream: the resources being parsed
     """
-    logger.info(f"Handling {len(resources.buckets)} buckets...")
-    for bucket in resources.buckets:
-        handle_bucket(bucket)
-
-    if resources.bucket_policies:
-        logger.info(f"Handling {len(resources.bucket_policies)} bucket policies...")
-        for bucket_policy in resources.bucket_policies:
-            handle_bucket_policy(bucket_policy)
-
-    if resources.service_accounts:
-        logger.info(f"Handling {len(resources.service_accounts)} service accounts...")
-        for service_account in resources.service_accounts:
-            handle_service_account(service_account)
-
-    if resources.iam_policies:
-        logger.info(f"Handling {len(resources.iam_policies)} IAM policies...")
-        for iam_policy in resources.iam_policies:
-            handle_iam_policy(iam_policy)
-
-    if resources.iam_policy_attachments:
-        logger.info(f"Handling {len(resources.iam_policy_attachments)} IAM policy attachments...")
-        for iam_policy_attachment in resources.iam_policy_attachments:
-            handle_iam_policy_attachments(iam_policy_attachment)
+    with phase("streaming"), service_account_index(), state_cache():
+        secrets.prefetch(None)
+        if settings.concurrency > 1:
+            _ = client_manager.admin
+        ResourceScheduler(None, HANDLERS, settings.concurrency).run_stream(stream)
@@ -1,107 +1,242 @@
+import contextvars
 import json
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
 
 from minio.error import MinioAdminException
 
+from minio_manager.classes.capabilities import capabilities
 from minio_manager.classes.client_manager import client_manager
 from minio_manager.classes.errors import MinioMalformedIamPolicyError, raise_specific_error
 from minio_manager.classes.logging_config import logger
-from minio_manager.classes.minio_resources import ServiceAccount
+from minio_manager.classes.minio_resources import Credentials, ServiceAccount
 from minio_manager.classes.secrets import secrets
 from minio_manager.classes.settings import settings
+from minio_manager.classes.state_cache import observed_state
+from minio_manager.policy_evaluator import is_policy_subset
 from minio_manager.utilities import compare_objects
 
 
-def service_account_exists(account: ServiceAccount):
+class ServiceAccountIndex:
+    """
+    ServiceAccountIndex is the name and description of every service account of the controller user in MinIO.
+
+    The service accounts are listed once, when the first service account is not found by its access key, instead of
+    listing them again for every such service account. Service accounts created while reconciling are added with
+    add(), so the index stays accurate for the rest of the run. See service_account_index() for how long it is used.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._accounts: dict[str, tuple[str, str]] | None = None
+
+    def accounts(self) -> dict[str, tuple[str, str]]:
+        """The name and description of every service account, by access key."""
+        with self.lock:
+            if self._accounts is None:
+                self._accounts = {}
+                sa_list = json.loads(client_manager.admin.list_service_account(settings.minio_controller_user))
+                for sa in sa_list.get("accounts") or []:
+                    access_key = sa["accessKey"]
+                    if "name" in sa:
+                        # Only support is recorded: MinIO also leaves out the name of service accounts without one.
+                        capabilities.set("service_account_names", True)
+                        info = sa
+                    elif capabilities.get("service_account_names"):
+                        # MinIO lists the names, so this service account has none and can not be found by name.
+                        continue
+                    else:
+                        # Older MinIO versions only list the access keys.
+                        info = json.loads(client_manager.admin.get_service_account(access_key))
+                    if "name" not in info:
+                        continue
+                    self._accounts[access_key] = info["name"] or "", info.get("description") or ""
+            return self._accounts
+
+    def add(self, account: ServiceAccount, credentials: Credentials):
+        """Add a service account that was created in MinIO."""
+        with self.lock:
+            if self._accounts is not None:
+                self._accounts[credentials.access_key] = account.name, f"{account.full_name} - {account.description}"
+
+    def find(self, account: ServiceAccount) -> bool:
+        """Whether the service account exists in MinIO, see service_account_exists()."""
+        possible_access_key = None
+        for access_key, (sa_name, sa_description) in self.accounts().items():
+            if not sa_name:
+                continue
+            # Easy check for service accounts that are 32 characters or fewer long
+            if account.full_name == sa_name:
+                logger.debug("Found access key '%s' for '%s' in MinIO.", access_key, account.full_name)
+                return True
+
+            # This ensures that the start of the description matches the full name of the account exactly in cases
+            # where the full name is longer than 32 characters.
+            # This program provides a description formatted as "{full_name} - {description}"
+            if sa_description.startswith(f"{account.full_name} - "):
+                logger.debug("Found access key '%s' for '%s' in MinIO.", access_key, account.full_name)
+                return True
+
+            # This is a fallback for when the description does not match the full name exactly
+            if sa_name == account.name and possible_access_key is None:
+                possible_access_key = access_key
+
+        if possible_access_key is not None:
+            logger.error(f"Found possible access key '{possible_access_key}' for '{account.name}' in MinIO.")
+            logger.warning("Please verify and modify the description accordingly.")
+        return False
+
+
+_service_account_index: contextvars.ContextVar[ServiceAccountIndex | None] = contextvars.ContextVar(
+    "minio_manager.service_account_index", default=None
+)
+
+
+@contextmanager
+def service_account_index() -> Iterator[ServiceAccountIndex]:
+    """
+    Use one index of the service accounts in MinIO for everything reconciled inside the block.
+
+    An index that is already in use, e.g. by a batch of groups, is used instead of a new one. Every reconcile of the
+    daemon uses a new index, so that service accounts changed in between are seen.
+    """
+    index = _service_account_index.get()
+    if index is not None:
+        yield index
+        return
+    index = ServiceAccountIndex()
+    token = _service_account_index.set(index)
     try:
-        if account.access_key:
-            client_manager.admin.get_service_account(account.access_key)
+        yield index
+    finally:
+        _service_account_index.reset(token)
+
+
+def read_service_account_policy(access_key: str) -> dict | None:
+    """The current policy of the service account with the given access key."""
+    service_account = json.loads(client_manager.admin.get_service_account(access_key))  # type: dict
+    policy = service_account.get("policy")
+    return json.loads(policy) if policy else None
+
+
+def record_policy(account: ServiceAccount, credentials: Credentials):
+    """Record the policy written to a service account in the state cache."""
+    if account.policy:
+        observed_state().written(
+            ("service_account_policy", credentials.access_key),
+            account.policy,
+            lambda: read_service_account_policy(credentials.access_key),
+        )
+
+
+def service_account_exists(account: ServiceAccount, credentials: Credentials):
+    try:
+        if credentials.access_key:
+            # The policy is compared next, see handle_sa_policy().
+            observed_state().read(
+                ("service_account_policy", credentials.access_key),
+                lambda: read_service_account_policy(credentials.access_key),
+            )
             return True
     except MinioAdminException as mae:
         decoded_error = json.loads(mae._body)
         if decoded_error["Code"] == "XMinioInvalidIAMCredentials":
             # account does not exist in MinIO
             logger.debug(
-                f"Error for {account.access_key}: {decoded_error['Code']}, trying to find it in other service accounts."
+                f"Error for {credentials.access_key}: {decoded_error['Code']}, trying to find it in other service accounts."
             )
         else:
             # another error occurred, raise it
             raise_specific_error(decoded_error["Code"], decoded_error["Message"], caused_by=mae)
 
-    logger.debug(f"Access key for {account.full_name} not found in secret backend, trying to find it in MinIO.")
-    sa_list = json.loads(client_manager.admin.list_service_account(settings.minio_controller_user))  # type: dict
-    for sa in sa_list["accounts"]:
-        access_key = sa["accessKey"]
-        sa_info = json.loads(client_manager.admin.get_service_account(access_key))  # type: dict
-        if "name" not in sa_info:
-            continue
-        sa_name = sa_info.get("name")
-        # Easy check for service accounts that are 32 characters or fewer long
-        if account.full_name == sa_name:
-            logger.debug(f"Found access key '{access_key}' for '{account.full_name}' in MinIO.")
-            return True
+    logger.debug("Access key for %s not found in secret backend, trying to find it in MinIO.", account.full_name)
+    index = _service_account_index.get() or ServiceAccountIndex()
+    return index.find(account)
 
-        sa_description = sa_info.get("description")
-        if not sa_description:
-            logger.debug(f"Service account '{sa_name}' has no description, skipping.")
-            continue
 
-        # This ensures that the start of the description matches the full name of the account exactly in cases where
-        # the full name is longer than 32 characters.
-        # This program provides a description formatted as "{full_name} - {description}"
-        if sa_description.startswith(f"{account.full_name} - "):
-            logger.debug(f"Found access key '{access_key}' for '{account.full_name}' in MinIO.")
-            return True
+def add_to_index(account: ServiceAccount, credentials: Credentials):
+    """Add a service account created in MinIO to the index in use, if any."""
+    index = _service_account_index.get()
+    if index is not None:
+        index.add(account, credentials)
 
-        # This is a fallback for when the description does not match the full name exactly
-        if sa_name == account.name:
-            logger.error(f"Found possible access key '{access_key}' for '{account.name}' in MinIO.")
-            logger.warning("Please verify and modify the description accordingly.")
-            return False
-    return False
 
+def apply_base_policy(account: ServiceAccount, credentials: Credentials):
+    account = account.with_base_policy()
+    observed_state().forget(("service_account_policy", credentials.access_key))
+    client_manager.admin.update_service_account(**account.as_dict(credentials))
+    record_policy(account, credentials)
+
+
+def limit_to_controller_policy(account: ServiceAccount) -> tuple[ServiceAccount, bool]:
+    """
+    Check the policy of a service account against the controller user's policy before applying it.
+
+    MinIO does not accept service account policies with more permissions than the parent user's policy, in which case
+    the base policy is used instead.
 
-def apply_base_policy(account: ServiceAccount):
-    account.generate_service_account_policy()
-    client_manager.admin.update_service_account(**account.as_dict)
+    Args:
+        account (ServiceAccount)
 
+    Returns: the service account with the policy to apply, and whether the policy is known to be accepted by MinIO
+    """
+    is_subset = is_policy_subset(account.policy, client_manager.controller_user_policy)
+    if is_subset is False:
+        logger.warning(
+            f"Policy for service account '{account.full_name}' has more permissions than the controller user's policy, "
+            "using the base policy for service accounts instead."
+        )
+        account = account.with_base_policy()
+        is_subset = is_policy_subset(account.policy, client_manager.controller_user_policy)
+    return account, bool(is_subset)
 
-def handle_sa_policy(account: ServiceAccount):
+
+def handle_sa_policy(account: ServiceAccount, credentials: Credentials, verified: bool = False):
     """
     Manage policies for service accounts.
 
     Compare the desired policy with what is currently applied, and update if needed.
-    Retrieves the updated policy and compares it again. If it does not match, compare to the controller user's policy.
-    If those match, the supplied policy had more permissions than allowed, and we have to revert to the base policy.
+    Unless the policy was verified to be a subset of the controller user's policy, retrieve the updated policy and
+    compare it again. If it does not match, compare to the controller user's policy. If those match, the supplied
+    policy had more permissions than allowed, and we have to revert to the base policy.
 
     Args:
         account (ServiceAccount)
+        credentials (Credentials): the credentials of the existing service account
+        verified (bool): whether the policy is known to be a subset of the controller user's policy
     """
     desired_policy = account.policy
-
-    current_service_account_raw = client_manager.admin.get_service_account(account.access_key)
-    current_service_account = json.loads(current_service_account_raw)  # type: dict
-    current_policy = json.loads(current_service_account.get("policy"))  # type: dict
+    key = ("service_account_policy", credentials.access_key)
+    state = observed_state()
+    current_policy = state.read(key, lambda: read_service_account_policy(credentials.access_key))
 
     policies_diff_pre = compare_objects(current_policy, desired_policy)
     if not policies_diff_pre:
         return
 
-    logger.debug(f"Updating service account policy for '{account.full_name}'.")
+    logger.debug("Updating service account policy for '%s'.", account.full_name)
+    state.forget(key)
     try:
-        client_manager.admin.update_service_account(**account.as_dict)
+        client_manager.admin.update_service_account(**account.as_dict(credentials))
     except MinioMalformedIamPolicyError:
         logger.error(
             f"Policy for service account '{account.full_name}' is malformed, reverting to base policy for service account."
         )
-        apply_base_policy(account)
+        apply_base_policy(account, credentials)
         return
 
-    updated_service_account_raw = client_manager.admin.get_service_account(account.access_key)
-    updated_service_account = json.loads(updated_service_account_raw)  # type: dict
-    updated_policy = json.loads(updated_service_account.get("policy"))  # type: dict
+    if verified:
+        record_policy(account, credentials)
+        logger.debug("Policy for service account '%s' successfully updated.", account.full_name)
+        return
+
+    # MinIO may have applied another policy than the one given, so this can not be trusted like other writes.
+    updated_policy = read_service_account_policy(credentials.access_key)
+    state.set(key, updated_policy)
     policies_diff_post = compare_objects(updated_policy, desired_policy)
     if not policies_diff_post:
-        logger.debug(f"Policy for service account '{account.full_name}' successfully updated.")
+        logger.debug("Policy for service account '%s' successfully updated.", account.full_name)
         return
 
     logger.warning(f"Applying policy for service account '{account.full_name}' failed.")
@@ -116,10 +251,10 @@ def handle_sa_policy(account: ServiceAccount):
         )
 
     logger.warning(f"Reverting to base policy for service account '{account.full_name}'")
-    apply_base_policy(account)
+    apply_base_policy(account, credentials)
 
 
-def handle_service_account(bare_account: ServiceAccount):
+def handle_service_account(account: ServiceAccount):
     """
     Manage service accounts.
 
@@ -129,20 +264,24 @@ def handle_service_account(bare_account: ServiceAccount):
     3) if it exists in MinIO but not the secret backend, throw an error and return
     4) if it exists in the secret backend but not in MinIO, create it using the secret backend credentials
     5) if it does not, create service account in minio and secret backend
-    6) if a policy_file is configured, load it and try to apply it for the service account
+    6) if a policy is configured, try to apply it for the service account
 
     Args:
-        bare_account (ServiceAccount): the service account to manage containing only basic details
+        account (ServiceAccount): the desired state of the service account to manage
     """
+    verified = False
+    if account.policy:
+        account, verified = limit_to_controller_policy(account)
+
     # Determine if access key credentials exists in secret backend
-    credentials = secrets.get_credentials(bare_account)
+    credentials = secrets.get_credentials(account)
     # Determine if access key exists in MinIO
-    sa_exists = service_account_exists(credentials)
+    sa_exists = service_account_exists(account, credentials)
 
     # Scenario 1: service account exists in MinIO but not in secret backend
     if sa_exists and not credentials.access_key:
         logger.error(
-            f"Service account {credentials.full_name} exists in MinIO but not in secret backend! Manual intervention required.\n"
+            f"Service account {account.full_name} exists in MinIO but not in secret backend! Manual intervention required.\n"
             "Either find the credentials elsewhere and add them to the secret backend, or delete the service "
             "account from MinIO and try again."
         )
@@ -151,35 +290,40 @@ def handle_service_account(bare_account: ServiceAccount):
     # Scenario 2: service account exists in secret backend but not in MinIO
     if credentials.secret_key and not sa_exists:
         logger.warning(
-            f"Service account {credentials.full_name} exists in secret backend but not in MinIO. Using existing credentials."
+            f"Service account {account.full_name} exists in secret backend but not in MinIO. Using existing credentials."
         )
         try:
-            client_manager.admin.add_service_account(**credentials.as_dict)
-            logger.info(f"Created service account '{credentials.full_name}' with access key '{credentials.access_key}'")
+            client_manager.admin.add_service_account(**account.as_dict(credentials))
+            logger.info(f"Created service account '{account.full_name}' with access key '{credentials.access_key}'")
         except MinioAdminException as mae:
             decoded_error = json.loads(mae._body)
             if decoded_error["Code"] == "XMinioMalformedIAMPolicy":
-                logger.error(f"Malformed IAM policy for service account '{credentials.full_name}'")
+                logger.error(f"Malformed IAM policy for service account '{account.full_name}'")
                 return
             raise_specific_error(decoded_error["Code"], decoded_error["Message"], caused_by=mae)
         sa_exists = True
-        logger.info(f"Created service account '{credentials.full_name}', access key: {credentials.access_key}")
+        if verified:
+            record_policy(account, credentials)
+        add_to_index(account, credentials)
+        logger.info(f"Created service account '{account.full_name}', access key: {credentials.access_key}")
 
     # Scenario 3: service account does not exist in neither MinIO nor the secret backend
     if not sa_exists and not credentials.access_key:
-        logger.debug(f"Creating service account '{credentials.full_name}'")
+        logger.debug("Creating service account '%s'", account.full_name)
         # TODO: catch scenario where an access key is deleted in MinIO, but MinIO does not accept the creation of a
         #  service account with the same access key, which sometimes happens.
         # Create the service account in MinIO
-        new_service_account_raw = client_manager.admin.add_service_account(**credentials.as_dict)
+        new_service_account_raw = client_manager.admin.add_service_account(**account.as_dict(credentials))
         new_service_account_dict = json.loads(new_service_account_raw)["credentials"]  # type: dict
         credentials.access_key = new_service_account_dict["accessKey"]
         credentials.secret_key = new_service_account_dict["secretKey"]
         # Create credentials in the secret backend
-        secrets.set_password(credentials)
-        logger.info(f"Created service account '{credentials.full_name}' with access key '{credentials.access_key}'")
+        secrets.set_password(account, credentials)
+        add_to_index(account, credentials)
+        if verified:
+            # Otherwise MinIO may have applied another policy, which handle_sa_policy() checks.
+            record_policy(account, credentials)
+        logger.info(f"Created service account '{account.full_name}' with access key '{credentials.access_key}'")
 
-    if credentials.policy_file:
-        handle_sa_policy(credentials)
-        if credentials.policy_generated:
-            credentials.policy_file.unlink(missing_ok=True)
+    if account.policy:
+        handle_sa_policy(account, credentials, verified)
@@ -0,0 +1,155 @@
+"""
+Export the observed state of a MinIO cluster to a snapshot file, so changes can be planned without access to MinIO.
+
+The snapshot is a compact JSON file with everything MinIO Manager compares while reconciling:
+
+    {
+        "version": 1, "endpoint": ..., "exported_at": ..., "controller_policy": {...},
+        "buckets": {name: {"versioning": "Enabled", "lifecycle": "<LifecycleConfiguration>...", "policy": {...}}},
+        "iam_policies": {name: {...}},
+        "service_accounts": {access_key: {"name": ..., "description": ..., "policy": {...}}},
+        "users": {username: [policy names]}
+    }
+
+A bucket without a lifecycle configuration or policy has null for them. A lifecycle configuration minio-py can not read
+is left out, as are the users if the controller user may not list them. Everything is read with as few calls as
+possible: the buckets, IAM policies, service accounts and users are each listed once, after which the details of every
+bucket and service account are read concurrently. See plan.py for planning against a snapshot.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from minio import S3Error
+from minio.error import MinioAdminException
+from minio.lifecycleconfig import LifecycleConfig
+from minio.xml import marshal, unmarshal
+
+from minio_manager.classes.client_manager import client_manager
+from minio_manager.classes.controller_user import controller_user
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.settings import settings
+from minio_manager.policy_handler import read_bucket_policy, read_iam_policy
+from minio_manager.service_account_handler import read_service_account_policy
+from minio_manager.utilities import ContextThreadPoolExecutor
+
+SNAPSHOT_VERSION = 1
+
+
+def lifecycle_to_xml(lifecycle: LifecycleConfig | None) -> str | None:
+    return None if lifecycle is None else marshal(lifecycle).decode()
+
+
+def lifecycle_from_xml(lifecycle: str | None) -> LifecycleConfig | None:
+    return None if lifecycle is None else unmarshal(LifecycleConfig, lifecycle)
+
+
+def export_bucket(name: str) -> dict:
+    """The versioning, lifecycle configuration and policy of a bucket."""
+    bucket = {
+        "versioning": client_manager.s3.get_bucket_versioning(name).status,
+        "policy": read_bucket_policy(name),
+    }
+    try:
+        bucket["lifecycle"] = lifecycle_to_xml(client_manager.s3.get_bucket_lifecycle(name))
+    except ValueError as ve:
+        # minio-py fails on some lifecycle configurations, see check_bucket_lifecycle().
+        logger.warning(f"Unable to read the lifecycle configuration of bucket '{name}': {ve}")
+    return bucket
+
+
+def export_iam_policies(executor: ContextThreadPoolExecutor) -> dict[str, dict]:
+    """The documents of all IAM policies, read one by one if MinIO only lists their names."""
+    listed = json.loads(client_manager.admin.policy_list())
+    if isinstance(listed, dict) and all(isinstance(policy, dict) for policy in listed.values()):
+        return listed
+    names = list(listed)
+    policies = zip(names, executor.map(read_iam_policy, names), strict=True)
+    return {name: policy for name, policy in policies if policy is not None}
+
+
+def export_service_accounts(executor: ContextThreadPoolExecutor) -> dict[str, dict]:
+    """The name, description and policy of the controller user's service accounts, by access key."""
+    sa_list = json.loads(client_manager.admin.list_service_account(settings.minio_controller_user))  # type: dict
+    accounts = [sa for sa in sa_list.get("accounts") or [] if sa["accessKey"] != controller_user.access_key]
+
+    def export_service_account(sa: dict) -> dict:
+        # Older MinIO versions only list the access keys.
+        info = sa if "name" in sa else json.loads(client_manager.admin.get_service_account(sa["accessKey"]))
+        return {
+            "name": info.get("name") or "",
+            "description": info.get("description") or "",
+            "policy": read_service_account_policy(sa["accessKey"]),
+        }
+
+    exported = executor.map(export_service_account, accounts)
+    return {sa["accessKey"]: account for sa, account in zip(accounts, exported, strict=True)}
+
+
+def export_users() -> dict[str, list[str]] | None:
+    """The policies attached to every user, or None if the controller user may not list them."""
+    try:
+        users = json.loads(client_manager.admin.user_list())
+    except MinioAdminException as mae:
+        logger.warning(f"Unable to list users, the snapshot will not contain IAM policy attachments: {mae}")
+        return None
+    return {
+        user: sorted(filter(None, (info.get("policyName") or "").split(","))) for user, info in (users or {}).items()
+    }
+
+
+def export_state(snapshot_file: str):
+    """
+    Export the observed state of the cluster to a snapshot file.
+
+    Args:
+        snapshot_file: the file to write the snapshot to, replaced at once when it is complete
+    """
+    logger.info(f"Exporting the state of cluster '{settings.s3_endpoint}' to {snapshot_file}...")
+    start = time.perf_counter()
+    try:
+        with ContextThreadPoolExecutor(max_workers=settings.concurrency, thread_name_prefix="export") as executor:
+            names = sorted(bucket.name for bucket in client_manager.s3.list_buckets())
+            buckets = dict(zip(names, executor.map(export_bucket, names), strict=True))
+            snapshot = {
+                "version": SNAPSHOT_VERSION,
+                "endpoint": settings.s3_endpoint,
+                "exported_at": time.time(),
+                "controller_policy": client_manager.controller_user_policy,
+                "buckets": buckets,
+                "iam_policies": export_iam_policies(executor),
+                "service_accounts": export_service_accounts(executor),
+                "users": export_users(),
+            }
+    except (S3Error, MinioAdminException) as e:
+        logger.critical(f"Unable to export the state of cluster '{settings.s3_endpoint}': {e}")
+        sys.exit(200)
+
+    path = Path(snapshot_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".tmp", delete=False, encoding="utf-8") as f:
+        json.dump(snapshot, f, separators=(",", ":"), sort_keys=True)
+    os.replace(f.name, path)
+    logger.info(
+        f"Exported {len(buckets)} buckets, {len(snapshot['iam_policies'])} IAM policies and "
+        f"{len(snapshot['service_accounts'])} service accounts in {time.perf_counter() - start:.2f} seconds."
+    )
+
+
+def read_snapshot(snapshot_file: str) -> dict:
+    """Read a snapshot file written by export_state()."""
+    try:
+        snapshot = json.loads(Path(snapshot_file).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logger.critical(f"Unable to read snapshot file {snapshot_file}: {e}")
+        sys.exit(201)
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        logger.critical(f"Snapshot file {snapshot_file} is not a version {SNAPSHOT_VERSION} snapshot, export it again.")
+        sys.exit(202)
+    return snapshot
@@ -1,19 +1,113 @@
+import contextvars
 import json
+import threading
 import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import yaml
 from deepdiff import DeepDiff
 
-error_count = 0
+from minio_manager.classes.lazy_singleton import LazySingleton
+
 start_time = time.time()
 
 
+class ErrorCounter:
+    """ErrorCounter counts the errors logged while reconciling, from all threads and per thread."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._thread = threading.local()
+
+    def increment(self):
+        with self._lock:
+            self.count += 1
+        self._thread.count = self.thread_count + 1
+
+    @property
+    def thread_count(self) -> int:
+        """The number of errors counted from the current thread."""
+        return getattr(self._thread, "count", 0)
+
+
+# Every reconciler counts its own errors, see LazySingleton.lazy_scoped().
+error_counter = LazySingleton("error_counter", ErrorCounter)  # type: ErrorCounter
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    ContextThreadPoolExecutor runs every function in a copy of the context it was submitted from.
+
+    The settings, clients and secret backend depend on the context, see LazySingleton.lazy_use(), and threads do not
+    inherit it.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def start_thread(target, *args, name: str) -> threading.Thread:
+    """Start a daemon thread running target in a copy of the current context, see ContextThreadPoolExecutor."""
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(target, *args), name=name, daemon=True)
+    thread.start()
+    return thread
+
+
 def read_yaml(file: str | Path) -> dict:
     with open(file) as f:
         return yaml.safe_load(f)
 
 
+def iter_yaml_sections(file: str | Path) -> Iterator[tuple[str, Iterator]]:
+    """
+    Read a YAML file containing a mapping of lists, yielding every key with an iterator over the items of its list.
+
+    Items are read from the file one at a time, so they can be used before the rest of the file has been read. Like
+    itertools.groupby(), every item iterator must be used before moving on to the next key. Null values have no items.
+
+    Args:
+        file: the YAML file
+
+    Raises: ValueError if the file does not contain a mapping, and TypeError from an item iterator if the value is not a
+        list
+    """
+    with open(file) as f:
+        loader = yaml.SafeLoader(f)
+        try:
+            loader.get_event()
+            if loader.check_event(yaml.StreamEndEvent):
+                return
+            loader.get_event()
+            if not loader.check_event(yaml.MappingStartEvent):
+                if loader.construct_document(loader.compose_node(None, None)) is None:
+                    return
+                raise ValueError(f"{file} must contain a YAML mapping.")
+            loader.get_event()
+            while not loader.check_event(yaml.MappingEndEvent):
+                key = loader.construct_document(loader.compose_node(None, None))
+                items = _iter_yaml_items(loader)
+                yield key, items
+                # Skip the items the caller did not use.
+                for _ in items:
+                    pass
+        finally:
+            loader.dispose()
+
+
+def _iter_yaml_items(loader: yaml.SafeLoader) -> Iterator:
+    if not loader.check_event(yaml.SequenceStartEvent):
+        if loader.construct_document(loader.compose_node(None, None)) is not None:
+            raise TypeError("Expected a list")
+        return
+    loader.get_event()
+    while not loader.check_event(yaml.SequenceEndEvent):
+        yield loader.construct_document(loader.compose_node(None, None))
+    loader.get_event()
+
+
 def read_json(file) -> dict:
     with open(file) as f:
         return json.load(f)
@@ -28,9 +122,17 @@ def compare_objects(a: dict, b: dict, ignore_order: bool = True) -> bool | dict:
 
 
 def increment_error_count():
-    global error_count
-    error_count += 1
+    error_counter.increment()
 
 
 def get_error_count():
-    return error_count
+    return error_counter.count
+
+
+def get_thread_error_count():
+    """The number of errors logged by the current thread, used to detect which resource failed."""
+    return error_counter.thread_count
+
+
+def reset_error_count():
+    error_counter.count = 0
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Callable, Iterator
+
+import pytest
+
+from minio_manager.classes.logging_config import logger
+from minio_manager.classes.settings import Settings, settings
+from minio_manager.utilities import error_counter
+
+REQUIRED_SETTINGS = {
+    "cluster_name": "test",
+    "s3_endpoint": "minio.example.com",
+    "minio_controller_user": "minio-manager",
+    "secret_backend_type": "yaml",
+    "secret_backend_s3_access_key": "unused",
+    "secret_backend_s3_secret_key": "unused",
+}
+
+
+@pytest.fixture
+def use_settings(tmp_path, monkeypatch) -> Iterator[Callable[..., Settings]]:
+    """
+    Use settings built from the given values in the test, instead of the environment and command line.
+
+    Every call replaces the settings, and gives the test a fresh logger and error count. Tests run in tmp_path.
+    """
+    monkeypatch.chdir(tmp_path)
+    for name in list(os.environ):
+        if name.startswith("MINIO_MANAGER_"):
+            monkeypatch.delenv(name)
+
+    def use(**values) -> Settings:
+        test_settings = Settings(**{**REQUIRED_SETTINGS, **values}, _env_file=None)
+        settings.lazy_use(settings.lazy_scoped(lambda: test_settings))
+        logger.lazy_use(logger.lazy_scoped())
+        error_counter.lazy_use(error_counter.lazy_scoped())
+        return test_settings
+
+    use()
+    yield use
+    if logger.lazy_initialized:
+        logger.close()
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+from minio import crypto, minioadmin
+from urllib3 import HTTPResponse
+
+from minio_manager.classes import admin_crypto
+
+PAYLOAD = b'{"policy": null, "accessKey": "access-key", "secretKey": "secret-key"}'
+SECRET_KEY = "controller-secret"  # noqa: S105, not a real secret
+
+
+@pytest.fixture
+def process_pool():
+    """Encrypt and decrypt admin API payloads in a process pool, and in the calling thread again after the test."""
+    executor = admin_crypto.start_process_pool(1)
+    yield executor
+    admin_crypto.set_executor(None)
+    executor.shutdown()
+
+
+def response(data: bytes) -> HTTPResponse:
+    return HTTPResponse(body=io.BytesIO(data), preload_content=False)
+
+
+def test_payloads_round_trip_through_the_process_pool(process_pool):
+    assert minioadmin.encrypt is admin_crypto.encrypt
+    assert minioadmin.decrypt is admin_crypto.decrypt
+
+    encrypted = minioadmin.encrypt(PAYLOAD, SECRET_KEY)
+    assert crypto.decrypt(response(encrypted), SECRET_KEY) == PAYLOAD
+
+    encrypted_response = response(crypto.encrypt(PAYLOAD, SECRET_KEY))
+    assert minioadmin.decrypt(encrypted_response, SECRET_KEY) == PAYLOAD
+    # The response is read in the calling thread, which releases it before the worker decrypts it.
+    assert encrypted_response.closed
+
+
+def test_process_pool_is_shared(process_pool):
+    assert admin_crypto.start_process_pool(2) is process_pool
+
+
+def test_payloads_are_encrypted_in_the_calling_thread_without_executor():
+    admin_crypto.set_executor(None)
+    encrypted = admin_crypto.encrypt(PAYLOAD, SECRET_KEY)
+    assert admin_crypto.decrypt(response(encrypted), SECRET_KEY) == PAYLOAD
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import pytest
+
+from minio_manager import batch, orphan_handler
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import logging_config, settings
+from minio_manager.classes.minio_resources import Bucket
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.classes.state_cache import observed_state
+from minio_manager.service_account_handler import service_account_index
+from minio_manager.utilities import get_error_count
+
+
+@pytest.fixture
+def groups(use_settings, tmp_path):
+    """Three groups, one of them a directory, and the orphans handled after them."""
+    (tmp_path / "team-a").mkdir()
+    for file in ("team-a/resources.yaml", "team-b.yaml", "team-c.yaml"):
+        (tmp_path / file).touch()
+    use_settings(orphans="report", journal_file="run.journal")
+    return "team-a", "team-b.yaml", "team-c.yaml"
+
+
+class FakeReconcile:
+    """Reconciles a group by recording what it was reconciled with, failing for some groups."""
+
+    def __init__(self, errors: dict[str, int | None]):
+        self.errors = errors
+        self.reconciled = {}
+        self.shared = set()
+
+    def __call__(self) -> ClusterResources:
+        name = settings.settings.cluster_resources_file.split("/")[0].removesuffix(".yaml")
+        self.reconciled[name] = settings.settings.journal_file, get_error_count()
+        with service_account_index() as index:
+            self.shared.add((id(observed_state()), id(index)))
+        if name in self.errors:
+            if self.errors[name] is None:
+                logging_config.logger.error(f"Failed to reconcile a resource of {name}")
+            else:
+                raise SystemExit(self.errors[name])
+        resources = ClusterResources()
+        resources.buckets = [Bucket(name, create_service_account=False)]
+        return resources
+
+
+def use_reconcile(monkeypatch, errors: dict[str, int | None]) -> tuple[FakeReconcile, list[ClusterResources]]:
+    reconcile = FakeReconcile(errors)
+    monkeypatch.setattr(batch.app, "reconcile", reconcile)
+    orphans = []
+    monkeypatch.setattr(orphan_handler, "handle_orphans", orphans.append)
+    return reconcile, orphans
+
+
+def test_groups_are_reconciled_one_by_one(groups, monkeypatch):
+    reconcile, orphans = use_reconcile(monkeypatch, {"team-b": None, "team-c": None})
+    assert batch.reconcile_groups(groups) == 1
+    # Every group has its own settings and error count, and they share the observed states and service accounts.
+    assert reconcile.reconciled == {
+        "team-a": ("run-team-a.journal", 0),
+        "team-b": ("run-team-b.journal", 0),
+        "team-c": ("run-team-c.journal", 0),
+    }
+    assert len(reconcile.shared) == 1
+    # Orphaned resources are handled once, against the resources of all groups.
+    [declared] = orphans
+    assert [bucket.name for bucket in declared.buckets] == ["team-a", "team-b", "team-c"]
+
+
+def test_groups_that_can_not_be_parsed_skip_orphans(groups, monkeypatch):
+    _, orphans = use_reconcile(monkeypatch, {"team-b": 172})
+    assert batch.reconcile_groups(groups) == 172
+    assert orphans == []
+
+
+def test_groups_must_have_unique_names(groups, tmp_path):
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "team-b.yaml").touch()
+    with pytest.raises(SystemExit):
+        batch.read_groups(("team-b.yaml", "other/team-b.yaml"))
+    assert batch.read_groups(("team-a", "team-b.yaml")) == {
+        "team-a": "team-a/resources.yaml",
+        "team-b": "team-b.yaml",
+    }
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+
+import pytest
+
+from minio_manager import bootstrap
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import client_manager
+from minio_manager.classes.lazy_singleton import LazySingleton
+from minio_manager.utilities import ContextThreadPoolExecutor
+
+
+class Created:
+    """Counts how often it was created, slowly, from any thread."""
+
+    count = 0
+    lock = threading.Lock()
+
+    def __init__(self):
+        time.sleep(0.05)
+        with self.lock:
+            Created.count += 1
+        self.number = Created.count
+
+
+@pytest.fixture
+def created(monkeypatch):
+    monkeypatch.setattr(Created, "count", 0)
+
+
+def test_objects_are_created_once(created):
+    singleton = LazySingleton("created", Created)
+    with ContextThreadPoolExecutor(4) as executor:
+        numbers = set(executor.map(lambda _: singleton.number, range(8)))
+    assert numbers == {1}
+
+
+def test_background_failures_are_raised_on_use():
+    def fail():
+        raise SystemExit(23)
+
+    singleton = LazySingleton("failing", fail)
+    singleton.lazy_start().join()
+    assert not singleton.lazy_initialized
+    with pytest.raises(SystemExit) as exit_info:
+        singleton.lazy_get()
+    assert exit_info.value.code == 23
+
+
+def test_contexts_use_their_own_objects(created):
+    singleton = LazySingleton("created", Created)
+    assert singleton.number == 1
+
+    def scoped() -> int:
+        singleton.lazy_use(singleton.lazy_scoped())
+        return singleton.number
+
+    assert contextvars.copy_context().run(scoped) == 2
+    assert singleton.number == 1
+
+
+def test_startup_waits_for_the_clients(use_settings, created, monkeypatch):
+    monkeypatch.setattr(bootstrap, "warm_up", lambda: None)
+    client_manager.client_manager.lazy_use(client_manager.client_manager.lazy_scoped(Created))
+    bootstrap.start()
+    # The clients are created in the background while the main thread goes on.
+    assert Created.count == 0
+    bootstrap.wait()
+    assert client_manager.client_manager.lazy_initialized
+    assert Created.count == 1
+
+
+def test_startup_exits_if_creating_the_clients_failed(use_settings, monkeypatch):
+    def fail():
+        raise SystemExit(22)
+
+    monkeypatch.setattr(bootstrap, "warm_up", lambda: None)
+    client_manager.client_manager.lazy_use(client_manager.client_manager.lazy_scoped(fail))
+    bootstrap.start()
+    with pytest.raises(SystemExit) as exit_info:
+        bootstrap.wait()
+    assert exit_info.value.code == 22
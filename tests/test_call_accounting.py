@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+import pytest
+from minio import Minio
+from minio.versioningconfig import SUSPENDED, VersioningConfig
+
+from benchmarks.call_budgets import check_budgets
+from minio_manager import bucket_handler
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import call_accounting, client_manager
+from minio_manager.classes.cassette import CASSETTE_VERSION, ReplayPoolManager
+from minio_manager.classes.minio_resources import Bucket
+from minio_manager.classes.profiler import current_resource
+
+
+def versioning(status: str) -> dict:
+    body = f"<VersioningConfiguration><Status>{status}</Status></VersioningConfiguration>"
+    return {"headers": {"Content-Type": "application/xml"}, "body": body}
+
+
+CALLS = [
+    {"method": "GET", "path": "/bucket-a", **versioning("Enabled")},
+    {"method": "PUT", "path": "/bucket-a", "headers": {}, "body": ""},
+    {"method": "GET", "path": "/bucket-b", **versioning("Suspended")},
+]
+
+
+@pytest.fixture
+def accounting(use_settings, tmp_path) -> call_accounting.CallAccounting:
+    """Count the calls of an S3 client replaying the versioning of two buckets, see ReplayPoolManager."""
+    use_settings(call_accounting_file="calls.json")
+    cassette = tmp_path / "cassette.jsonl"
+    lines = [{"version": CASSETTE_VERSION, "endpoint": "minio.example.com"}]
+    lines += [{**call, "query": "versioning=", "status": 200, "elapsed_ms": 0} for call in CALLS]
+    cassette.write_text("".join(json.dumps(line) + "\n" for line in lines))
+
+    accounting = call_accounting.CallAccounting()
+    call_accounting.call_accounting.lazy_use(call_accounting.call_accounting.lazy_scoped(lambda: accounting))
+    pool = call_accounting.accounting_pool_manager(ReplayPoolManager)(str(cassette), 0)
+    s3 = Minio("minio.example.com", "access-key", "secret-key", region="us-east-1", http_client=pool)
+    clients = SimpleNamespace(s3=s3)
+    client_manager.client_manager.lazy_use(client_manager.client_manager.lazy_scoped(lambda: clients))
+    return accounting
+
+
+def handle(bucket: Bucket):
+    token = current_resource.set(f"bucket '{bucket.name}'")
+    try:
+        bucket_handler.configure_versioning(bucket)
+    finally:
+        current_resource.reset(token)
+
+
+def test_calls_are_counted_per_resource_and_handler(accounting, tmp_path):
+    handle(Bucket("bucket-a", False, VersioningConfig(SUSPENDED)))
+    handle(Bucket("bucket-b", False, VersioningConfig(SUSPENDED)))
+    resources = accounting.resources()
+    # The versioning is read through the state cache, by a lambda of the handler.
+    assert resources["bucket 'bucket-a'"] == {
+        "reads": 1,
+        "writes": 1,
+        "handlers": {
+            "bucket_handler.configure_versioning": {"reads": 0, "writes": 1},
+            "bucket_handler.configure_versioning.<locals>.<lambda>": {"reads": 1, "writes": 0},
+        },
+    }
+    assert resources["bucket 'bucket-b'"]["reads"] == 1
+
+    summary = accounting.summarise(resources)
+    assert set(summary) == {"changed bucket", "unchanged bucket"}
+    assert summary["unchanged bucket"] == {"resources": 1, "reads": 1, "writes": 0, "max_reads": 1, "max_writes": 0}
+
+    accounting.report()
+    assert json.loads((tmp_path / "calls.json").read_text()) == {"summary": summary, "resources": resources}
+
+
+def test_budgets_are_checked(accounting):
+    handle(Bucket("bucket-b", False, VersioningConfig(SUSPENDED)))
+    summary = accounting.summarise(accounting.resources())
+    assert check_budgets("no-change", summary) == []
+    # No resource may be changed without changes to make, nor may take more calls than it needs.
+    handle(Bucket("bucket-a", False, VersioningConfig(SUSPENDED)))
+    summary = accounting.summarise(accounting.resources())
+    assert check_budgets("no-change", summary) == ["changed bucket: 1 resources, expected none"]
+    summary["changed bucket"]["max_writes"] = 5
+    assert check_budgets("cold", summary) == [
+        "changed bucket: at most 1 reads and 5 writes per resource, budget 2 reads and 4 writes",
+        "unchanged bucket: 1 resources, expected none",
+    ]
+    assert check_budgets("drift", summary) == []
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from minio import S3Error
+
+from minio_manager import bucket_handler
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import capabilities, client_manager
+from minio_manager.classes.minio_resources import Bucket
+from minio_manager.service_account_handler import ServiceAccountIndex
+
+
+class FakeAdmin:
+    """The admin API calls used to detect capabilities, counting them."""
+
+    def __init__(self):
+        self.version = "2024-01-01T00:00:00Z"
+        self.accounts = [{"accessKey": "key-a", "name": "team-a", "description": ""}, {"accessKey": "key-b"}]
+        self.calls: list[str] = []
+
+    def info(self) -> str:
+        self.calls.append("info")
+        return json.dumps({"servers": [{"version": self.version}, {"version": self.version}]})
+
+    def list_service_account(self, user: str) -> str:
+        self.calls.append("list_service_account")
+        return json.dumps({"accounts": self.accounts})
+
+    def get_service_account(self, access_key: str) -> str:
+        self.calls.append("get_service_account")
+        return json.dumps({"name": access_key.replace("key", "team"), "description": ""})
+
+
+@pytest.fixture
+def admin(use_settings) -> FakeAdmin:
+    """Detect capabilities of a fake MinIO server, remembering them in a capabilities file."""
+    use_settings(capabilities_file="capabilities.json")
+    fake = FakeAdmin()
+    clients = SimpleNamespace(admin=fake)
+    client_manager.client_manager.lazy_use(client_manager.client_manager.lazy_scoped(lambda: clients))
+    return fake
+
+
+def new_run() -> capabilities.Capabilities:
+    """The capabilities as a new run sees them."""
+    run = capabilities.Capabilities()
+    capabilities.capabilities.lazy_use(capabilities.capabilities.lazy_scoped(lambda: run))
+    return run
+
+
+def test_capabilities_are_remembered(admin, tmp_path):
+    first = new_run()
+    first.set("list_buckets", False)
+    first.set("bulk_policy_list", True)
+    first.save()
+    assert new_run().known == {"list_buckets": False, "bulk_policy_list": True}
+
+    # Runs against other endpoints keep the capabilities of this one.
+    (tmp_path / "capabilities.json").write_text(
+        json.dumps({**json.loads((tmp_path / "capabilities.json").read_text()), "other.example.com": {}})
+    )
+    second = new_run()
+    second.set("lifecycle_get", True)
+    second.save()
+    assert set(json.loads((tmp_path / "capabilities.json").read_text())) == {"minio.example.com", "other.example.com"}
+
+
+def test_unchanged_capabilities_are_not_saved(admin, tmp_path):
+    run = new_run()
+    run.save()
+    assert not (tmp_path / "capabilities.json").exists()
+
+
+@pytest.mark.parametrize("change", ["expired", "upgraded", "corrupt"])
+def test_capabilities_are_detected_again(admin, tmp_path, change):
+    run = new_run()
+    run.set("list_buckets", False)
+    run.save()
+    path = tmp_path / "capabilities.json"
+    if change == "expired":
+        entries = json.loads(path.read_text())
+        entries["minio.example.com"]["detected_at"] = time.time() - 86401
+        path.write_text(json.dumps(entries))
+    elif change == "upgraded":
+        admin.version = "2025-01-01T00:00:00Z"
+    else:
+        path.write_text("{")
+    assert new_run().known == {}
+
+
+def test_unsupported_bulk_calls_are_not_tried_again(admin):
+    run = new_run()
+    calls = []
+
+    def list_buckets():
+        calls.append("list_buckets")
+        raise S3Error(None, "AccessDenied", "Access Denied", None, None, None)
+
+    client_manager.client_manager.lazy_get().s3 = SimpleNamespace(list_buckets=list_buckets)
+    buckets = [Bucket("bucket-a", False), Bucket("bucket-b", False)]
+    bucket_handler.prefetch_buckets(buckets)
+    bucket_handler.prefetch_buckets(buckets)
+    assert calls == ["list_buckets"]
+    assert run.get("list_buckets") is False
+
+
+@pytest.mark.parametrize("names", [True, False])
+def test_service_account_names(admin, names):
+    run = new_run()
+    if not names:
+        # Older MinIO versions only list the access keys, which are then read one by one.
+        admin.accounts = [{"accessKey": "key-a"}, {"accessKey": "key-b"}]
+    accounts = ServiceAccountIndex().accounts()
+    if names:
+        # Service accounts listed without a name have none.
+        assert accounts == {"key-a": ("team-a", "")}
+        assert run.get("service_account_names") is True
+    else:
+        assert accounts == {"key-a": ("team-a", ""), "key-b": ("team-b", "")}
+        assert admin.calls.count("get_service_account") == 2
+        assert run.get("service_account_names") is None
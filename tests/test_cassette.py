@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import urllib3
+from minio import crypto
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import controller_user
+from minio_manager.classes.cassette import RecordingPoolManager, ReplayPoolManager
+
+RECORDING_SECRET_KEY = "recordingControllerKey"  # noqa: S105, not a real secret
+REPLAYING_SECRET_KEY = "replayingControllerKey"  # noqa: S105, not a real secret
+SERVICE_ACCOUNT_SECRET = "serviceAccountSecretKey"  # noqa: S105, not a real secret
+SERVICE_ACCOUNT = json.dumps({"accessKey": "key-a", "secretKey": SERVICE_ACCOUNT_SECRET}).encode()
+VERSIONING = b"<VersioningConfiguration><Status>Enabled</Status></VersioningConfiguration>"
+SECRETS_FILE = f"team-a:\n  secret_key: {SERVICE_ACCOUNT_SECRET}\n".encode()
+
+
+class MinioHandler(BaseHTTPRequestHandler):
+    """Answers a bucket, admin API and secret backend request like MinIO, with the versioning changing once."""
+
+    versioning_calls = 0
+
+    def do_GET(self):
+        if self.path.startswith("/minio/admin/"):
+            body, content_type = crypto.encrypt(SERVICE_ACCOUNT, RECORDING_SECRET_KEY), "application/octet-stream"
+        elif self.path.startswith("/minio-manager-secrets/"):
+            body, content_type = SECRETS_FILE, "application/octet-stream"
+        else:
+            MinioHandler.versioning_calls += 1
+            status = b"Enabled" if MinioHandler.versioning_calls == 1 else b"Suspended"
+            body, content_type = VERSIONING.replace(b"Enabled", status), "application/xml"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # noqa: A002, overrides BaseHTTPRequestHandler
+        pass
+
+
+@pytest.fixture
+def minio_url(monkeypatch):
+    monkeypatch.setattr(MinioHandler, "versioning_calls", 0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MinioHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def use_controller_secret_key(secret_key: str):
+    user = SimpleNamespace(secret_key=secret_key)
+    controller_user.controller_user.lazy_use(controller_user.controller_user.lazy_scoped(lambda: user))
+
+
+REQUESTS = [
+    "/my-bucket?versioning",
+    "/my-bucket?versioning",
+    "/minio/admin/v3/info-service-account?accessKey=key-a",
+    "/minio-manager-secrets/secrets.yaml",
+]
+
+
+@pytest.fixture
+def cassette(use_settings, tmp_path, minio_url) -> str:
+    """A cassette of the requests, recorded against the local MinIO stand-in."""
+    use_controller_secret_key(RECORDING_SECRET_KEY)
+    recorder = RecordingPoolManager(str(tmp_path / "cassette.jsonl"))
+    for path in REQUESTS:
+        # Callers still get the original responses.
+        assert recorder.request("GET", minio_url + path).status == 200
+    recorder.report()
+    return str(tmp_path / "cassette.jsonl")
+
+
+def test_secrets_are_not_recorded(cassette):
+    content = Path(cassette).read_text()
+    assert SERVICE_ACCOUNT_SECRET not in content
+    header, *entries = (json.loads(line) for line in content.splitlines())
+    assert header["endpoint"] == "minio.example.com"
+    assert [(entry["path"], entry["query"]) for entry in entries] == [
+        ("/my-bucket", "versioning="),
+        ("/my-bucket", "versioning="),
+        ("/minio/admin/v3/info-service-account", "accessKey=key-a"),
+        ("/minio-manager-secrets/secrets.yaml", ""),
+    ]
+    # The admin API response is recorded decrypted, with its secrets masked.
+    assert entries[2]["encrypted"]
+    assert json.loads(entries[2]["body"]) == {"accessKey": "key-a", "secretKey": "************"}
+    assert entries[3]["omitted"]
+    assert entries[3]["body"] == ""
+
+
+def test_cassettes_are_replayed(cassette):
+    use_controller_secret_key(REPLAYING_SECRET_KEY)
+    replay = ReplayPoolManager(cassette, latency_scale=0)
+    url = "https://minio.example.com"
+    versioning = [replay.request("GET", url + "/my-bucket?versioning").data for _ in range(3)]
+    # Responses are replayed in the recorded order, the last one being repeated.
+    assert versioning == [VERSIONING, VERSIONING.replace(b"Enabled", b"Suspended"), versioning[1]]
+
+    # The admin API response is encrypted with the secret key of the replaying controller user.
+    response = replay.request(
+        "GET", url + "/minio/admin/v3/info-service-account?accessKey=key-a", preload_content=False
+    )
+    decrypted = crypto.decrypt(response, REPLAYING_SECRET_KEY)
+    assert json.loads(decrypted) == {"accessKey": "key-a", "secretKey": "************"}
+
+    with pytest.raises(urllib3.exceptions.HTTPError, match="was not recorded"):
+        replay.request("GET", url + "/my-bucket?lifecycle")
+    assert replay.missing == {"GET /my-bucket": 1}
+    assert replay.replayed["GET /my-bucket"] == 3
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import client_manager, controller_user
+from minio_manager.utilities import ContextThreadPoolExecutor
+
+POLICY = {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": "admin:*"}]}
+
+
+class SlowAdmin:
+    """An admin client that is slow to return the controller user, counting how many are created."""
+
+    created = 0
+    lock = threading.Lock()
+
+    def __init__(self, **kwargs):
+        with self.lock:
+            SlowAdmin.created += 1
+
+    def get_service_account(self, access_key: str) -> str:
+        time.sleep(0.05)
+        return json.dumps({"policy": json.dumps(POLICY)})
+
+
+def test_admin_client_is_published_with_the_controller_user_policy(use_settings, monkeypatch):
+    user = SimpleNamespace(access_key="controller-key", secret_key="controller-secret")  # noqa: S106
+    controller_user.controller_user.lazy_use(controller_user.controller_user.lazy_scoped(lambda: user))
+    monkeypatch.setattr(client_manager, "MinioAdmin", SlowAdmin)
+    monkeypatch.setattr(SlowAdmin, "created", 0)
+    clients = client_manager.ClientManager()
+
+    with ContextThreadPoolExecutor(8) as executor:
+        policies = list(executor.map(lambda _: clients.controller_user_policy, range(8)))
+    assert policies == [POLICY] * 8
+    assert SlowAdmin.created == 1
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import math
+from pathlib import Path
+
+import pytest
+
+from minio_manager import daemon
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.utilities import get_error_count
+
+VALID = "buckets:\n  - name: bucket-a\n    create_service_account: False\n"
+DUPLICATE = VALID + "  - name: bucket-a\n    create_service_account: False\n"
+
+
+@pytest.fixture
+def handled(use_settings, monkeypatch) -> list[ClusterResources]:
+    """The resources the daemon handled; nothing is sent to MinIO or saved."""
+    use_settings(cluster_resources_file="resources.yaml", daemon_poll_interval=0.01)
+    handled = []
+    monkeypatch.setattr(daemon, "handle_resources", handled.append)
+    monkeypatch.setattr(daemon.Daemon, "save", staticmethod(lambda: None))
+    return handled
+
+
+@pytest.fixture
+def minio_daemon(handled):
+    minio_daemon = daemon.Daemon()
+    yield minio_daemon
+    minio_daemon.watcher.close()
+
+
+@pytest.mark.parametrize("contents", [None, "buckets: [", DUPLICATE], ids=["missing", "unreadable", "invalid"])
+def test_broken_resources_file_is_retried_once_changed(minio_daemon, handled, contents):
+    if contents is not None:
+        Path("resources.yaml").write_text(contents)
+    minio_daemon.reconcile(full=True)
+    assert handled == []
+    # The full reconcile is still pending, but is not tried again right away.
+    assert minio_daemon.full_pending
+    assert minio_daemon.last_full_reconcile > -math.inf
+    assert Path("resources.yaml").absolute() in minio_daemon.watcher.files
+
+    Path("resources.yaml").write_text(VALID)
+    assert minio_daemon.wait(5) == {Path("resources.yaml").absolute()}
+    minio_daemon.reconcile(full=minio_daemon.full_pending)
+    assert [len(resources) for resources in handled] == [1]
+    assert not minio_daemon.full_pending
+
+
+def test_unchanged_resources_are_not_reconciled(minio_daemon, handled):
+    Path("resources.yaml").write_text(VALID)
+    minio_daemon.reconcile(full=True)
+    minio_daemon.reconcile(full=False)
+    assert len(handled) == 1
+
+
+def test_unexpected_errors_do_not_stop_the_daemon(minio_daemon, monkeypatch):
+    def fail(resources):
+        raise RuntimeError("unexpected")
+
+    monkeypatch.setattr(daemon, "handle_resources", fail)
+    Path("resources.yaml").write_text(VALID)
+    minio_daemon.reconcile(full=True)
+    assert get_error_count() == 1
+    assert not minio_daemon.full_pending
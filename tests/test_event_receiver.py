@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import json
+import time
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import secrets
+from minio_manager.classes.event_receiver import DriftIndex, EventReceiver
+from minio_manager.classes.minio_resources import (
+    Bucket,
+    BucketPolicy,
+    Credentials,
+    IamPolicy,
+    IamPolicyAttachment,
+    ServiceAccount,
+)
+from minio_manager.classes.resource_parser import ClusterResources
+
+CONTROLLER_ACCESS_KEY = "controller-key"
+TOKEN = "webhook-token"  # noqa: S105, not a real secret
+
+
+def audit_entry(access_key: str, api: dict | None = None, path: str = "", query: dict | None = None) -> dict:
+    return {"accessKey": access_key, "api": api or {}, "requestPath": path, "requestQuery": query or {}}
+
+
+def notification(event_name: str, bucket: str, principal: str = "someone") -> dict:
+    record = {"eventName": event_name, "userIdentity": {"principalId": principal}, "s3": {"bucket": {"name": bucket}}}
+    return {"Records": [record]}
+
+
+@pytest.fixture
+def receiver(use_settings):
+    receiver = EventReceiver("127.0.0.1:0", TOKEN, CONTROLLER_ACCESS_KEY)
+    yield receiver
+    receiver.close()
+
+
+def post(receiver: EventReceiver, body: bytes, token: str | None = TOKEN) -> int:
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    request = urllib.request.Request(f"http://{receiver.address}/", data=body, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:  # noqa: S310, a local test server
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_webhooks_are_reduced_to_the_targets_they_changed(receiver):
+    events = [
+        audit_entry("someone", {"name": "PutBucketPolicy", "bucket": "team-a"}),
+        audit_entry("someone", {"name": "GetBucketPolicy", "bucket": "team-b"}),
+        audit_entry("someone", {"name": "PutObject", "bucket": "team-b"}),
+        audit_entry("someone", path="/minio/admin/v3/add-canned-policy", query={"name": "team-read"}),
+        audit_entry("someone", path="/minio/admin/v3/set-user-or-group-policy", query={"userOrGroup": "user-a"}),
+        audit_entry("someone", path="/minio/admin/v3/delete-service-account", query={"accessKey": "key-a"}),
+        audit_entry("someone", path="/minio/admin/v3/list-service-accounts", query={"user": "user-a"}),
+        # Changes made by MinIO Manager itself are not drift.
+        audit_entry(CONTROLLER_ACCESS_KEY, {"name": "PutBucketVersioning", "bucket": "team-c"}),
+        notification("s3:BucketCreated:Put", "team-d"),
+        notification("s3:ObjectCreated:Put", "team-e"),
+        notification("s3:BucketRemoved:Delete", "team-f", principal=CONTROLLER_ACCESS_KEY),
+    ]
+    # MinIO batches audit log entries as one JSON object per line.
+    assert post(receiver, "\n".join(json.dumps(event) for event in events).encode()) == 200
+    assert receiver.take(0) == {
+        ("bucket", "team-a"),
+        ("iam_policy", "team-read"),
+        ("user", "user-a"),
+        ("access_key", "key-a"),
+        ("bucket", "team-d"),
+    }
+    assert receiver.take(0) == set()
+
+
+@pytest.mark.parametrize(("token", "body", "status"), [(None, b"{}", 401), ("wrong", b"{}", 401), (TOKEN, b"{", 400)])
+def test_invalid_webhooks_are_rejected(receiver, token, body, status):
+    assert post(receiver, body, token) == status
+    assert receiver.pending == set()
+
+
+def test_bursts_of_events_are_coalesced(receiver):
+    receiver.add([audit_entry("someone", {"name": "PutBucket", "bucket": "team-a"})])
+    assert receiver.take(60) == set()
+    # Events that keep coming are taken once they waited for ten debounce periods.
+    receiver.first_event = time.monotonic() - 600
+    receiver.add([audit_entry("someone", {"name": "PutBucket", "bucket": "team-b"})])
+    assert receiver.take(60) == {("bucket", "team-a"), ("bucket", "team-b")}
+
+
+@pytest.fixture
+def drift_index(use_settings) -> tuple[DriftIndex, list]:
+    """The resources of two teams, with the access keys of their service accounts in a fake secret backend."""
+    resources = ClusterResources()
+    resources.buckets = [Bucket("team-a", create_service_account=True), Bucket("team-b", create_service_account=False)]
+    resources.bucket_policies = [BucketPolicy("team-b", "team-b.json")]
+    resources.service_accounts = [ServiceAccount("team-c")]
+    resources.iam_policies = [IamPolicy("team-read", "team-read.json")]
+    resources.iam_policy_attachments = [IamPolicyAttachment("user-a", ("team-read", "readwrite"))]
+    lookups = []
+
+    def get_credentials_many(accounts) -> dict[str, Credentials]:
+        lookups.append(sorted(account.full_name for account in accounts))
+        return {"team-a": Credentials("key-a", "secret-a"), "team-c": Credentials("key-c", "secret-c")}
+
+    fake = SimpleNamespace(get_credentials_many=get_credentials_many)
+    secrets.secrets.lazy_use(secrets.secrets.lazy_scoped(lambda: fake))
+    return DriftIndex(resources), lookups
+
+
+def test_targets_are_mapped_to_the_resources_declaring_them(drift_index):
+    index, lookups = drift_index
+    assert index.keys([("bucket", "team-b"), ("bucket", "other"), ("user", "user-a"), ("user", "other")]) == {
+        ("buckets", "team-b"),
+        ("bucket_policies", "team-b"),
+        ("iam_policy_attachments", "user-a"),
+    }
+    # Removing a policy detaches it from users, even if it is not declared.
+    assert index.keys([("iam_policy", "readwrite")]) == {("iam_policy_attachments", "user-a")}
+    assert index.keys([("iam_policy", "team-read")]) == {
+        ("iam_policies", "team-read"),
+        ("iam_policy_attachments", "user-a"),
+    }
+    # The secret backend is only read once a service account changed.
+    assert lookups == []
+    assert index.keys([("access_key", "key-a"), ("access_key", "key-c"), ("access_key", "other")]) == {
+        ("buckets", "team-a"),
+        ("service_accounts", "team-c"),
+    }
+    index.keys([("access_key", "key-a")])
+    assert lookups == [["team-a", "team-c"]]
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import pytest
+import yaml
+
+from minio_manager import fanout, reconciler
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import logging_config, settings
+
+CLUSTERS = [
+    {"cluster_name": "cluster-a", "s3_endpoint": "minio-a.example.com"},
+    {"cluster_name": "cluster-b", "s3_endpoint": "minio-b.example.com", "journal_file": "b.journal"},
+    {"cluster_name": "cluster-c", "s3_endpoint": "minio-c.example.com", "minio_controller_user": "other"},
+]
+
+
+@pytest.fixture
+def clusters_file(use_settings, tmp_path):
+    use_settings(cluster_resources_file="resources.yaml", journal_file="run.journal", concurrency=4)
+    path = tmp_path / "clusters.yaml"
+    path.write_text(yaml.safe_dump(CLUSTERS))
+    return str(path)
+
+
+def test_clusters_use_the_main_settings_with_their_own(clusters_file):
+    clusters = fanout.read_clusters(clusters_file)
+    assert [cluster.s3_endpoint for cluster in clusters] == [f"minio-{name}.example.com" for name in "abc"]
+    assert [cluster.minio_controller_user for cluster in clusters] == ["minio-manager", "minio-manager", "other"]
+    assert {cluster.concurrency for cluster in clusters} == {4}
+    # Every cluster has its own journal and profiles.
+    assert [cluster.journal_file for cluster in clusters] == [
+        "run-cluster-a.journal",
+        "b.journal",
+        "run-cluster-c.journal",
+    ]
+    assert [cluster.profile_dir for cluster in clusters] == [f"profiles/cluster-{name}" for name in "abc"]
+
+
+@pytest.mark.parametrize(
+    "clusters",
+    [
+        [],
+        {"cluster_name": "cluster-a"},
+        [{"s3_endpoint": "minio-a.example.com"}],
+        [{"cluster_name": "cluster-a", "unknown": "setting"}],
+        [{"cluster_name": "cluster-a", "concurrency": 0}],
+        [{"cluster_name": "cluster-a"}, {"cluster_name": "cluster-a"}],
+    ],
+)
+def test_invalid_clusters_are_rejected(clusters_file, tmp_path, clusters):
+    (tmp_path / "clusters.yaml").write_text(yaml.safe_dump(clusters))
+    with pytest.raises(SystemExit):
+        fanout.read_clusters(clusters_file)
+
+
+def test_clusters_are_reconciled_in_their_own_process(clusters_file, tmp_path, monkeypatch):
+    (tmp_path / "resources.yaml").write_text("buckets:\n  - name: bucket-a\n")
+
+    def reconcile(resources):
+        # Runs in the worker process of the cluster, with its settings.
+        assert resources.buckets[0].name == "bucket-a"
+        if settings.settings.cluster_name == "cluster-b":
+            raise SystemExit(23)
+        if settings.settings.cluster_name == "cluster-c":
+            logging_config.logger.error("Failed to reconcile a resource")
+
+    monkeypatch.setattr(reconciler.app, "reconcile", reconcile)
+    # The exit code of the first cluster that failed, in the order of the clusters file.
+    assert fanout.reconcile_clusters(clusters_file) == 23
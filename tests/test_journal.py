@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import pytest
+
+from minio_manager.classes.journal import Journal
+from minio_manager.classes.minio_resources import Bucket, BucketPolicy, ServiceAccount
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.classes.resource_scheduler import ResourceScheduler
+
+HEADER = {"cluster": "test", "endpoint": "minio.example.com", "resources_file": "resources.yaml"}
+FINGERPRINTS = {("buckets", "a"): "1", ("buckets", "b"): "2", ("service_accounts", "c"): "3"}
+
+
+@pytest.fixture
+def path(use_settings, tmp_path):
+    return tmp_path / "journal.jsonl"
+
+
+def resume(path, fingerprints=FINGERPRINTS, header=HEADER) -> set | None:
+    return Journal(path, header, fingerprints).read()
+
+
+def test_resume_skips_reconciled_resources(path):
+    journal = Journal(path, HEADER, FINGERPRINTS)
+    assert journal.start(resume=True) == set()
+    journal.record(("buckets", "a"))
+    journal.record(("buckets", "b"))
+    journal.close(completed=False)
+
+    assert resume(path) == {("buckets", "a"), ("buckets", "b")}
+    # Resources that changed since are reconciled again, as is everything for another run.
+    assert resume(path, {**FINGERPRINTS, ("buckets", "a"): "changed"}) == {("buckets", "b")}
+    assert resume(path, header={**HEADER, "cluster": "other"}) is None
+
+
+def test_completed_runs_remove_the_journal(path):
+    journal = Journal(path, HEADER, FINGERPRINTS)
+    journal.start(resume=False)
+    journal.record(("buckets", "a"))
+    journal.close(completed=True)
+    assert not path.exists()
+
+
+def test_credentials_are_only_recorded_once_saved(path):
+    journal = Journal(path, HEADER, FINGERPRINTS)
+    journal.start(resume=False)
+    journal.record(("buckets", "a"))
+    journal.record(("service_accounts", "c"), credentials=True)
+    journal.sync()
+    assert resume(path) == {("buckets", "a")}
+
+    journal.credentials_saved()
+    assert resume(path) == {("buckets", "a"), ("service_accounts", "c")}
+    journal.close(completed=False)
+
+
+def test_killed_runs_reconcile_new_service_accounts_again(path):
+    resources = ClusterResources()
+    resources.buckets = [Bucket("a", create_service_account=False), Bucket("b", create_service_account=True)]
+    resources.bucket_policies = [BucketPolicy("a", "policy.json")]
+    resources.service_accounts = [ServiceAccount("c")]
+    fingerprints = dict.fromkeys(resources.resource_keys(), "1")
+    journal = Journal(path, HEADER, fingerprints)
+    journal.start(resume=False)
+    handlers = dict.fromkeys(("buckets", "bucket_policies", "service_accounts"), lambda resource: None)
+    ResourceScheduler(resources, handlers, journal=journal).run()
+    # Killed before the secret backend was saved.
+    journal.sync()
+    assert resume(path, fingerprints) == {("buckets", "a"), ("bucket_policies", "a")}
+    journal.close(completed=False)
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import io
+import json
+
+import pytest
+
+from minio_manager.classes import logging_config
+from minio_manager.utilities import get_error_count
+
+
+@pytest.fixture
+def new_logger(use_settings):
+    """Create loggers writing to a string, closing them after the test."""
+    loggers = []
+
+    def new(log_format: str = "text") -> tuple[logging_config.MinioManagerLogger, io.StringIO]:
+        logger = logging_config.MinioManagerLogger("test", "INFO", log_format)
+        output = io.StringIO()
+        logger.handler.setStream(output)
+        loggers.append(logger)
+        return logger, output
+
+    yield new
+    for logger in loggers:
+        logger.close()
+
+
+# Secrets in constants, as tracebacks show the source lines passing them along.
+MESSAGE_SECRET = "messageSecret123"  # noqa: S105
+EXCEPTION_SECRET = "exceptionSecret456"  # noqa: S105
+
+
+def fail(secret_key: str):
+    raise ValueError(f"Invalid credentials {{'secret_key': '{secret_key}'}}")
+
+
+@pytest.mark.parametrize("log_format", ["text", "json"])
+def test_secrets_are_masked(new_logger, log_format):
+    logger, output = new_logger(log_format)
+    logger.info("Creating service account with secret_key: %s", MESSAGE_SECRET)
+    try:
+        fail(EXCEPTION_SECRET)
+    except ValueError:
+        logger.exception("Failed to create service account")
+    logger.flush()
+
+    written = output.getvalue()
+    assert MESSAGE_SECRET not in written
+    assert EXCEPTION_SECRET not in written
+    assert get_error_count() == 1
+    if log_format == "json":
+        entries = [json.loads(line) for line in written.splitlines()]
+        assert "ValueError" in entries[1]["exception"]
+
+
+def test_arguments_are_logged_as_they_were(new_logger):
+    logger, output = new_logger()
+    arguments = ["before"]
+    logger.info("Arguments: %s", arguments)
+    arguments[0] = "after"
+    logger.flush()
+    assert "Arguments: ['before']" in output.getvalue()
+
+
+def test_closed_loggers_write_directly(new_logger):
+    logger, output = new_logger()
+    assert logger in logging_config._running_loggers
+    logger.close()
+    assert logger not in logging_config._running_loggers
+    logger.info("After closing")
+    assert "After closing" in output.getvalue()
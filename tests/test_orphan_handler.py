@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+import pytest
+from minio.error import MinioAdminException
+
+from minio_manager import orphan_handler
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import client_manager, controller_user
+from minio_manager.classes.minio_resources import Bucket, IamPolicy, ServiceAccount
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.plan import Plan
+
+CONTROLLER_ACCESS_KEY = "controller-key"
+
+
+class FakeAdmin:
+    """The admin API calls used to find orphaned resources, answering from a fixed cluster state."""
+
+    def __init__(self, policies: list[str], controller_policies: list[str] | None):
+        self.policies = policies
+        self.controller_policies = controller_policies
+        self.accounts = [
+            {"accessKey": CONTROLLER_ACCESS_KEY, "name": "", "description": ""},
+            {"accessKey": "key-a", "name": "team-a", "description": "team-a - Service account for bucket team-a"},
+            {"accessKey": "key-old", "name": "team-old", "description": "team-old - Service account for team-old"},
+            {"accessKey": "key-manual", "name": "manual", "description": "Created by hand"},
+            {"accessKey": "key-other", "name": "other-old", "description": "other-old - Another group's account"},
+        ]
+
+    def list_service_account(self, user: str) -> str:
+        return json.dumps({"accounts": self.accounts})
+
+    def policy_list(self) -> str:
+        return json.dumps({name: {} for name in self.policies})
+
+    def user_info(self, user: str) -> str:
+        if self.controller_policies is None:
+            raise MinioAdminException("403", "Access Denied")
+        return json.dumps({"policyName": ",".join(self.controller_policies), "status": "enabled"})
+
+
+POLICIES = ["readwrite", "team-a", "team-old", "team-controller", "handmade", "other-old"]
+
+
+@pytest.fixture
+def resources(use_settings) -> ClusterResources:
+    resources = ClusterResources()
+    resources.buckets = [Bucket("team-a", create_service_account=True)]
+    resources.service_accounts = [ServiceAccount("team-b")]
+    resources.iam_policies = [IamPolicy("team-a", "team-a.json")]
+    return resources
+
+
+@pytest.fixture
+def use_cluster():
+    def use(policies: list[str], controller_policies: list[str] | None = ()) -> FakeAdmin:
+        admin = FakeAdmin(policies, controller_policies)
+        buckets = [SimpleNamespace(name=name) for name in ("team-a", "team-old", "other-old", "minio-manager-secrets")]
+        s3 = SimpleNamespace(list_buckets=lambda: buckets)
+        clients = SimpleNamespace(admin=admin, s3=s3)
+        client_manager.client_manager.lazy_use(client_manager.client_manager.lazy_scoped(lambda: clients))
+        user = SimpleNamespace(access_key=CONTROLLER_ACCESS_KEY)
+        controller_user.controller_user.lazy_use(controller_user.controller_user.lazy_scoped(lambda: user))
+        return admin
+
+    return use
+
+
+def test_orphans(resources, use_settings, use_cluster):
+    use_settings(managed_prefixes=("team-",))
+    use_cluster(POLICIES, controller_policies=["team-controller"])
+    assert orphan_handler.find_orphans(resources) == {
+        "buckets": {"team-old": "team-old"},
+        "service_accounts": {"team-old": "key-old"},
+        "iam_policies": {"team-old": "team-old"},
+    }
+
+
+def test_nothing_is_orphaned_without_managed_prefixes(resources, use_cluster):
+    use_cluster(POLICIES)
+    assert orphan_handler.find_orphans(resources) == {"buckets": {}, "service_accounts": {}, "iam_policies": {}}
+
+
+def test_buckets_outside_the_allowed_prefixes_are_not_orphaned(resources, use_settings, use_cluster):
+    use_settings(managed_prefixes=("team-", "other-"), allowed_bucket_prefixes=("team-",))
+    use_cluster(POLICIES)
+    assert orphan_handler.find_orphans(resources)["buckets"] == {"team-old": "team-old"}
+
+
+def test_iam_policies_are_skipped_if_the_controller_policies_are_unknown(resources, use_settings, use_cluster):
+    use_settings(managed_prefixes=("team-",))
+    use_cluster(POLICIES, controller_policies=None)
+    assert orphan_handler.find_orphans(resources)["iam_policies"] == {}
+
+
+@pytest.mark.parametrize("name", ["readwrite", "handmade", "team-a"])
+def test_is_managed_iam_policy(use_settings, name):
+    use_settings(managed_prefixes=("team-", "readwrite"))
+    assert orphan_handler.is_managed_iam_policy(name) is (name == "team-a")
+
+
+def test_plan_orphans_like_find_orphans(resources, use_settings):
+    use_settings(managed_prefixes=("team-",), orphans="report")
+    admin = FakeAdmin(POLICIES, ["team-controller"])
+    snapshot = {
+        "buckets": {name: {} for name in ("team-a", "team-old", "other-old", "minio-manager-secrets")},
+        "service_accounts": {account["accessKey"]: account for account in admin.accounts},
+        "iam_policies": {name: {} for name in POLICIES},
+        "users": {"minio-manager": ["team-controller"], "someone": ["team-old"]},
+    }
+    plan = Plan(snapshot)
+    plan.plan_orphans(resources)
+    assert plan.changes == [
+        "- orphaned bucket 'team-old': reported",
+        "- orphaned service account 'team-old': reported",
+        "- orphaned IAM policy 'team-old': reported",
+    ]
+
+    plan = Plan({**snapshot, "users": None})
+    plan.plan_orphans(resources)
+    assert "- orphaned IAM policy 'team-old': reported" not in plan.changes
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from minio.commonconfig import ENABLED, Filter
+from minio.lifecycleconfig import Expiration, LifecycleConfig, Rule
+from minio.versioningconfig import SUSPENDED, VersioningConfig
+
+from minio_manager.classes.minio_resources import Bucket, BucketPolicy, IamPolicy, IamPolicyAttachment, ServiceAccount
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.plan import plan_resources
+from minio_manager.resources.policies import service_account_policy_base
+from minio_manager.snapshot import SNAPSHOT_VERSION, lifecycle_to_xml, read_snapshot
+
+ALLOW_ALL = {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": ["s3:*"], "Resource": ["*"]}]}
+READ_ONLY = {
+    "Version": "2012-10-17",
+    "Statement": [{"Effect": "Allow", "Action": ["s3:GetObject"], "Resource": ["arn:aws:s3:::*"]}],
+}
+
+
+def expire_after(days: int) -> LifecycleConfig:
+    return LifecycleConfig(
+        [Rule(ENABLED, rule_filter=Filter(prefix=""), rule_id="expire", expiration=Expiration(days=days))]
+    )
+
+
+def base_policy(bucket: str) -> dict:
+    return json.loads(json.dumps(service_account_policy_base).replace("BUCKET_NAME_REPLACE_ME", bucket))
+
+
+@pytest.fixture
+def snapshot() -> dict:
+    """A cluster with two buckets, one with a service account, an IAM policy and a user."""
+    return {
+        "version": SNAPSHOT_VERSION,
+        "endpoint": "minio.example.com",
+        "exported_at": 0,
+        "controller_policy": ALLOW_ALL,
+        "buckets": {
+            "team-a": {"versioning": "Enabled", "lifecycle": lifecycle_to_xml(expire_after(30)), "policy": READ_ONLY},
+            "team-b": {"versioning": "Off", "lifecycle": None, "policy": None},
+        },
+        "iam_policies": {"team-read": READ_ONLY},
+        "service_accounts": {
+            "key-a": {"name": "team-a", "description": "team-a - Service account", "policy": base_policy("team-a")},
+        },
+        "users": {"someone": ["team-read"]},
+    }
+
+
+@pytest.fixture
+def policy_files(use_settings, tmp_path):
+    (tmp_path / "read-only.json").write_text(json.dumps(READ_ONLY))
+    (tmp_path / "allow-all.json").write_text(json.dumps(ALLOW_ALL))
+
+
+def test_nothing_is_planned_for_the_current_state(policy_files, snapshot):
+    resources = ClusterResources()
+    resources.buckets = [
+        Bucket("team-a", True, VersioningConfig("Enabled"), expire_after(30)),
+        Bucket("team-b", False),
+    ]
+    resources.bucket_policies = [BucketPolicy("team-a", "read-only.json")]
+    resources.iam_policies = [IamPolicy("team-read", "read-only.json")]
+    resources.iam_policy_attachments = [IamPolicyAttachment("someone", ("team-read",))]
+    plan = plan_resources(resources, snapshot)
+    assert plan.changes == []
+    assert plan.counts == {"create": 0, "update": 0, "orphaned": 0}
+
+
+def test_changes_are_planned(policy_files, snapshot):
+    resources = ClusterResources()
+    resources.buckets = [
+        Bucket("team-a", True, VersioningConfig(SUSPENDED), expire_after(7)),
+        Bucket("team-b", False, lifecycle_config=expire_after(7)),
+        Bucket("team-c", True, VersioningConfig("Enabled")),
+    ]
+    resources.bucket_policies = [BucketPolicy("team-a", "allow-all.json"), BucketPolicy("team-b", "read-only.json")]
+    resources.iam_policies = [IamPolicy("team-read", "allow-all.json"), IamPolicy("team-write", "allow-all.json")]
+    resources.iam_policy_attachments = [IamPolicyAttachment("someone", ("team-read", "team-write"))]
+    plan = plan_resources(resources, snapshot)
+    assert plan.changes == [
+        "~ update bucket versioning 'team-a': Enabled -> Suspended",
+        "~ update bucket lifecycle 'team-a'",
+        "+ create bucket lifecycle 'team-b'",
+        "+ create bucket 'team-c'",
+        "~ update bucket versioning 'team-c': Off -> Enabled",
+        "+ create service account 'team-c'",
+        "~ update bucket policy 'team-a'",
+        "+ create bucket policy 'team-b'",
+        "~ update IAM policy 'team-read'",
+        "+ create IAM policy 'team-write'",
+        "~ update IAM policy attachment 'someone': attach team-write",
+    ]
+    assert plan.counts == {"create": 5, "update": 6, "orphaned": 0}
+
+
+def test_unknown_state_is_planned_as_an_update(policy_files, snapshot):
+    del snapshot["buckets"]["team-a"]["lifecycle"]
+    snapshot["users"] = None
+    resources = ClusterResources()
+    resources.buckets = [Bucket("team-a", False, lifecycle_config=expire_after(30))]
+    resources.iam_policy_attachments = [IamPolicyAttachment("someone", ("team-read",))]
+    assert plan_resources(resources, snapshot).changes == [
+        "~ update bucket lifecycle 'team-a': the current configuration is unknown",
+        "~ update IAM policy attachment 'someone': the current attachments are unknown",
+    ]
+
+
+def test_service_accounts_are_limited_to_the_controller_policy(policy_files, snapshot):
+    snapshot["controller_policy"] = READ_ONLY
+    resources = ClusterResources()
+    resources.service_accounts = [ServiceAccount("team-a", policy_file="allow-all.json")]
+    # The base policy MinIO Manager falls back to is the current policy of the service account.
+    assert plan_resources(resources, snapshot).changes == [
+        "~ update service account policy 'team-a': more permissions than the controller user"
+    ]
+
+
+@pytest.mark.parametrize("content", ["{", json.dumps({"version": SNAPSHOT_VERSION + 1})])
+def test_invalid_snapshots_are_rejected(use_settings, tmp_path, content):
+    (tmp_path / "snapshot.json").write_text(content)
+    with pytest.raises(SystemExit):
+        read_snapshot("snapshot.json")
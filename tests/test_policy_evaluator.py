@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import pytest
+
+from minio_manager.policy_evaluator import is_policy_subset, pattern_covers
+
+CONTROLLER_POLICY = {
+    "Version": "2012-10-17",
+    "Statement": [
+        {"Effect": "Allow", "Action": ["s3:*"], "Resource": ["arn:aws:s3:::team-*", "arn:aws:s3:::team-*/*"]}
+    ],
+}
+
+
+def policy(*statements: dict) -> dict:
+    return {"Version": "2012-10-17", "Statement": list(statements)}
+
+
+def allow(action="s3:GetObject", resource="arn:aws:s3:::team-a/*", condition: dict | None = None) -> dict:
+    statement = {"Effect": "Allow", "Action": action, "Resource": resource}
+    if condition is not None:
+        statement["Condition"] = condition
+    return statement
+
+
+@pytest.mark.parametrize(
+    ("pattern", "subpattern", "expected"),
+    [
+        ("s3:*", "s3:GetObject", True),
+        ("s3:*", "s3:Get*", True),
+        ("s3:Get*", "s3:*", False),
+        ("s3:Get?", "s3:Get*", False),
+        ("s3:Get?bject", "s3:Get?bject", True),
+        ("arn:aws:s3:::team-*", "arn:aws:s3:::other", False),
+    ],
+)
+def test_pattern_covers(pattern, subpattern, expected):
+    assert pattern_covers(pattern, subpattern) is expected
+
+
+def test_subset_of_wildcard_policy():
+    assert is_policy_subset(policy(allow()), CONTROLLER_POLICY) is True
+
+
+def test_resource_outside_the_controller_policy():
+    assert is_policy_subset(policy(allow(resource="arn:aws:s3:::other/*")), CONTROLLER_POLICY) is False
+
+
+def test_action_outside_the_controller_policy():
+    assert is_policy_subset(policy(allow(action="admin:CreateUser", resource="*")), CONTROLLER_POLICY) is False
+
+
+def test_deny_statements_never_grant_more():
+    deny = {"Effect": "Deny", "Action": "s3:*", "Resource": "*"}
+    assert is_policy_subset(policy(allow(), deny), CONTROLLER_POLICY) is True
+
+
+def test_unknown_statement_keys_can_not_be_decided():
+    statement = {"Effect": "Allow", "NotAction": "s3:DeleteObject", "Resource": "*"}
+    assert is_policy_subset(policy(statement), CONTROLLER_POLICY) is None
+
+
+def test_deny_in_the_controller_policy_can_not_be_decided():
+    controller = policy(*CONTROLLER_POLICY["Statement"], {"Effect": "Deny", "Action": "s3:Delete*", "Resource": "*"})
+    assert is_policy_subset(policy(allow(action="s3:*")), controller) is None
+
+
+def conditional(operator: str, key: str, values: list[str]) -> dict:
+    return policy(allow(action="s3:*", resource="*", condition={operator: {key: values}}))
+
+
+@pytest.mark.parametrize(
+    ("operator", "controller_values", "values", "expected"),
+    [
+        # A positive condition covers conditions allowing fewer values.
+        ("StringEquals", ["a", "b"], ["a"], True),
+        ("StringEquals", ["a"], ["a", "b"], None),
+        ("StringLike", ["team-*"], ["team-a*"], True),
+        ("StringLike", ["team-a*"], ["team-*"], None),
+        # A negated condition covers conditions excluding more values.
+        ("StringNotEquals", ["a"], ["a", "b"], True),
+        ("StringNotEquals", ["a", "b"], ["a"], None),
+        ("StringNotEquals", ["a", "b"], ["a", "b"], True),
+        ("StringNotLike", ["team-a*"], ["team-*"], True),
+        ("StringNotLike", ["team-*"], ["team-a*"], None),
+        ("ArnNotLike", ["arn:aws:iam::*:user/admin"], ["arn:aws:iam::*:user/*"], True),
+        ("ArnNotLike", ["arn:aws:iam::*:user/*"], ["arn:aws:iam::*:user/admin"], None),
+        ("NotIpAddress", ["10.0.0.0/8"], ["10.0.0.0/8", "192.168.0.0/16"], True),
+        ("NotIpAddress", ["10.0.0.0/8", "192.168.0.0/16"], ["10.0.0.0/8"], None),
+        ("StringNotEqualsIfExists", ["a"], ["a", "b"], True),
+        ("StringNotEqualsIfExists", ["a", "b"], ["a"], None),
+        ("ForAnyValue:StringNotLike", ["x*"], ["*"], True),
+        ("ForAnyValue:StringNotLike", ["*"], ["x*"], None),
+    ],
+)
+def test_conditions(operator, controller_values, values, expected):
+    controller = conditional(operator, "aws:username", controller_values)
+    assert is_policy_subset(conditional(operator, "aws:username", values), controller) is expected
+
+
+def test_missing_condition_can_not_be_decided():
+    controller = conditional("StringNotEquals", "aws:username", ["admin"])
+    assert is_policy_subset(policy(allow(action="s3:*", resource="*")), controller) is None
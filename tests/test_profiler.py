@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import json
+import pstats
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from minio_manager.classes import http_client
+from minio_manager.classes.profiler import current_resource, phase, run_profiled
+from minio_manager.utilities import ContextThreadPoolExecutor
+
+
+def profiled_functions(file: Path) -> set[str]:
+    return {function for _, _, function in pstats.Stats(str(file)).stats}
+
+
+def before_inner_phase():
+    pass
+
+
+def in_inner_phase():
+    pass
+
+
+def after_inner_phase():
+    pass
+
+
+def in_thread():
+    pass
+
+
+def test_phases_are_profiled(use_settings, tmp_path):
+    use_settings(profile=True, profile_dir=str(tmp_path / "profiles"))
+    with phase("outer"):
+        before_inner_phase()
+        with phase("inner"):
+            in_inner_phase()
+            with ContextThreadPoolExecutor(1) as executor:
+                executor.submit(run_profiled, in_thread).result()
+        after_inner_phase()
+
+    outer, inner = (next((tmp_path / "profiles").glob(f"*-{name}.pstats")) for name in ("outer", "inner"))
+    assert {"in_inner_phase", "in_thread"} <= profiled_functions(inner)
+    assert "before_inner_phase" not in profiled_functions(inner)
+    # The outer phase is profiled again once the inner phase is done.
+    assert {"before_inner_phase", "after_inner_phase"} <= profiled_functions(outer)
+    assert "in_inner_phase" not in profiled_functions(outer)
+
+
+def test_memory_is_profiled(use_settings, tmp_path):
+    use_settings(profile_memory=True, profile_dir=str(tmp_path / "profiles"))
+    try:
+        with phase("parsing"):
+            allocated = [bytearray(1024) for _ in range(100)]
+    finally:
+        tracemalloc.stop()
+
+    [file] = (tmp_path / "profiles").iterdir()
+    assert file.name.endswith("-parsing.tracemalloc")
+    allocations = tracemalloc.Snapshot.load(str(file)).statistics("filename")
+    assert any(stat.traceback[0].filename == __file__ and stat.size >= 100 * 1024 for stat in allocations)
+    assert len(allocated) == 100
+
+
+@pytest.mark.parametrize(("threshold", "logged"), [(10, True), (1000, False)])
+def test_slow_calls_are_logged_while_replaying(use_settings, tmp_path, monkeypatch, threshold, logged):
+    cassette = tmp_path / "cassette.jsonl"
+    call = {"method": "GET", "path": "/my-bucket", "query": "versioning=", "status": 200, "headers": {}, "body": ""}
+    header = {"version": 1, "endpoint": "minio.example.com"}
+    cassette.write_text(f"{json.dumps(header)}\n{json.dumps({**call, 'elapsed_ms': 50})}\n")
+    use_settings(slow_call_threshold=threshold, replay_file=str(cassette), replay_latency_scale=1)
+    warnings = []
+    monkeypatch.setattr(http_client, "logger", SimpleNamespace(warning=warnings.append))
+
+    token = current_resource.set("bucket 'my-bucket'")
+    try:
+        http_client.create_http_client().request("GET", "https://minio.example.com/my-bucket?versioning")
+    finally:
+        current_resource.reset(token)
+    assert bool(warnings) is logged
+    if logged:
+        assert warnings[0].startswith("Slow API call GET /my-bucket took")
+        assert warnings[0].endswith("ms, handling bucket 'my-bucket'")
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+from conftest import REQUIRED_SETTINGS
+
+from minio_manager import reconciler
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import client_manager, logging_config
+from minio_manager.classes.errors import ReconcileError
+from minio_manager.classes.settings import Settings
+from minio_manager.utilities import get_thread_error_count
+
+
+def new_reconciler(clients=None) -> reconciler.Reconciler:
+    return reconciler.Reconciler(Settings(**REQUIRED_SETTINGS, _env_file=None), clients=clients)
+
+
+def test_reconcilers_use_their_own_clients_and_error_counts(use_settings, monkeypatch):
+    first_clients, second_clients = SimpleNamespace(name="first"), SimpleNamespace(name="second")
+    first, second = new_reconciler(first_clients), new_reconciler(second_clients)
+    observed = {}
+
+    def reconcile(resources):
+        clients = client_manager.client_manager.lazy_get()
+        logging_config.logger.error(f"Failing with the {clients.name} clients")
+        if clients is first_clients:
+            # Another reconciler reconciling in the same thread does not count its errors for this one.
+            errors_before = get_thread_error_count()
+            observed["second"] = second.reconcile(resources)
+            observed["first thread errors"] = get_thread_error_count() - errors_before
+
+    monkeypatch.setattr(reconciler.app, "reconcile", reconcile)
+    with first, second:
+        assert first.reconcile() == 1
+    assert observed == {"second": 1, "first thread errors": 0}
+
+
+def test_critical_errors_raise(use_settings, monkeypatch):
+    def reconcile(resources):
+        logging_config.logger.critical("Stopping")
+
+    monkeypatch.setattr(reconciler.app, "reconcile", reconcile)
+    with new_reconciler() as stopping, pytest.raises(ReconcileError) as error:
+        stopping.reconcile()
+    assert error.value.exit_code == 1
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+import subprocess
+
+import pytest
+
+from minio_manager import resource_diff
+
+POLICY = {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": "s3:GetObject", "Resource": "*"}]}
+RESOURCES = """\
+buckets:
+  - name: bucket-a
+  - name: bucket-b
+bucket_policies:
+  - bucket: bucket-a
+    policy_file: policy.json
+iam_policies:
+  - name: policy
+    policy_file: policy.json
+"""
+
+
+def git(*args: str):
+    command = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args]
+    subprocess.run(command, check=True)  # noqa: S603
+
+
+@pytest.fixture
+def resources(use_settings, tmp_path):
+    """Write the resources and their policy file to an empty directory, that is the current directory."""
+    (tmp_path / "policy.json").write_text(json.dumps(POLICY))
+    (tmp_path / "resources.yaml").write_text(RESOURCES)
+    return "resources.yaml"
+
+
+def test_changes_since_a_previous_file(resources, tmp_path):
+    (tmp_path / "previous.yaml").write_text(RESOURCES.replace("bucket-b", "bucket-c"))
+    assert resource_diff.changed_since("previous.yaml", resources) == {("buckets", "bucket-b")}
+
+
+def test_changes_since_a_git_revision(resources, tmp_path, monkeypatch):
+    git("init", "-q")
+    git("add", ".")
+    git("commit", "-q", "-m", "resources")
+    (tmp_path / "policy.json").write_text(json.dumps({**POLICY, "Version": "2008-10-17"}))
+    (tmp_path / "resources.yaml").write_text(RESOURCES + "  - name: new\n    policy_file: policy.json\n")
+
+    processes = []
+    popen = subprocess.Popen
+
+    def record_popen(args, **kwargs):
+        process = popen(args, **kwargs)
+        if "cat-file" in args:
+            processes.append(process)
+        return process
+
+    monkeypatch.setattr(subprocess, "Popen", record_popen)
+    assert resource_diff.changed_since("HEAD", resources) == {
+        ("bucket_policies", "bucket-a"),
+        ("iam_policies", "policy"),
+        ("iam_policies", "new"),
+    }
+    # The git process reading the revision is stopped once the resources are compared.
+    assert [process.returncode for process in processes] == [0]
+
+
+def test_resources_that_did_not_exist_in_the_revision_are_new(resources, tmp_path):
+    git("init", "-q")
+    git("commit", "-q", "--allow-empty", "-m", "empty")
+    assert resource_diff.changed_since("HEAD", resources) == {
+        ("buckets", "bucket-a"),
+        ("buckets", "bucket-b"),
+        ("bucket_policies", "bucket-a"),
+        ("iam_policies", "policy"),
+    }
+
+
+def test_since_must_be_a_file_or_a_revision(resources, tmp_path, monkeypatch):
+    monkeypatch.setenv("GIT_CEILING_DIRECTORIES", str(tmp_path.parent))
+    with pytest.raises(SystemExit):
+        resource_diff.changed_since("HEAD", resources)
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+import yaml
+from pydantic import ValidationError
+
+from minio_manager.classes.resource_parser import RESOURCE_KINDS, ClusterResources
+from minio_manager.utilities import iter_yaml_sections
+
+POLICY = {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": "s3:GetObject", "Resource": "*"}]}
+
+
+@pytest.fixture
+def resources_file(use_settings, tmp_path):
+    """Write a resources file with buckets, service accounts sharing a policy, and IAM policies attached to a user."""
+    (tmp_path / "policy.json").write_text(json.dumps(POLICY))
+    (tmp_path / "copy.json").write_text(json.dumps(POLICY))
+    lines = ["buckets:"]
+    lines += [f"  - name: bucket-{i}\n    create_service_account: False" for i in range(20)]
+    lines += ["bucket_policies:"]
+    lines += [f"  - bucket: bucket-{i}\n    policy_file: policy.json" for i in range(0, 20, 3)]
+    lines += ["service_accounts:"]
+    lines += [f"  - name: bucket-{i}\n    policy_file: {'policy' if i % 2 else 'copy'}.json" for i in range(0, 20, 2)]
+    lines += ["iam_policies:"]
+    lines += [f"  - name: policy-{i}\n    policy_file: policy.json" for i in range(5)]
+    lines += ["iam_policy_attachments:", "  - username: user\n    policies:\n      - policy-1\n      - policy-3"]
+    path = tmp_path / "resources.yaml"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def parse(resources_file: str) -> ClusterResources:
+    resources = ClusterResources()
+    resources.parse_resources(resources_file)
+    return resources
+
+
+def test_service_accounts_share_identical_policies(resources_file):
+    resources = parse(resources_file)
+    policies = {id(account.policy) for account in resources.service_accounts}
+    assert len(policies) == 1
+    # Policies are only shared within a parse, so reparsing does not keep the policies of earlier parses alive.
+    assert parse(resources_file).service_accounts[0].policy is not resources.service_accounts[0].policy
+
+
+def test_shards_split_all_resources(resources_file):
+    resources = parse(resources_file)
+    shards = [set(resources.shard(index, 3).resource_keys()) for index in range(1, 4)]
+    assert set.union(*shards) == set(resources.resource_keys())
+    assert sum(len(shard) for shard in shards) == len(resources)
+    assert all(shards)
+
+
+def test_shards_keep_dependent_resources_together(resources_file):
+    resources = parse(resources_file)
+    for index in range(1, 4):
+        keys = set(resources.shard(index, 3).resource_keys())
+        for key, depends_on in resources.dependencies().items():
+            if key in keys:
+                assert depends_on <= keys, key
+
+
+def test_shards_are_deterministic(resources_file):
+    first, second = parse(resources_file), parse(resources_file)
+    for index in range(1, 4):
+        assert list(first.shard(index, 3).resource_keys()) == list(second.shard(index, 3).resource_keys())
+
+
+@pytest.mark.parametrize(
+    ("key", "index"),
+    [
+        (("buckets", "bucket-0"), 3),
+        (("bucket_policies", "bucket-0"), 3),
+        (("service_accounts", "bucket-0"), 3),
+        (("buckets", "bucket-1"), 1),
+        (("buckets", "bucket-2"), 2),
+        (("service_accounts", "bucket-2"), 2),
+    ],
+)
+def test_shards_do_not_depend_on_the_process(resources_file, key, index):
+    # Runners on other machines must compute the same shards, so the assignment may not use e.g. hash().
+    assert key in set(parse(resources_file).shard(index, 3).resource_keys())
+
+
+@pytest.mark.parametrize(
+    ("selectors", "kinds", "expected"),
+    [
+        (
+            {"buckets": ["bucket-0"]},
+            (),
+            {("buckets", "bucket-0"), ("bucket_policies", "bucket-0"), ("service_accounts", "bucket-0")},
+        ),
+        ({"bucket_policies": ["bucket-3"]}, (), {("bucket_policies", "bucket-3"), ("buckets", "bucket-3")}),
+        (
+            {"iam_policy_attachments": ["us*"]},
+            (),
+            {("iam_policy_attachments", "user"), ("iam_policies", "policy-1"), ("iam_policies", "policy-3")},
+        ),
+        ({"iam_policies": ["policy-[01]"]}, (), {("iam_policies", "policy-0"), ("iam_policies", "policy-1")}),
+        ({}, ("iam_policies",), {("iam_policies", f"policy-{i}") for i in range(5)}),
+        ({"buckets": ["nothing-*"]}, (), set()),
+    ],
+)
+def test_select(resources_file, selectors, kinds, expected):
+    assert set(parse(resources_file).select(selectors, kinds).resource_keys()) == expected
+
+
+def test_selectors_from_the_environment(use_settings, monkeypatch):
+    monkeypatch.setenv("MINIO_MANAGER_ONLY", "bucket=tenant-*,iam_policy=read")
+    assert use_settings().selectors == {"buckets": ["tenant-*"], "iam_policies": ["read"]}
+
+
+@pytest.mark.parametrize("selector", ["buckets=tenant-*", "bucket=", "tenant-*"])
+def test_invalid_selectors_are_rejected(use_settings, selector):
+    with pytest.raises(ValidationError):
+        use_settings(only=(selector,))
+
+
+def test_streamed_resources_are_the_parsed_resources(resources_file):
+    parsed = parse(resources_file)
+    streamed = ClusterResources()
+    stream = list(streamed.stream_resources(resources_file))
+
+    for kind in RESOURCE_KINDS:
+        # Every kind ends with None, once all of its resources were read.
+        yielded = [resource for streamed_kind, resource in stream if streamed_kind == kind]
+        assert yielded == [*getattr(parsed, kind), None]
+        assert getattr(streamed, kind) == getattr(parsed, kind)
+
+
+def test_yaml_sections_are_read_like_the_whole_file(resources_file):
+    sections = {kind: list(items) for kind, items in iter_yaml_sections(resources_file)}
+    with open(resources_file) as f:
+        assert sections == yaml.safe_load(f)
+
+
+def test_streamed_resources_with_errors_are_not_yielded(resources_file):
+    path = Path(resources_file)
+    path.write_text(path.read_text().replace("  - name: bucket-1\n", "  - name: b1\n"))
+
+    streamed = []
+    with pytest.raises(SystemExit):
+        streamed.extend(ClusterResources().stream_resources(resources_file))
+    names = {resource.name for kind, resource in streamed if kind == "buckets" and resource}
+    assert "b1" not in names
+    assert len(names) == 19
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+# Not importing the logger itself: pytest inspects module attributes, which would create it before the settings.
+from minio_manager.classes import logging_config
+from minio_manager.classes.minio_resources import Bucket, BucketPolicy, IamPolicy, IamPolicyAttachment, ServiceAccount
+from minio_manager.classes.resource_parser import ClusterResources
+from minio_manager.classes.resource_scheduler import ResourceScheduler
+from minio_manager.utilities import get_error_count
+
+
+class RecordingHandlers:
+    """Handlers recording when every resource was handled, optionally slow or failing for some resources."""
+
+    def __init__(self, slow: set[str] = frozenset(), fail: set[str] = frozenset(), raise_: set[str] = frozenset()):
+        self.slow = slow
+        self.fail = fail
+        self.raise_ = raise_
+        self.lock = threading.Lock()
+        self.started: dict[tuple[str, str], float] = {}
+        self.finished: dict[tuple[str, str], float] = {}
+
+    def handler(self, kind: str, key_attribute: str):
+        def handle(resource):
+            key = kind, getattr(resource, key_attribute)
+            with self.lock:
+                self.started[key] = time.monotonic()
+            if key[1] in self.slow:
+                time.sleep(0.05)
+            if key[1] in self.raise_:
+                raise RuntimeError(f"failed to handle {key[1]}")
+            if key[1] in self.fail:
+                logging_config.logger.error(f"Unable to handle {key[1]}")
+            with self.lock:
+                self.finished[key] = time.monotonic()
+
+        return handle
+
+    def handlers(self) -> dict:
+        return {
+            "buckets": self.handler("buckets", "name"),
+            "bucket_policies": self.handler("bucket_policies", "bucket"),
+            "service_accounts": self.handler("service_accounts", "full_name"),
+            "iam_policies": self.handler("iam_policies", "name"),
+            "iam_policy_attachments": self.handler("iam_policy_attachments", "username"),
+        }
+
+
+@pytest.fixture
+def resources(use_settings) -> ClusterResources:
+    resources = ClusterResources()
+    resources.buckets = [Bucket("bucket-a", create_service_account=False), Bucket("bucket-b", False)]
+    resources.bucket_policies = [BucketPolicy("bucket-a", "policy.json"), BucketPolicy("bucket-b", "policy.json")]
+    resources.service_accounts = [ServiceAccount("bucket-a"), ServiceAccount("other")]
+    resources.iam_policies = [IamPolicy("read", "read.json"), IamPolicy("write", "write.json")]
+    resources.iam_policy_attachments = [IamPolicyAttachment("user", ("read", "write"))]
+    return resources
+
+
+DEPENDENCIES = [
+    (("bucket_policies", "bucket-a"), ("buckets", "bucket-a")),
+    (("bucket_policies", "bucket-b"), ("buckets", "bucket-b")),
+    (("service_accounts", "bucket-a"), ("buckets", "bucket-a")),
+    (("iam_policy_attachments", "user"), ("iam_policies", "read")),
+    (("iam_policy_attachments", "user"), ("iam_policies", "write")),
+]
+
+
+def test_dependencies_are_handled_first(resources):
+    recorder = RecordingHandlers(slow={"bucket-a", "bucket-b", "write"})
+    ResourceScheduler(resources, recorder.handlers(), concurrency=8).run()
+    assert set(recorder.finished) == set(resources.resource_keys())
+    for dependent, dependency in DEPENDENCIES:
+        assert recorder.finished[dependency] <= recorder.started[dependent], (dependent, dependency)
+    # Resources without dependencies do not wait for slow resources of other kinds.
+    assert recorder.started[("service_accounts", "other")] < recorder.finished[("buckets", "bucket-a")]
+
+
+def test_dependents_of_failed_resources_are_skipped(resources):
+    recorder = RecordingHandlers(fail={"bucket-a"})
+    scheduler = ResourceScheduler(resources, recorder.handlers(), concurrency=2)
+    scheduler.run()
+    assert scheduler.failed == {("buckets", "bucket-a")}
+    assert scheduler.skipped == {("bucket_policies", "bucket-a"), ("service_accounts", "bucket-a")}
+    assert ("bucket_policies", "bucket-b") in recorder.finished
+    assert get_error_count() == 1
+
+
+def test_unexpected_exceptions_are_counted_once(resources):
+    recorder = RecordingHandlers(raise_={"read"})
+    scheduler = ResourceScheduler(resources, recorder.handlers(), concurrency=2)
+    scheduler.run()
+    assert scheduler.failed == {("iam_policies", "read")}
+    assert scheduler.skipped == {("iam_policy_attachments", "user")}
+    assert get_error_count() == 1
+
+
+def test_dependencies_that_are_not_managed_are_ignored(resources):
+    subset = resources.subset({("bucket_policies", "bucket-a"), ("iam_policy_attachments", "user")})
+    recorder = RecordingHandlers()
+    ResourceScheduler(subset, recorder.handlers()).run()
+    assert set(recorder.finished) == {("bucket_policies", "bucket-a"), ("iam_policy_attachments", "user")}
+
+
+def test_streamed_resources_wait_for_dependencies_parsed_later(resources):
+    stream = [
+        ("iam_policy_attachments", resources.iam_policy_attachments[0]),
+        ("iam_policy_attachments", None),
+        ("bucket_policies", resources.bucket_policies[0]),
+        ("bucket_policies", None),
+        ("iam_policies", resources.iam_policies[0]),
+        ("iam_policies", resources.iam_policies[1]),
+        ("iam_policies", None),
+        ("buckets", resources.buckets[0]),
+        ("buckets", None),
+    ]
+    recorder = RecordingHandlers()
+    ResourceScheduler(None, recorder.handlers(), concurrency=4).run_stream(stream)
+    assert len(recorder.finished) == 5
+    for dependent, dependency in DEPENDENCIES:
+        if dependent in recorder.started and dependency in recorder.finished:
+            assert recorder.finished[dependency] <= recorder.started[dependent], (dependent, dependency)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+import yaml
+from pykeepass import create_database
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import http_client
+from minio_manager.classes.minio_resources import Credentials, ServiceAccount
+from minio_manager.classes.secrets import SAVE_ATTEMPTS, SecretManager
+
+KEEPASS_PASSWORD = "test-password"  # noqa: S105, not a real secret
+KEEPASS_SETTINGS = {
+    "secret_backend_type": "keepass",
+    "secret_backend_path": "secrets.kdbx",
+    "keepass_password": KEEPASS_PASSWORD,
+}
+
+
+@pytest.fixture
+def use_yaml(use_settings, tmp_path):
+    """Use a YAML secret backend holding the credentials of one service account."""
+    path = tmp_path / "secrets.yaml"
+    path.write_text(yaml.safe_dump({"existing": {"access_key": "existing", "secret_key": "secret"}}))
+    use_settings(secret_backend_path=str(path))
+    return path
+
+
+@pytest.fixture(scope="session")
+def keepass_database(tmp_path_factory) -> bytes:
+    """An empty KeePass database with the group of the test cluster, quick to open."""
+    path = tmp_path_factory.mktemp("keepass") / "secrets.kdbx"
+    database = create_database(str(path), password=KEEPASS_PASSWORD)
+    # The default key derivation takes a second for every load and save.
+    kdf_parameters = database.kdbx.header.value.dynamic_header.kdf_parameters.data.dict
+    kdf_parameters["I"].value, kdf_parameters["M"].value = 1, 64 * 1024
+    database.add_group(database.add_group(database.root_group, "s3"), "test")
+    database.save()
+    return path.read_bytes()
+
+
+class FakeBackendBucket:
+    """
+    The bucket holding the KeePass database, uploaded to with conditional PUT requests to presigned URLs.
+
+    Uploads by other processes are simulated by changing the version before the next upload.
+    """
+
+    def __init__(self, database: bytes):
+        self.database = database
+        self.version = 1
+        self.uploads_by_others = 0
+        self.conflicts = 0
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+    def get_object(self, bucket: str, path: str) -> SimpleNamespace:
+        return SimpleNamespace(
+            data=self.database, headers={"ETag": self.etag}, close=lambda: None, release_conn=lambda: None
+        )
+
+    def presigned_put_object(self, bucket: str, path: str) -> str:
+        return f"https://minio.example.com/{bucket}/{path}?X-Amz-Signature=signature"
+
+    def request(self, method: str, url: str, body: bytes, headers: dict) -> SimpleNamespace:
+        if self.uploads_by_others:
+            self.uploads_by_others -= 1
+            self.version += 1
+        if headers.get("If-Match") != self.etag:
+            self.conflicts += 1
+            return SimpleNamespace(status=HTTPStatus.PRECONDITION_FAILED, headers={}, data=b"")
+        self.database = body
+        self.version += 1
+        return SimpleNamespace(status=HTTPStatus.OK, headers={"ETag": self.etag}, data=b"")
+
+
+@pytest.fixture
+def use_keepass(use_settings, keepass_database, monkeypatch):
+    """Use a KeePass secret backend in a fake bucket, removing the local copies of the database after the test."""
+    use_settings(**KEEPASS_SETTINGS)
+    bucket = FakeBackendBucket(keepass_database)
+    monkeypatch.setattr(SecretManager, "setup_backend_s3", lambda self: bucket)
+    http_client.http_client.lazy_use(http_client.http_client.lazy_scoped(lambda: bucket))
+    managers = []
+
+    def new_manager() -> SecretManager:
+        managers.append(SecretManager())
+        return managers[-1]
+
+    yield bucket, new_manager
+    for manager in managers:
+        manager.remove_keepass_temp_file()
+
+
+def test_parallel_saves_keep_each_others_credentials(use_yaml):
+    first, second = SecretManager(), SecretManager()
+
+    first.set_password(ServiceAccount("first"), Credentials("first", "secret-1"))
+    second.set_password(ServiceAccount("second"), Credentials("second", "secret-2"))
+    first.save()
+    second.save()
+    first.set_password(ServiceAccount("first-again"), Credentials("first-again", "secret-3"))
+    first.save()
+
+    assert set(yaml.safe_load(use_yaml.read_text())) == {"existing", "first", "second", "first-again"}
+    assert not first.backend_dirty
+    assert not second.backend_dirty
+
+
+def test_prefetched_credentials_are_copies(use_yaml):
+    manager = SecretManager()
+    manager.prefetch([ServiceAccount("existing"), ServiceAccount("missing")])
+    manager.backend.clear()
+
+    credentials = manager.get_credentials(ServiceAccount("existing"))
+    credentials.access_key = "changed"
+    assert manager.get_credentials(ServiceAccount("existing")) == Credentials("existing", "secret")
+    assert manager.get_credentials(ServiceAccount("missing")) == Credentials()
+
+
+def test_prefetching_all_credentials(use_yaml):
+    manager = SecretManager()
+    manager.prefetch(None)
+    manager.set_password(ServiceAccount("new"), Credentials("new", "secret-new"))
+    manager.backend.clear()
+
+    assert manager.get_credentials(ServiceAccount("existing")) == Credentials("existing", "secret")
+    assert manager.get_credentials(ServiceAccount("new")) == Credentials("new", "secret-new")
+    # Entries that were not prefetched do not exist, unless they are required, which are looked up to report them.
+    assert manager.get_credentials(ServiceAccount("missing")) == Credentials()
+    with pytest.raises(SystemExit):
+        manager.get_credentials(ServiceAccount("missing"), required=True)
+
+
+def test_keepass_credentials_in_bulk_like_one_by_one(use_keepass):
+    _, new_manager = use_keepass
+    manager = new_manager()
+    for name in ("first", "second"):
+        manager.set_password(ServiceAccount(name), Credentials(f"{name}-key", f"{name}-secret"))
+    accounts = [ServiceAccount(name) for name in ("first", "second", "missing")]
+
+    assert manager.get_credentials_many(accounts) == {
+        account.full_name: manager.keepass_get_credentials(account, False) for account in accounts
+    }
+    assert manager.get_credentials_many(accounts)["second"] == Credentials("second-key", "second-secret")
+
+
+def test_keepass_saves_keep_each_others_credentials(use_keepass):
+    bucket, new_manager = use_keepass
+    first, second = new_manager(), new_manager()
+    first.set_password(ServiceAccount("first"), Credentials("first-key", "first-secret"))
+    second.set_password(ServiceAccount("second"), Credentials("second-key", "second-secret"))
+    first.save()
+    # The database changed since the second manager downloaded it, so it is downloaded again and saved with its entry.
+    second.save()
+    assert bucket.conflicts == 1
+    assert not second.backend_dirty
+    assert second.loaded_version == bucket.etag
+
+    accounts = [ServiceAccount("first"), ServiceAccount("second")]
+    assert new_manager().get_credentials_many(accounts) == {
+        "first": Credentials("first-key", "first-secret"),
+        "second": Credentials("second-key", "second-secret"),
+    }
+
+
+def test_keepass_saves_give_up_if_others_keep_saving(use_keepass):
+    bucket, new_manager = use_keepass
+    manager = new_manager()
+    manager.set_password(ServiceAccount("first"), Credentials("first-key", "first-secret"))
+    bucket.uploads_by_others = SAVE_ATTEMPTS
+    with pytest.raises(SystemExit):
+        manager.save()
+    assert bucket.conflicts == SAVE_ATTEMPTS
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+import pytest
+from minio import S3Error
+from minio.commonconfig import ENABLED
+from minio.error import MinioAdminException
+from minio.versioningconfig import VersioningConfig
+
+from minio_manager import bucket_handler, policy_handler
+
+# Not importing the lazy singletons themselves: pytest inspects module attributes, which would create them.
+from minio_manager.classes import client_manager
+from minio_manager.classes.minio_resources import Bucket, BucketPolicy, IamPolicy
+from minio_manager.classes.state_cache import UNKNOWN, StateCache, observed_state, state_cache
+from minio_manager.utilities import get_error_count
+
+POLICY = {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": "s3:GetObject", "Resource": "*"}]}
+
+
+def s3_error(code: str) -> S3Error:
+    return S3Error(None, code, code, None, None, None)
+
+
+class FakeMinio:
+    """The S3 and admin API calls of the policy and versioning handlers, counting reads and failing on request."""
+
+    def __init__(self):
+        self.calls: list[str] = []
+        self.bucket_policies: dict[str, str] = {}
+        self.iam_policies: dict[str, dict] = {}
+        self.versioning: dict[str, str] = {}
+        self.errors: dict[str, Exception] = {}
+
+    def call(self, name: str):
+        self.calls.append(name)
+        if name in self.errors:
+            raise self.errors[name]
+
+    def get_bucket_policy(self, bucket: str) -> str:
+        self.call("get_bucket_policy")
+        if bucket not in self.bucket_policies:
+            raise s3_error("NoSuchBucketPolicy")
+        return self.bucket_policies[bucket]
+
+    def set_bucket_policy(self, bucket: str, policy: str):
+        self.call("set_bucket_policy")
+        self.bucket_policies[bucket] = policy
+
+    def get_bucket_versioning(self, bucket: str) -> SimpleNamespace:
+        self.call("get_bucket_versioning")
+        return SimpleNamespace(status=self.versioning.get(bucket, "Off"))
+
+    def set_bucket_versioning(self, bucket: str, config: VersioningConfig):
+        self.call("set_bucket_versioning")
+        self.versioning[bucket] = config.status
+
+    def policy_info(self, name: str) -> str:
+        self.call("policy_info")
+        if name not in self.iam_policies:
+            raise MinioAdminException("404", json.dumps({"Code": "XMinioAdminNoSuchPolicy"}))
+        return json.dumps(self.iam_policies[name])
+
+    def policy_add(self, name: str, policy_file: str):
+        self.call("policy_add")
+        with open(policy_file) as f:
+            self.iam_policies[name] = json.load(f)
+
+
+@pytest.fixture
+def minio(use_settings, tmp_path) -> FakeMinio:
+    (tmp_path / "policy.json").write_text(json.dumps(POLICY))
+    fake = FakeMinio()
+    clients = SimpleNamespace(s3=fake, admin=fake)
+    client_manager.client_manager.lazy_use(client_manager.client_manager.lazy_scoped(lambda: clients))
+    return fake
+
+
+def test_written_state_is_not_read_back(minio):
+    with state_cache() as cache:
+        policy_handler.handle_bucket_policy(BucketPolicy("bucket", "policy.json"))
+        policy_handler.handle_bucket_policy(BucketPolicy("bucket", "policy.json"))
+    assert minio.calls == ["get_bucket_policy", "set_bucket_policy"]
+    assert cache.get(("bucket_policy", "bucket")) == POLICY
+
+
+def test_failed_writes_are_forgotten(minio):
+    minio.errors["set_bucket_policy"] = s3_error("AccessDenied")
+    with state_cache() as cache:
+        policy_handler.handle_bucket_policy(BucketPolicy("bucket", "policy.json"))
+        assert cache.get(("bucket_policy", "bucket")) is UNKNOWN
+    assert get_error_count() == 1
+
+
+def test_failed_reads_are_not_cached(minio):
+    minio.errors["policy_info"] = MinioAdminException("500", json.dumps({"Code": "XMinioServerError"}))
+    with state_cache() as cache:
+        policy_handler.handle_iam_policy(IamPolicy("policy", "policy.json"))
+        assert cache.get(("iam_policy", "policy")) is UNKNOWN
+    # A policy that could not be read is not overwritten, and the error is counted once.
+    assert "policy_add" not in minio.calls
+    assert get_error_count() == 1
+
+    del minio.errors["policy_info"]
+    with state_cache():
+        policy_handler.handle_iam_policy(IamPolicy("policy", "policy.json"))
+    assert minio.iam_policies["policy"] == POLICY
+
+
+@pytest.mark.parametrize("code", ["InvalidBucketState", "AccessDenied"])
+def test_failed_versioning_is_not_recorded(minio, code):
+    minio.errors["set_bucket_versioning"] = s3_error(code)
+    with state_cache() as cache:
+        bucket_handler.configure_versioning(Bucket("bucket", False, VersioningConfig(ENABLED)))
+        assert cache.get(("bucket_versioning", "bucket")) is UNKNOWN
+    assert get_error_count() == 1
+
+
+def test_sampled_writes_are_verified(minio, use_settings):
+    use_settings(verify_writes=1)
+    cache = StateCache()
+    cache.written(("bucket_policy", "bucket"), POLICY, lambda: {"Statement": []})
+    assert cache.get(("bucket_policy", "bucket")) == {"Statement": []}
+    assert get_error_count() == 1
+
+
+def test_nested_state_caches_are_shared():
+    with state_cache() as outer, state_cache() as inner:
+        assert inner is outer
+        assert observed_state() is outer
+    assert observed_state() is not outer